@@ -0,0 +1,94 @@
+# benchmarks/bench_artifact.py
+"""
+Zimny start predykcji: .joblib (pickle XGBRegressor + import xgboost/sklearn) vs artefakt .npz
+z ewaluatorem NumPy. Każdy wariant w świeżym interpreterze: import + wczytanie + predykcja N wierszy.
+Model trenowany na danych syntetycznych (bez bazy) z parametrami FINAL_PARAMS.
+
+    python -m benchmarks.bench_artifact --rows 5000
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+
+LOAD_JOBLIB = """
+import joblib, numpy as np
+X = np.load("X.npy")
+np.save("pred_joblib.npy", joblib.load("model_xgb_temp_3h.joblib").predict(X))
+"""
+
+LOAD_NPZ = """
+import numpy as np
+from src.ml.artifact import load
+X = np.load("X.npy")
+np.save("pred_npz.npy", load("model_xgb_temp_3h.npz").predict(X))
+"""
+
+
+def _synthetic(n: int, seed: int = 0):
+    rnd = np.random.default_rng(seed)
+    hour = rnd.integers(0, 24, n)
+    X = np.column_stack([
+        rnd.normal(10, 8, n), rnd.integers(20, 100, n), rnd.integers(980, 1040, n),
+        rnd.uniform(0, 15, n), rnd.integers(0, 100, n),
+        np.sin(2 * np.pi * hour / 24), np.cos(2 * np.pi * hour / 24),
+        rnd.uniform(-1, 1, n), rnd.uniform(-1, 1, n),
+    ]).astype(float)
+    y = X[:, 0] + 2 * X[:, 5] - 0.02 * (X[:, 2] - 1010) + rnd.normal(0, 1, n)
+    return X, y
+
+
+def _time(code: str, cwd: str, repeat: int) -> float:
+    env = dict(os.environ, PYTHONPATH=str(ROOT))
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], cwd=cwd, env=env, check=True)
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=5000)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    import joblib
+    from xgboost import XGBRegressor
+    from src.ml import artifact
+    from src.ml.features import FEATURES
+    from src.ml.train_model import FINAL_PARAMS
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        X, y = _synthetic(20_000)
+        model = XGBRegressor(**FINAL_PARAMS).fit(X, y)
+        joblib.dump(model, "model_xgb_temp_3h.joblib")
+        artifact.export(model, 3, {"model_name": "bench", "features": FEATURES})
+        np.save("X.npy", _synthetic(args.rows, seed=1)[0])
+
+        t_joblib = _time(LOAD_JOBLIB, tmp, args.repeat)
+        t_npz = _time(LOAD_NPZ, tmp, args.repeat)
+        diff = np.abs(np.load("pred_joblib.npy") - np.load("pred_npz.npy")).max()
+        sizes = {p: os.path.getsize(p) for p in ("model_xgb_temp_3h.joblib", "model_xgb_temp_3h.ubj",
+                                                 "model_xgb_temp_3h.npz")}
+        os.chdir(ROOT)
+
+    print(f"{args.rows} wierszy, zimny start (mediana z {args.repeat}):")
+    print(f"  joblib + xgboost : {t_joblib:6.2f} s")
+    print(f"  npz + NumPy      : {t_npz:6.2f} s   (x{t_joblib / t_npz:.1f})")
+    print(f"  max |różnica|    : {diff:.2e}")
+    print("  rozmiary plików  : " + ", ".join(f"{p} {s / 1024:.0f} KiB" for p, s in sizes.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# benchmarks/bench_build_dataset.py
+"""
+build_dataset: dotychczasowe LATERAL ... ORDER BY ABS(EPOCH ...) vs dwa zapytania po indeksie.
+Dane syntetyczne w schemacie `bench` (benchmarks.synth). Stare zapytanie jest O(current × forecast),
+więc mierzymy je na podzbiorze miast i ekstrapolujemy; na tym podzbiorze sprawdzamy też zgodność wyników.
+
+    python -m benchmarks.bench_build_dataset --cities 100 --days 70 --legacy-cities 2
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from . import synth
+
+LEGACY_SQL = """
+WITH curr AS (
+  SELECT city_id, ts_utc,
+         temp_c, humidity_pct, pressure_hpa, wind_speed_ms, clouds_pct
+  FROM weather_current
+  WHERE city_id <= {max_city}
+)
+SELECT
+  c.city_id, c.ts_utc, c.temp_c, c.humidity_pct, c.pressure_hpa, c.wind_speed_ms, c.clouds_pct,
+  f.target_temp AS target_temp_plus_h
+FROM curr c
+JOIN LATERAL (
+    SELECT wf.temp_c AS target_temp
+    FROM weather_forecast wf
+    WHERE wf.city_id = c.city_id
+    ORDER BY ABS(EXTRACT(EPOCH FROM (
+        wf.ts_forecast_utc - (c.ts_utc + INTERVAL '{horizon_h} hours')
+    )))
+    LIMIT 1
+) f ON TRUE
+ORDER BY c.city_id, c.ts_utc;
+"""
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--cities", type=int, default=100)
+    ap.add_argument("--days", type=int, default=70)
+    ap.add_argument("--legacy-cities", type=int, default=2)
+    ap.add_argument("--horizon", type=int, default=3)
+    ap.add_argument("--reuse", action="store_true", help="nie generuj danych, użyj istniejącego schematu")
+    args = ap.parse_args()
+
+    synth.use_schema()
+    if not args.reuse:
+        counts = synth.generate(args.cities, args.days)
+        print(", ".join(f"{t}: {n:,}" for t, n in counts.items()))
+
+    from src.db import get_engine
+    from src.ml.features import build_dataset
+
+    t0 = time.perf_counter()
+    df_new = build_dataset(args.horizon)
+    t_new = time.perf_counter() - t0
+    print(f"build_dataset (indeks)   : {t_new:8.2f} s   {len(df_new):,} wierszy")
+
+    t0 = time.perf_counter()
+    df_old = pd.read_sql(text(LEGACY_SQL.format(max_city=args.legacy_cities, horizon_h=args.horizon)), get_engine())
+    t_old = time.perf_counter() - t0
+    n_cities = df_new["city_id"].nunique()
+    print(f"LATERAL + ORDER BY ABS   : {t_old:8.2f} s   {len(df_old):,} wierszy ({args.legacy_cities} miast)"
+          f" -> ~{t_old * n_cities / args.legacy_cities:,.0f} s dla {n_cities} miast")
+
+    sub = df_new[df_new["city_id"] <= args.legacy_cities].reset_index(drop=True)
+    same = len(sub) == len(df_old) and np.allclose(sub["target_temp_plus_h"], df_old["target_temp_plus_h"])
+    print(f"wyniki zgodne na podzbiorze: {'tak' if same else 'NIE'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# benchmarks/bench_bulk_load.py
+"""
+Przepustowość upsertu [wiersze/s]: dotychczasowa ścieżka (to_sql do _stg_* + INSERT ... ON CONFLICT + DROP)
+vs bulk.copy_upsert (COPY FROM STDIN do tabeli TEMP + merge). Pracuje na kopii weather_forecast
+(_bench_weather_forecast), więc nie dotyka danych produkcyjnych.
+
+    python -m benchmarks.bench_bulk_load --rows 200000
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from src.bulk import copy_upsert
+from src.db import get_engine
+
+TABLE = "_bench_weather_forecast"
+CONFLICT = ["city_id", "ts_forecast_utc"]
+
+
+def _frame(n: int, seed: int = 0) -> pd.DataFrame:
+    rnd = np.random.default_rng(seed)
+    cities = 1 + np.arange(n) % 500
+    ts = pd.Timestamp("2024-01-01") + pd.to_timedelta((np.arange(n) // 500) * 3, unit="h")
+    temp = rnd.normal(10, 8, n).round(2)
+    return pd.DataFrame({
+        "city_id": cities,
+        "ts_forecast_utc": ts,
+        "temp_c": temp,
+        "temp_min_c": temp - 1,
+        "temp_max_c": temp + 1,
+        "humidity_pct": rnd.integers(20, 100, n),
+        "pressure_hpa": rnd.integers(980, 1040, n),
+        "wind_speed_ms": rnd.uniform(0, 15, n).round(2),
+        "wind_deg": rnd.integers(0, 360, n),
+        "clouds_pct": rnd.integers(0, 100, n),
+        "weather_main": "Clouds",
+        "weather_desc": "zachmurzenie umiarkowane",
+    })
+
+
+def _legacy_upsert(con, df: pd.DataFrame, table: str, conflict_cols: list):
+    tmp = "_stg_" + table
+    df.to_sql(tmp, con, if_exists="replace", index=False)
+    cols = ", ".join(df.columns)
+    conflict = ", ".join(conflict_cols)
+    updates = ", ".join([f"{c}=EXCLUDED.{c}" for c in df.columns if c not in conflict_cols])
+    con.execute(text(f"""
+        INSERT INTO {table} ({cols})
+        SELECT {cols} FROM {tmp}
+        ON CONFLICT ({conflict}) DO UPDATE SET {updates};
+    """))
+    con.execute(text(f"DROP TABLE {tmp};"))
+
+
+def _timed(engine, fn, df) -> float:
+    with engine.begin() as con:
+        con.execute(text(f"TRUNCATE {TABLE}"))
+    t0 = time.perf_counter()
+    with engine.begin() as con:
+        fn(con, df, TABLE, CONFLICT)
+    return time.perf_counter() - t0
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=200_000)
+    args = ap.parse_args()
+
+    engine = get_engine()
+    with engine.begin() as con:
+        con.execute(text(f"DROP TABLE IF EXISTS {TABLE}"))
+        con.execute(text(f"CREATE TABLE {TABLE} (LIKE weather_forecast INCLUDING DEFAULTS)"))
+        con.execute(text(f"ALTER TABLE {TABLE} ADD UNIQUE (city_id, ts_forecast_utc)"))
+
+    df = _frame(args.rows)
+    try:
+        for name, fn in (("to_sql + staging", _legacy_upsert), ("COPY + TEMP", copy_upsert)):
+            insert_s = _timed(engine, fn, df)
+            # drugi przebieg na pełnej tabeli = ścieżka ON CONFLICT DO UPDATE
+            t0 = time.perf_counter()
+            with engine.begin() as con:
+                fn(con, df, TABLE, CONFLICT)
+            update_s = time.perf_counter() - t0
+            print(f"{name:18s} insert: {len(df) / insert_s:10,.0f} wierszy/s   "
+                  f"update: {len(df) / update_s:10,.0f} wierszy/s")
+    finally:
+        with engine.begin() as con:
+            con.execute(text(f"DROP TABLE IF EXISTS {TABLE}"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# benchmarks/bench_fetch.py
+"""
+Czas pobierania danych dla N miast z lokalnego fałszywego OWM:
+sekwencyjnie (jak wcześniej: requests.get bez keep-alive) vs fetch_all (pula wątków + sesje).
+Z --with-ids miasta mają id OWM i pogoda bieżąca idzie przez /group (20 miast na zapytanie).
+
+    python -m benchmarks.bench_fetch --cities 500 --latency 0.05 --workers 16 --rpm 3000 --with-ids
+"""
+import argparse
+import os
+import random
+import time
+
+import requests
+
+from .fake_owm import FakeOWMServer
+
+
+def _sequential(base: str, cities):
+    for _, lat, lon, _ in cities:
+        for endpoint in ("weather", "forecast"):
+            r = requests.get(f"{base}/{endpoint}", params={"lat": lat, "lon": lon, "appid": "x"}, timeout=20)
+            r.raise_for_status()
+            r.json()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--cities", type=int, default=500)
+    ap.add_argument("--latency", type=float, default=0.05, help="opóźnienie serwera [s]")
+    ap.add_argument("--workers", type=int, default=16)
+    ap.add_argument("--rpm", type=int, default=3000, help="limit zapytań/min (0 = bez limitu)")
+    ap.add_argument("--with-ids", action="store_true", help="miasta z id OWM (endpoint /group)")
+    ap.add_argument("--skip-sequential", action="store_true")
+    args = ap.parse_args()
+
+    rnd = random.Random(42)
+    cities = [(i, round(rnd.uniform(49, 55), 4), round(rnd.uniform(14, 24), 4),
+               3000000 + i if args.with_ids else None) for i in range(args.cities)]
+
+    with FakeOWMServer(latency_s=args.latency) as srv:
+        # konfiguracja musi być ustawiona przed importem src.*
+        os.environ.update({
+            "OWM_BASE_URL": srv.base_url,
+            "OWM_API_KEY": os.environ.get("OWM_API_KEY", "bench"),
+            "DB_URL": os.environ.get("DB_URL", "postgresql://bench"),
+            "OWM_RATE_PER_MIN": str(args.rpm),
+            "OWM_MAX_WORKERS": str(args.workers),
+            "OWM_CACHE_PATH": "",      # bez cache odpowiedzi – każdy przebieg mierzy pobieranie, nie cache
+        })
+        from src.etl.owm_client import fetch_all
+
+        print(f"Miasta: {args.cities}, opóźnienie: {args.latency * 1000:.0f} ms, "
+              f"wątki: {args.workers}, limit: {args.rpm}/min")
+
+        if not args.skip_sequential:
+            t0 = time.perf_counter()
+            _sequential(srv.base_url, cities)
+            print(f"sekwencyjnie : {time.perf_counter() - t0:8.2f} s")
+
+        t0 = time.perf_counter()
+        before = srv.stats["requests"]
+        fetch_all(cities, max_workers=args.workers)
+        print(f"fetch_all    : {time.perf_counter() - t0:8.2f} s  "
+              f"({srv.stats['requests'] - before} zapytań do serwera)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+# benchmarks/bench_startup.py
+"""
+Zimny start punktów wejścia CLI: czas `python -c "import <moduł>"` w świeżym interpreterze
+(mediana z N prób, minus czas pustego interpretera). Import ma być wolny od efektów ubocznych,
+dlatego zmienne OWM_API_KEY / DB_URL są celowo usuwane ze środowiska.
+
+    python -m benchmarks.bench_startup --repeat 5
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ENTRY_POINTS = [
+    "src.etl.run_etl",
+    "src.ml.predict",
+    "src.ml.train_model",
+    "src.ml.train_model_6h",
+    "src.analytics.business_case",
+    "src.analytics.quick_export",
+    "src.heatwave_analysis",
+]
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def _time_import(module: str, repeat: int, env: dict) -> float:
+    code = f"import {module}" if module else "pass"
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, check=True)
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    env = {k: v for k, v in os.environ.items() if k not in ("OWM_API_KEY", "DB_URL")}
+    base = _time_import("", args.repeat, env)
+    print(f"{'pusty interpreter':32s} {base * 1000:8.0f} ms")
+    for module in ENTRY_POINTS:
+        t = _time_import(module, args.repeat, env)
+        print(f"{module:32s} {(t - base) * 1000:8.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# benchmarks/bench_transform.py
+"""
+Dekodowanie + normalizacja odpowiedzi OWM [ms]: dotychczasowa ścieżka (json.loads, słownik na wiersz,
+pd.DataFrame z listy) vs kolumnowa (orjson, jeśli jest, i current_frame/forecast_frame).
+Przed pomiarem sprawdza, że obie ścieżki dają te same dane do zapisu (po _as_copy_frame).
+Bez bazy i sieci – odpowiedzi z benchmarks.fake_owm, część z brakującymi polami.
+
+    python -m benchmarks.bench_transform --cities 2000
+"""
+import argparse
+import json
+import statistics
+import time
+
+import pandas as pd
+
+from benchmarks.fake_owm import make_current, make_forecast
+from src.bulk import _as_copy_frame
+from src.etl.owm_client import _loads
+from src.etl.transform import current_frame, forecast_frame, normalize_current, normalize_forecast
+
+
+def _bodies(n: int):
+    now = int(time.time())
+    current, forecast = [], []
+    for city_id in range(1, n + 1):
+        lat, lon = 49 + (city_id % 600) / 100, 14 + (city_id % 1000) / 100
+        c, f = make_current(lat, lon, now), make_forecast(lat, lon, now)
+        if city_id % 7 == 0:    # braki jak w prawdziwych odpowiedziach
+            del c["wind"]
+            c["main"]["humidity"] = None
+            f["list"][0].pop("clouds")
+            f["list"][1]["weather"] = []
+        current.append((city_id, json.dumps(c).encode()))
+        forecast.append((city_id, json.dumps(f).encode()))
+    return current, forecast
+
+
+def _decode(bodies, loads):
+    return [(cid, loads(b)) for cid, b in bodies]
+
+
+def _legacy(current, forecast):
+    curr = pd.DataFrame([normalize_current(cid, j) for cid, j in current])
+    rows = []
+    for cid, j in forecast:
+        rows.extend(normalize_forecast(cid, j))
+    return curr, pd.DataFrame(rows)
+
+
+def _columnar(current, forecast):
+    return current_frame(current), forecast_frame(forecast)
+
+
+def _timed(fn, *args, repeat: int) -> float:
+    runs = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(*args)
+        runs.append(time.perf_counter() - t0)
+    return statistics.median(runs) * 1000
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--cities", type=int, default=2000)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    current, forecast = _bodies(args.cities)
+    bodies = current + forecast
+    cur_j, fc_j = _decode(current, json.loads), _decode(forecast, json.loads)
+    for old, new in zip(_legacy(cur_j, fc_j), _columnar(cur_j, fc_j)):
+        pd.testing.assert_frame_equal(_as_copy_frame(old), _as_copy_frame(new), check_dtype=False)
+    n_fc = sum(len(j["list"]) for _, j in fc_j)
+    print(f"{args.cities} odpowiedzi /weather + {args.cities} /forecast ({n_fc} slotów) – wyniki zgodne")
+
+    rows = [
+        ("json.loads", _timed(_decode, bodies, json.loads, repeat=args.repeat)),
+        (f"{_loads.__module__ or 'json'}.loads", _timed(_decode, bodies, _loads, repeat=args.repeat)),
+        ("słowniki", _timed(_legacy, cur_j, fc_j, repeat=args.repeat)),
+        ("kolumnowa", _timed(_columnar, cur_j, fc_j, repeat=args.repeat)),
+    ]
+    print(f"{'etap':<16}{'ms':>10}")
+    for name, t in rows:
+        print(f"{name:<16}{t:>10.1f}")
+    t_old, t_new = rows[0][1] + rows[2][1], rows[1][1] + rows[3][1]
+    print(f"razem: {t_old:.1f} -> {t_new:.1f} ms ({t_old / t_new:.1f}×)")
+
+
+if __name__ == "__main__":
+    main()
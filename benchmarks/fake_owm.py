@@ -0,0 +1,178 @@
+# benchmarks/fake_owm.py
+"""
+Lokalny, fałszywy serwer OpenWeather (endpointy /weather, /group i /forecast) do benchmarków.
+Odpowiedzi mają kształt zgodny z API 2.5, opóźnienie odpowiedzi symuluje sieć, a część zapytań
+może kończyć się błędem 5xx (`error_rate`) albo 429 z Retry-After (`throttle_rate`).
+
+    python -m benchmarks.fake_owm --port 8081 --latency 0.05 --error-rate 0.02
+    # OWM_BASE_URL=http://127.0.0.1:8081/data/2.5 python -m src.etl.run_etl
+"""
+import argparse
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+FORECAST_SLOTS = 40   # 5 dni × 8 slotów po 3h
+
+
+def _weather(dt: int, lat: float, lon: float) -> dict:
+    temp = 10 + 8 * math.sin(2 * math.pi * ((dt // 3600) % 24) / 24) + (lat - 50) * 0.3
+    return {
+        "dt": dt,
+        "main": {
+            "temp": round(temp, 2),
+            "feels_like": round(temp - 1.5, 2),
+            "temp_min": round(temp - 1, 2),
+            "temp_max": round(temp + 1, 2),
+            "pressure": 1013,
+            "humidity": 70,
+        },
+        "wind": {"speed": 3.6, "deg": 240},
+        "clouds": {"all": 40},
+        "weather": [{"id": 802, "main": "Clouds", "description": "zachmurzenie umiarkowane"}],
+    }
+
+
+def make_current(lat: float, lon: float, now: int = None) -> dict:
+    now = int(now if now is not None else time.time())
+    body = _weather(now - now % 600, lat, lon)
+    body.update({"coord": {"lat": lat, "lon": lon}, "name": "Fake", "cod": 200})
+    return body
+
+
+def make_group(owm_ids: list, now: int = None) -> dict:
+    items = []
+    for i in owm_ids:
+        it = make_current(49 + (i % 600) / 100, 14 + (i % 1000) / 100, now)
+        it["id"] = i
+        items.append(it)
+    return {"cnt": len(items), "list": items}
+
+
+def make_forecast(lat: float, lon: float, now: int = None) -> dict:
+    now = int(now if now is not None else time.time())
+    start = now - now % 10800 + 10800
+    return {
+        "cod": "200",
+        "cnt": FORECAST_SLOTS,
+        "list": [_weather(start + i * 10800, lat, lon) for i in range(FORECAST_SLOTS)],
+        "city": {"coord": {"lat": lat, "lon": lon}, "name": "Fake"},
+    }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        q = {k: v[0] for k, v in parse_qs(url.query).items()}
+        srv = self.server
+        with srv.lock:
+            srv.stats["requests"] += 1
+            roll = srv.rnd.random()
+        if srv.latency_s:
+            time.sleep(srv.latency_s)
+        if roll < srv.error_rate + srv.throttle_rate:
+            throttled = roll >= srv.error_rate
+            with srv.lock:
+                srv.stats["throttled" if throttled else "errors"] += 1
+            self.send_response(429 if throttled else srv.rnd.choice((500, 502, 503)))
+            if throttled:
+                self.send_header("Retry-After", "1")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        lat, lon = float(q.get("lat", 0)), float(q.get("lon", 0))
+        if url.path.endswith("/group"):
+            body = make_group([int(i) for i in q.get("id", "").split(",") if i])
+        elif url.path.endswith("/weather"):
+            body = make_current(lat, lon)
+        elif url.path.endswith("/forecast"):
+            body = make_forecast(lat, lon)
+        else:
+            self.send_error(404)
+            return
+
+        raw = json.dumps(body).encode("utf-8")
+        etag = '"%s"' % hashlib.md5(raw).hexdigest()
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(raw)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeOWMServer:
+    """
+    Serwer w osobnym wątku; `base_url` podstawia się jako OWM_BASE_URL.
+    `error_rate` / `throttle_rate` – ułamek zapytań kończonych 5xx / 429 (losowo, powtarzalnie dla `seed`).
+    """
+
+    def __init__(self, latency_s: float = 0.05, host: str = "127.0.0.1", port: int = 0,
+                 error_rate: float = 0.0, throttle_rate: float = 0.0, seed: int = 42):
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.latency_s = latency_s
+        self.httpd.error_rate = error_rate
+        self.httpd.throttle_rate = throttle_rate
+        self.httpd.rnd = random.Random(seed)
+        self.httpd.lock = threading.Lock()
+        self.httpd.stats = {"requests": 0, "errors": 0, "throttled": 0}
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/data/2.5"
+
+    @property
+    def stats(self) -> dict:
+        return self.httpd.stats
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Fałszywy serwer OpenWeather do testów i benchmarków.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8081)
+    ap.add_argument("--latency", type=float, default=0.05, help="opóźnienie odpowiedzi [s]")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="ułamek odpowiedzi 5xx")
+    ap.add_argument("--throttle-rate", type=float, default=0.0, help="ułamek odpowiedzi 429")
+    args = ap.parse_args()
+
+    with FakeOWMServer(args.latency, args.host, args.port, args.error_rate, args.throttle_rate) as srv:
+        print(f"OWM_BASE_URL={srv.base_url}  (Ctrl+C kończy)")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+        print(", ".join(f"{k}: {v}" for k, v in srv.stats.items()))
+
+
+if __name__ == "__main__":
+    main()
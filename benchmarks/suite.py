@@ -0,0 +1,193 @@
+# benchmarks/suite.py
+"""
+Benchmark całego potoku w kilku skalach (miasta × miesiące historii):
+
+    generate       – syntetyczna historia (benchmarks.synth), tylko informacyjnie
+    etl            – run_etl.run() przeciw lokalnemu fałszywemu OWM (opóźnienie, błędy 5xx/429)
+    build_dataset  – features.build_dataset(+3h)
+    train          – train_model.train() dla ML_HORIZONS_H
+    predict        – predict.run(backfill=True), cała historia
+    business_case  – business_case.run() (dopasowanie actuals, KPI, eksporty)
+
+Każda skala dostaje świeży schemat `bench`; modele i eksporty trafiają do katalogu tymczasowego.
+Wyniki (czasy i liczby wierszy) zapisuje do JSON; --compare porównuje z wcześniejszym plikiem
+i kończy się kodem 1, jeśli któryś etap zwolnił o więcej niż --threshold.
+
+    python -m benchmarks.suite --scales small medium
+    python -m benchmarks.suite --scales 50x2 --compare benchmarks/results/suite_20261001_120000.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Tuple
+
+from . import synth
+from .fake_owm import FakeOWMServer
+
+# nazwa -> (miasta, miesiące historii)
+SCALES: Dict[str, Tuple[int, int]] = {
+    "small": (20, 1),
+    "medium": (100, 3),
+    "large": (300, 6),
+}
+STAGES = ("generate", "etl", "build_dataset", "train", "predict", "business_case")
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+# krótszych etapów nie oznaczamy jako regresji – to głównie szum
+MIN_REGRESSION_S = 0.1
+
+
+def parse_scale(name: str) -> Tuple[int, int]:
+    """'small' / 'medium' / 'large' albo 'NxM' (N miast × M miesięcy)."""
+    if name in SCALES:
+        return SCALES[name]
+    try:
+        n, m = name.lower().split("x")
+        return int(n), int(m)
+    except ValueError:
+        raise ValueError(f"nieznana skala: {name} (znane: {', '.join(SCALES)} albo NxM)") from None
+
+
+def _git_rev() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(RESULTS_DIR), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def _timed(stages: Dict[str, Dict[str, Any]], name: str, fn: Callable[[], Any],
+           rows: Callable[[Any], int] = None) -> Any:
+    print(f"[suite]   {name} ...", flush=True)
+    t0 = time.perf_counter()
+    out = fn()
+    stages[name] = {"seconds": round(time.perf_counter() - t0, 3)}
+    if rows is not None:
+        stages[name]["rows"] = int(rows(out))
+    print(f"[suite]   {name}: {stages[name]['seconds']:.2f} s", flush=True)
+    return out
+
+
+def run_scale(n_cities: int, months: int, srv: FakeOWMServer, schema: str) -> Dict[str, Any]:
+    from src.analytics import business_case
+    from src.etl import run_etl
+    from src.ml import features, predict, train_model
+
+    days = synth.months_to_days(months)
+    stages: Dict[str, Dict[str, Any]] = {}
+    counts = _timed(stages, "generate", lambda: synth.generate(n_cities, days, schema=schema),
+                    rows=lambda c: c["weather_current"] + c["weather_forecast"])
+
+    before = dict(srv.stats)
+    etl = _timed(stages, "etl", run_etl.run, rows=lambda s: s["current"] + s["forecast"])
+    stages["etl"].update({
+        "failed": etl["failed"],
+        **{f"http_{k}": v - before[k] for k, v in srv.stats.items()},
+    })
+
+    _timed(stages, "build_dataset", lambda: features.build_dataset(3), rows=len)
+    _timed(stages, "train", train_model.train)
+    _timed(stages, "predict", lambda: predict.run(backfill=True), rows=lambda n: n)
+    _timed(stages, "business_case", business_case.run)
+    return {"cities": n_cities, "months": months, "days": days, "counts": counts, "stages": stages}
+
+
+def compare(old: Dict[str, Any], new: Dict[str, Any], threshold: float) -> List[str]:
+    """Wypisuje tabelę zmian czasów; zwraca etapy, które zwolniły ponad próg."""
+    regressions = []
+    print(f"\n{'skala':<10}{'etap':<16}{'przed [s]':>11}{'teraz [s]':>11}{'zmiana':>9}")
+    for scale, res in new["results"].items():
+        prev = old.get("results", {}).get(scale)
+        if prev is None:
+            continue
+        for stage, cur in res["stages"].items():
+            was = prev["stages"].get(stage)
+            if was is None:
+                continue
+            a, b = was["seconds"], cur["seconds"]
+            ratio = b / a if a > 0 else float("inf")
+            slower = ratio > 1 + threshold and b - a > MIN_REGRESSION_S
+            if slower:
+                regressions.append(f"{scale}/{stage}")
+            print(f"{scale:<10}{stage:<16}{a:>11.2f}{b:>11.2f}{ratio:>8.2f}×" + ("  REGRESJA" if slower else ""))
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark ETL -> cechy -> trening -> predykcja -> analityka.")
+    ap.add_argument("--scales", nargs="+", default=["small", "medium"],
+                    help=f"{', '.join(f'{k} ({n}×{m} mies.)' for k, (n, m) in SCALES.items())} albo NxM")
+    ap.add_argument("--latency", type=float, default=0.05, help="opóźnienie fałszywego OWM [s]")
+    ap.add_argument("--error-rate", type=float, default=0.01, help="ułamek odpowiedzi 5xx")
+    ap.add_argument("--throttle-rate", type=float, default=0.01, help="ułamek odpowiedzi 429")
+    ap.add_argument("--schema", default=synth.SCHEMA)
+    ap.add_argument("--out", help=f"plik JSON z wynikami (domyślnie {RESULTS_DIR}/suite_<czas>.json)")
+    ap.add_argument("--compare", help="wcześniejszy plik JSON do porównania")
+    ap.add_argument("--threshold", type=float, default=0.2, help="próg regresji (0.2 = 20%% wolniej)")
+    args = ap.parse_args()
+
+    try:
+        scales = {name: parse_scale(name) for name in args.scales}
+    except ValueError as e:
+        ap.error(str(e))
+    out = os.path.abspath(args.out or os.path.join(RESULTS_DIR, f"suite_{datetime.now():%Y%m%d_%H%M%S}.json"))
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    with FakeOWMServer(args.latency, error_rate=args.error_rate, throttle_rate=args.throttle_rate) as srv:
+        # konfiguracja musi być ustawiona przed importem src.*
+        os.environ.update({
+            "OWM_BASE_URL": srv.base_url,
+            "OWM_API_KEY": os.environ.get("OWM_API_KEY", "bench"),
+            "OWM_CACHE_PATH": "",      # każdy przebieg ETL pobiera wszystko od zera
+            "OWM_ARCHIVE_DIR": "",
+        })
+        for key, value in {"OWM_RATE_PER_MIN": "0", "OWM_BACKOFF_S": "0.05",
+                           "ETL_RETRY_DELAY_S": "0", "METRICS_ENABLED": "0"}.items():
+            os.environ.setdefault(key, value)
+        synth.use_schema(args.schema)
+
+        # modele (*.joblib, *.npz) i eksporty powerbi/ – poza repozytorium
+        workdir = tempfile.mkdtemp(prefix="weather_bench_")
+        os.chdir(workdir)
+
+        results = {}
+        for name, (n_cities, months) in scales.items():
+            print(f"[suite] {name}: {n_cities} miast × {months} mies.", flush=True)
+            results[name] = run_scale(n_cities, months, srv, args.schema)
+
+    report = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "git_rev": _git_rev(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "fake_owm": {"latency_s": args.latency, "error_rate": args.error_rate,
+                     "throttle_rate": args.throttle_rate},
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print(f"\n{'skala':<10}" + "".join(f"{s:>15}" for s in STAGES))
+    for name, res in results.items():
+        print(f"{name:<10}" + "".join(f"{res['stages'][s]['seconds']:>15.2f}" for s in STAGES))
+    print(f"Wyniki zapisane → {out} (pliki robocze: {workdir})")
+
+    if baseline is not None:
+        regressions = compare(baseline, report, args.threshold)
+        if regressions:
+            print(f"Regresje (> {args.threshold:.0%}): {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
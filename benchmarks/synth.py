@@ -0,0 +1,131 @@
+# benchmarks/synth.py
+"""
+Syntetyczna historia pogody w osobnym schemacie Postgresa (domyślnie `bench`),
+żeby benchmarki nie dotykały danych produkcyjnych. Temperatura ma cykl dobowy i roczny, wolną
+falę „frontów” przesuniętą między miastami i szum; prognoza to ta sama krzywa z większym szumem,
+więc model ma czego się nauczyć, a dłuższa historia (miesiące) pokrywa różne pory roku.
+
+    python -m benchmarks.synth --cities 100 --days 70     # ~1M wierszy weather_current
+    python -m benchmarks.synth --cities 50 --months 6
+"""
+import argparse
+import os
+from urllib.parse import quote
+
+import pandas as pd
+from sqlalchemy import text
+
+SCHEMA = "bench"
+END = "2026-01-01"
+
+# temperatura [°C] w chwili {ts} dla miasta c: cykl roczny (minimum w połowie stycznia) + dobowy
+# (maksimum ~15:00) + fala frontów o okresie ~6 dni + chłodniej na północy
+_TEMP_SQL = """(
+    8 - 11 * cos(2 * pi() * (extract(doy FROM {ts}) - 15) / 365.25)
+    + 4 * sin(2 * pi() * (extract(hour FROM {ts}) - 9) / 24)
+    + 3 * sin(2 * pi() * extract(epoch FROM {ts}) / (6.3 * 86400) + c.city_id)
+    - (c.lat - 50) * 0.6
+)"""
+
+
+def use_schema(schema: str = SCHEMA) -> str:
+    """
+    Przestawia DB_URL w środowisku na `search_path=<schema>`; kod z src.* (get_engine)
+    będzie od tej chwili pracował na tym schemacie. Zwraca nowy URL.
+    """
+    url = os.environ["DB_URL"]
+    sep = "&" if "?" in url else "?"
+    url = f"{url}{sep}options={quote(f'-csearch_path={schema}')}"
+    os.environ["DB_URL"] = url
+    return url
+
+
+def months_to_days(months: int, end: str = END) -> int:
+    """Liczba dni w `months` miesiącach kalendarzowych kończących się w `end`."""
+    end_ts = pd.Timestamp(end)
+    return (end_ts - (end_ts - pd.DateOffset(months=months))).days
+
+
+def generate(n_cities: int, days: int, step_min: int = 10, seed: float = 0.42,
+             schema: str = SCHEMA, end: str = END):
+    """Tworzy schemat od zera i wypełnia cities / weather_current / weather_forecast."""
+    from src.db import get_engine, init_schema
+    from src.etl import weather_rollups
+    from src.partitions import ensure_partitions, forget_known
+
+    with get_engine().begin() as con:
+        con.execute(text(f"DROP SCHEMA IF EXISTS {schema} CASCADE"))
+        con.execute(text(f"CREATE SCHEMA {schema}"))
+    forget_known()
+    init_schema(force=True)
+
+    params = {"n": n_cities, "days": days, "step": step_min, "end": end}
+    end_ts = pd.Timestamp(end)
+    temp_g = _TEMP_SQL.format(ts="g")
+    with get_engine().begin() as con:
+        ensure_partitions(con, "weather_current", end_ts - pd.Timedelta(days=days), end_ts)
+        ensure_partitions(con, "weather_forecast", end_ts - pd.Timedelta(days=days), end_ts + pd.Timedelta(days=5))
+        con.execute(text("SELECT setseed(:seed)"), {"seed": seed})
+        con.execute(text("""
+            INSERT INTO cities (name, country, lat, lon, owm_id)
+            SELECT 'City ' || g, 'PL', 49 + random() * 6, 14 + random() * 10, 3000000 + g
+            FROM generate_series(1, :n) g
+        """), params)
+        # obserwacje co `step` minut z losowym przesunięciem – jak nieregularne `dt` z OWM
+        con.execute(text(f"""
+            INSERT INTO weather_current (city_id, ts_utc, temp_c, feels_like_c, humidity_pct,
+                                         pressure_hpa, wind_speed_ms, wind_deg, clouds_pct,
+                                         weather_main, weather_desc)
+            SELECT c.city_id, s.ts,
+                   s.temp, s.temp - 1.5,
+                   (60 + 30 * random())::int, (1000 + 25 * random())::int,
+                   round((8 * random())::numeric, 2), (360 * random())::int, (100 * random())::int,
+                   'Clouds', 'zachmurzenie umiarkowane'
+            FROM cities c
+            CROSS JOIN LATERAL (
+                SELECT g + make_interval(secs => floor(random() * 90)) AS ts,
+                       round(({temp_g} + 2 * random() - 1)::numeric, 2)::float AS temp
+                FROM generate_series(CAST(:end AS timestamp) - make_interval(days => :days),
+                                     CAST(:end AS timestamp), make_interval(mins => :step)) g
+            ) s
+        """), params)
+        # prognozy w slotach 3h, sięgające 5 dni za ostatnią obserwację
+        con.execute(text(f"""
+            INSERT INTO weather_forecast (city_id, ts_forecast_utc, temp_c, temp_min_c, temp_max_c,
+                                          humidity_pct, pressure_hpa, wind_speed_ms, wind_deg,
+                                          clouds_pct, weather_main, weather_desc)
+            SELECT c.city_id, g, s.temp, s.temp - 1, s.temp + 1,
+                   (60 + 30 * random())::int, (1000 + 25 * random())::int,
+                   round((8 * random())::numeric, 2), (360 * random())::int, (100 * random())::int,
+                   'Clouds', 'zachmurzenie umiarkowane'
+            FROM cities c
+            CROSS JOIN generate_series(CAST(:end AS timestamp) - make_interval(days => :days),
+                                       CAST(:end AS timestamp) + INTERVAL '5 days', INTERVAL '3 hours') g
+            CROSS JOIN LATERAL (
+                SELECT round(({temp_g} + 3 * random() - 1.5)::numeric, 2)::float AS temp
+            ) s
+        """), params)
+        weather_rollups.rebuild(con)
+        con.execute(text("ANALYZE"))
+        counts = {t: con.execute(text(f"SELECT COUNT(*) FROM {t}")).scalar()
+                  for t in ("cities", "weather_current", "weather_forecast")}
+    return counts
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--cities", type=int, default=100)
+    ap.add_argument("--days", type=int, default=70)
+    ap.add_argument("--months", type=int, help="historia w miesiącach kalendarzowych (zamiast --days)")
+    ap.add_argument("--step-min", type=int, default=10)
+    ap.add_argument("--schema", default=SCHEMA)
+    args = ap.parse_args()
+
+    use_schema(args.schema)
+    days = months_to_days(args.months) if args.months else args.days
+    counts = generate(args.cities, days, args.step_min, schema=args.schema)
+    print(", ".join(f"{t}: {n:,}" for t, n in counts.items()))
+
+
+if __name__ == "__main__":
+    main()
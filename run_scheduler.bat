@@ -0,0 +1,4 @@
+@echo off
+CALL %UserProfile%\anaconda3\Scripts\activate.bat weather
+cd /d C:\Users\krzys\Downloads\weather-pipeline
+python -m src.scheduler
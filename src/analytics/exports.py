@@ -0,0 +1,254 @@
+# src/analytics/exports.py
+"""
+Eksporty do Power BI jako Parquet partycjonowany po dniu:
+
+    powerbi/parquet/<nazwa>/day=YYYY-MM-DD/part-0.parquet
+
+Wynik zapytania jest czytany kursorem po stronie serwera porcjami po CHUNK_ROWS,
+więc pamięć nie rośnie z wielkością tabeli. Przy kolejnym uruchomieniu przepisywane są tylko
+dni, w których zmieniły się wiersze źródłowe od znacznika eksportu (ExportSpec.changes:
+created_at/matched_at/loaded_at po znaczniku) – także stare dni po backfillu predykcji albo
+odtworzeniu archiwum. Pozostałe partycje zostają na dysku bez zmian.
+Niezależne eksporty idą równolegle we wspólnej puli wątków.
+
+    python -m src.analytics.exports [--full] [nazwa ...]
+"""
+import argparse
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import text
+from ..db import commit_bound, get_engine, get_watermark, set_watermark
+from .. import metrics
+
+EXPORT_DIR = "powerbi/parquet"
+CHUNK_ROWS = 50_000
+EXPORT_WORKERS = 4
+WM_PREFIX = "export."
+
+# typy kolumn po OID Postgresa (cursor.description); numeric -> float64 przez cast
+PG_ARROW_TYPES = {
+    16: pa.bool_(), 20: pa.int64(), 21: pa.int16(), 23: pa.int32(),
+    700: pa.float32(), 701: pa.float64(), 1700: pa.float64(),
+    25: pa.string(), 1043: pa.string(),
+    1082: pa.date32(), 1114: pa.timestamp("us"), 1184: pa.timestamp("us", tz="UTC"),
+}
+NUMERIC_OID = 1700
+
+
+class ExportSpec(NamedTuple):
+    name: str
+    sql: str
+    ts_col: Optional[str] = None   # kolumna wyniku (timestamp/date) wyznaczająca partycję; None = jeden plik
+    # zapytanie z %(since)s zwracające kolumnę `day` – dni ts_col ze zmianami od znacznika
+    # (kolumna czasu z NOW() serwera, porównanie `>=` – db.commit_bound); None = każdy przebieg
+    # przepisuje wszystkie partycje
+    changes: Optional[str] = None
+
+
+def _partition_dir(spec: ExportSpec, day: date) -> str:
+    return os.path.join(EXPORT_DIR, spec.name, f"day={day.isoformat()}")
+
+
+def existing_days(spec: ExportSpec) -> List[date]:
+    root = os.path.join(EXPORT_DIR, spec.name)
+    if not os.path.isdir(root):
+        return []
+    return sorted(date.fromisoformat(d[4:]) for d in os.listdir(root) if d.startswith("day="))
+
+
+def _arrow_table(rows: List[tuple], description) -> pa.Table:
+    schema = pa.schema([(col.name, PG_ARROW_TYPES.get(col.type_code, pa.string())) for col in description])
+    df = pd.DataFrame.from_records(rows, columns=schema.names, coerce_float=True)
+    for col in description:
+        if col.type_code == NUMERIC_OID:
+            df[col.name] = df[col.name].astype("float64")   # Decimal -> float
+    # bez metadanych pandas: porcje z innymi dtype (np. same NULL) muszą mieć ten sam schemat pliku
+    return pa.Table.from_pandas(df, schema=schema, preserve_index=False).replace_schema_metadata(None)
+
+
+def _stream(sql: str, params: Dict) -> Iterator[pa.Table]:
+    """Wynik zapytania porcjami jako tabele Arrow (kursor nazwany = po stronie serwera)."""
+    con = get_engine().raw_connection()
+    try:
+        with con.cursor(name="export_stream") as cur:
+            cur.itersize = CHUNK_ROWS
+            cur.execute(sql, params)
+            while True:
+                rows = cur.fetchmany(CHUNK_ROWS)
+                if not rows:
+                    break
+                yield _arrow_table(rows, cur.description)
+        con.rollback()
+    finally:
+        con.close()
+
+
+class _PartitionWriter:
+    """
+    Jeden otwarty plik naraz – wiersze przychodzą posortowane po dniu. Zapis przez .tmp + os.replace
+    dopiero po komplecie wierszy dnia; abort() przy błędzie usuwa niedokończony .tmp.
+    """
+
+    def __init__(self, spec: ExportSpec):
+        self.spec = spec
+        self.day = None
+        self._writer = None
+        self._path = None
+        self.written: List[date] = []
+
+    def write(self, day: date, table: pa.Table):
+        if day != self.day:
+            self.close()
+            part_dir = _partition_dir(self.spec, day)
+            os.makedirs(part_dir, exist_ok=True)
+            self.day, self._path = day, os.path.join(part_dir, "part-0.parquet")
+            self._writer = pq.ParquetWriter(self._path + ".tmp", table.schema)
+            self.written.append(day)
+        self._writer.write_table(table)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            os.replace(self._path + ".tmp", self._path)
+            self._writer = None
+
+    def abort(self):
+        """Bieżący dzień niekompletny (błąd kursora/konwersji) – stary plik partycji zostaje."""
+        if self._writer is not None:
+            self._writer.close()
+            os.remove(self._path + ".tmp")
+            self._writer = None
+            self.written.pop()
+
+
+def _day_ranges(days: Iterable[date]):
+    """Dni -> przedziały [od, do) ciągłych dni (warunek po ts_col korzysta z indeksów i partycji)."""
+    ranges = []
+    for day in sorted(set(days)):
+        if ranges and ranges[-1][1] == day:
+            ranges[-1][1] = day + timedelta(days=1)
+        else:
+            ranges.append([day, day + timedelta(days=1)])
+    return ranges
+
+
+def changed_days(spec: ExportSpec, since: datetime) -> List[date]:
+    with get_engine().connect() as con:
+        return sorted(con.exec_driver_sql(f"SELECT DISTINCT day FROM ({spec.changes}) c",
+                                          {"since": since}).scalars())
+
+
+def _export_partitioned(spec: ExportSpec, full: bool) -> int:
+    days = existing_days(spec)
+    wm_name = WM_PREFIX + spec.name
+    with get_engine().connect() as con:
+        # przed odczytem danych; wiersze z transakcji otwartych w tej chwili dostanie następny przebieg
+        started = commit_bound(con)
+        since, _ = get_watermark(con, wm_name)
+    # bez znacznika albo bez plików – wszystko od nowa
+    rewrite = None
+    if not full and days and since is not None and spec.changes:
+        rewrite = _day_ranges(changed_days(spec, since))
+        if not rewrite:
+            _save_watermark(wm_name, started)
+            return 0
+
+    params = {}
+    where = ""
+    if rewrite is not None:
+        conds = []
+        for i, (lo, hi) in enumerate(rewrite):
+            conds.append(f"(q.{spec.ts_col} >= %(lo{i})s AND q.{spec.ts_col} < %(hi{i})s)")
+            params.update({f"lo{i}": lo, f"hi{i}": hi})
+        where = "WHERE " + " OR ".join(conds)
+    sql = f"SELECT * FROM ({spec.sql}) q {where} ORDER BY q.{spec.ts_col}"
+
+    n = 0
+    writer = _PartitionWriter(spec)
+    try:
+        for table in _stream(sql, params):
+            day_col = table.column(spec.ts_col).cast(pa.date32()).to_pylist()
+            start = 0
+            for i in range(1, len(day_col) + 1):
+                if i == len(day_col) or day_col[i] != day_col[start]:
+                    writer.write(day_col[start], table.slice(start, i - start))
+                    start = i
+            n += table.num_rows
+    except BaseException:
+        # znacznik bez zmian – następny przebieg przepisze te same dni
+        writer.abort()
+        raise
+    writer.close()
+
+    # przepisywane dni, dla których nie ma już wierszy
+    written = set(writer.written)
+    for day in days:
+        if day not in written and (rewrite is None or any(lo <= day < hi for lo, hi in rewrite)):
+            shutil.rmtree(_partition_dir(spec, day))
+    _save_watermark(wm_name, started)
+    return n
+
+
+def _save_watermark(name: str, value: datetime):
+    # znacznik dopiero po zapisaniu plików: przerwany eksport powtórzy te same dni
+    with get_engine().begin() as con:
+        set_watermark(con, name, value_ts=value)
+
+
+def _export_single(spec: ExportSpec) -> int:
+    path = os.path.join(EXPORT_DIR, f"{spec.name}.parquet")
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    tables = list(_stream(spec.sql, {}))
+    if not tables:
+        return 0
+    table = pa.concat_tables(tables)
+    pq.write_table(table, path + ".tmp")
+    os.replace(path + ".tmp", path)
+    return table.num_rows
+
+
+def export(spec: ExportSpec, full: bool = False) -> int:
+    """Jeden eksport. Zwraca liczbę zapisanych wierszy."""
+    t0 = time.perf_counter()
+    with metrics.timer("export", export=spec.name):
+        n = _export_partitioned(spec, full) if spec.ts_col else _export_single(spec)
+    metrics.inc("export_rows", n, export=spec.name)
+    print(f"[export] {spec.name}: {n} wierszy, {time.perf_counter() - t0:.1f} s")
+    return n
+
+
+def run_exports(specs: Iterable[ExportSpec], full: bool = False,
+                workers: int = EXPORT_WORKERS) -> Dict[str, int]:
+    specs = list(specs)
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(specs)))) as ex:
+        futures = {s.name: ex.submit(metrics.bind(export), s, full) for s in specs}
+        return {name: f.result() for name, f in futures.items()}
+
+
+def all_specs() -> List[ExportSpec]:
+    from . import business_case, quick_export
+    return [*quick_export.EXPORTS, business_case.DETAILED_EXPORT]
+
+
+def main():
+    specs = {s.name: s for s in all_specs()}
+    ap = argparse.ArgumentParser(description="Eksport danych do Parquet (Power BI).")
+    ap.add_argument("names", nargs="*", help=f"eksporty (domyślnie wszystkie): {', '.join(specs)}")
+    ap.add_argument("--full", action="store_true", help="przepisz wszystkie partycje")
+    args = ap.parse_args()
+    unknown = [n for n in args.names if n not in specs]
+    if unknown:
+        ap.error(f"nieznane eksporty: {', '.join(unknown)}")
+    run_exports([specs[n] for n in args.names] or specs.values(), full=args.full)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+# src/analytics/kpi_rollups.py
+"""
+Przyrostowe agregaty KPI i alertów w bazie (tabela forecast_daily_rollup):
+jeden wiersz na (miasto, horyzont, model, dzień ts_utc) z sumami, z których da się
+złożyć MAE/MAPE i liczniki godzin upału/mrozu dla dowolnego przedziału.
+
+refresh() przelicza tylko grupy z kolejki forecast_rollup_dirty (migracja 0006). Trafiają tam
+triggerami grupy nowych/nadpisanych/usuniętych predykcji i predykcji, którym match_actuals
+dopasował actual. Wpis jest widoczny dopiero po commicie zmiany, więc – inaczej niż znacznik
+created_at – nie gubi predykcji z transakcji, która zatwierdziła się później niż zaczęła.
+
+    python -m src.analytics.kpi_rollups [--rebuild]
+"""
+import argparse
+import pandas as pd
+from sqlalchemy import text
+from ..db import get_engine
+from .. import metrics
+from . import match_actuals
+
+TABLE = "forecast_daily_rollup"
+DIRTY_TABLE = "forecast_rollup_dirty"
+
+# progi „biznesowe” – dopasuj do case’u (po zmianie: refresh(rebuild=True))
+HEAT_ALERT = 28.0   # potencjalnie większy ruch/zużycie energii
+COLD_ALERT = 0.0    # mróz -> ryzyka operacyjne
+
+# actual dla predykcji: para utrwalona w prediction_actuals (najbliższy pomiar w tolerancji)
+ROLLUP_SELECT_SQL = """
+    SELECT
+      p.city_id, p.horizon_h, COALESCE(p.model_name, '') AS model_name, p.ts_utc::date AS day,
+      COUNT(p.pred_temp_c)                                        AS n_pred,
+      COUNT(a.actual_temp_c)                                      AS n_with_actual,
+      COUNT(a.actual_temp_c - p.pred_temp_c)                      AS n_abs_err,
+      SUM(ABS(a.actual_temp_c - p.pred_temp_c))                   AS sum_abs_err,
+      COUNT(NULLIF(a.actual_temp_c, 0) - p.pred_temp_c)           AS n_ape,
+      SUM(ABS(a.actual_temp_c - p.pred_temp_c) / ABS(NULLIF(a.actual_temp_c, 0))) AS sum_ape,
+      COUNT(*) FILTER (WHERE p.pred_temp_c >= :heat)              AS heat_hours,
+      COUNT(*) FILTER (WHERE p.pred_temp_c <= :cold)              AS cold_hours,
+      SUM(p.pred_temp_c)                                          AS sum_pred_temp
+    FROM weather_predictions p
+    LEFT JOIN prediction_actuals a ON a.prediction_id = p.id
+"""
+
+ROLLUP_GROUP_SQL = "GROUP BY p.city_id, p.horizon_h, COALESCE(p.model_name, ''), p.ts_utc::date"
+
+ROLLUP_COLUMNS = ("city_id, horizon_h, model_name, day, n_pred, n_with_actual, n_abs_err, sum_abs_err, "
+                  "n_ape, sum_ape, heat_hours, cold_hours, sum_pred_temp")
+
+
+def _rebuild(con) -> int:
+    # kolejka najpierw: TRUNCATE czeka na transakcje, które właśnie do niej piszą, a pełne
+    # przeliczenie niżej już widzi ich predykcje
+    con.execute(text(f"TRUNCATE {DIRTY_TABLE}"))
+    con.execute(text(f"TRUNCATE {TABLE}"))
+    res = con.execute(text(f"INSERT INTO {TABLE} ({ROLLUP_COLUMNS}) {ROLLUP_SELECT_SQL} {ROLLUP_GROUP_SQL}"),
+                      {"heat": HEAT_ALERT, "cold": COLD_ALERT})
+    return res.rowcount
+
+
+def _refresh_dirty(con) -> int:
+    # zabieramy tylko wpisy zatwierdzonych zmian; późniejsze commity zostaną na następny przebieg
+    con.execute(text(f"""
+        CREATE TEMP TABLE _kpi_groups ON COMMIT DROP AS
+        WITH taken AS (DELETE FROM {DIRTY_TABLE} RETURNING city_id, horizon_h, model_name, day)
+        SELECT DISTINCT city_id, horizon_h, model_name, day FROM taken
+    """))
+    con.execute(text(f"""
+        DELETE FROM {TABLE} r USING _kpi_groups k
+        WHERE r.city_id = k.city_id AND r.horizon_h = k.horizon_h
+          AND r.model_name = k.model_name AND r.day = k.day
+    """))
+    res = con.execute(text(f"""
+        INSERT INTO {TABLE} ({ROLLUP_COLUMNS})
+        {ROLLUP_SELECT_SQL}
+        JOIN _kpi_groups k
+          ON k.city_id = p.city_id AND k.horizon_h = p.horizon_h
+         AND k.model_name = COALESCE(p.model_name, '')
+         AND p.ts_utc >= k.day AND p.ts_utc < k.day + 1
+        {ROLLUP_GROUP_SQL}
+    """), {"heat": HEAT_ALERT, "cold": COLD_ALERT})
+    return res.rowcount
+
+
+@metrics.timed("kpi_refresh")
+def refresh(rebuild: bool = False, match_since=None) -> int:
+    """
+    Przelicza grupy z kolejki (albo wszystko). Zwraca liczbę przeliczonych grup dziennych.
+    `match_since` – dla match_actuals.run: sprawdź też predykcje z celem od tej chwili.
+    """
+    match_actuals.run(since=match_since)
+    with get_engine().begin() as con:
+        # jeden refresh naraz (ETL i predict mogą skończyć w tym samym czasie)
+        con.execute(text("SELECT pg_advisory_xact_lock(hashtext(:n))"), {"n": TABLE})
+        return _rebuild(con) if rebuild else _refresh_dirty(con)
+
+
+def kpi() -> pd.DataFrame:
+    """MAE/MAPE per miasto i horyzont (tylko tam, gdzie są actuals), złożone z agregatów dziennych."""
+    df = pd.read_sql(text(f"""
+        SELECT city_id, horizon_h,
+               SUM(n_pred)::int AS n_pred,
+               SUM(n_with_actual)::int AS n_with_actual,
+               SUM(sum_abs_err) / NULLIF(SUM(n_abs_err), 0) AS mae,
+               SUM(sum_ape) / NULLIF(SUM(n_ape), 0) AS mape
+        FROM {TABLE}
+        GROUP BY city_id, horizon_h
+        ORDER BY city_id, horizon_h
+    """), get_engine())
+    df["mae"] = df["mae"].astype(float).round(2)
+    df["mape"] = (df["mape"].astype(float) * 100).round(1)  # w %
+    return df
+
+
+def alerts() -> pd.DataFrame:
+    """Liczba godzin upału / mrozu dziennie per miasto i horyzont (na podstawie predykcji)."""
+    df = pd.read_sql(text(f"""
+        SELECT city_id, day AS date, horizon_h,
+               SUM(heat_hours)::int AS heat_hours,
+               SUM(cold_hours)::int AS cold_hours,
+               SUM(sum_pred_temp) / SUM(n_pred) AS avg_pred_temp
+        FROM {TABLE}
+        GROUP BY city_id, day, horizon_h
+        HAVING SUM(n_pred) > 0
+        ORDER BY city_id, day, horizon_h
+    """), get_engine())
+    df["avg_pred_temp"] = df["avg_pred_temp"].astype(float).round(2)
+    return df
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Odświeżenie agregatów KPI/alertów prognoz.")
+    ap.add_argument("--rebuild", action="store_true", help="przelicz wszystko od zera")
+    args = ap.parse_args()
+    print(f"Przeliczono {refresh(args.rebuild)} grup dziennych ({TABLE}).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+# src/analytics/match_actuals.py
+"""
+Dopasowanie predykcji do rzeczywistych pomiarów (tabela prediction_actuals).
+
+Czas docelowy predykcji to ts_utc + horizon_h, a `dt` z OWM jest nieregularne – zamiast
+równości szukamy najbliższego pomiaru w oknie ±MATCH_TOLERANCE_MIN: dwa zapytania po indeksie
+UNIQUE (city_id, ts_utc) weather_current (ostatni pomiar <= cel i pierwszy > cel).
+Przy remisie wygrywa wcześniejszy pomiar. Para jest zapisywana raz (ON CONFLICT DO NOTHING),
+więc KPI nigdy nie liczą złączenia od nowa.
+
+Przyrostowo sprawdzamy predykcje bez pary (NOT EXISTS w prediction_actuals) z czasem docelowym:
+  - z ostatnich RECENT_TARGET_WINDOW przed granicą (tu trafiają też predykcje z transakcji
+    zatwierdzonych później – nie ma znacznika created_at, który mógłby je przeskoczyć),
+  - od najstarszego nowego pomiaru (weather_current.id po znaczniku – doszła starsza historia),
+  - od `since` – predict/replay podają początek tego, co właśnie zapisały (np. backfill),
+i tylko te, których okno tolerancji jest już w całości za najnowszym pomiarem.
+
+    python -m src.analytics.match_actuals [--full]
+"""
+import argparse
+from datetime import timedelta
+
+import pandas as pd
+from sqlalchemy import text
+from ..db import get_engine, get_watermark, set_watermark
+from .. import metrics
+
+MATCH_TOLERANCE_MIN = 10
+WM_ACTUALS = "match_actuals.weather_current"   # value_id = ostatnie id, value_ts = najnowszy ts_utc
+# predykcje bez pary z celem w tym oknie przed granicą są sprawdzane przy każdym przebiegu
+RECENT_TARGET_WINDOW = timedelta(days=2)
+
+# czas docelowy – to samo wyrażenie co w indeksie weather_predictions_target_ts_idx
+TARGET_TS_SQL = "ts_utc + make_interval(hours => horizon_h)"
+
+MATCH_SQL = """
+    INSERT INTO prediction_actuals
+      (prediction_id, city_id, horizon_h, target_ts_utc, actual_ts_utc, actual_temp_c, lag_s)
+    SELECT p.id, p.city_id, p.horizon_h, t.ts_target, m.ts_utc, m.temp_c,
+           EXTRACT(EPOCH FROM m.ts_utc - t.ts_target)::int
+    FROM weather_predictions p
+    JOIN match_candidates cand ON cand.id = p.id
+    CROSS JOIN LATERAL (SELECT p.ts_utc + make_interval(hours => p.horizon_h) AS ts_target) t
+    LEFT JOIN LATERAL (
+        SELECT a.ts_utc, a.temp_c
+        FROM weather_current a
+        WHERE a.city_id = p.city_id
+          AND a.ts_utc <= t.ts_target AND a.ts_utc >= t.ts_target - make_interval(mins => :tol)
+        ORDER BY a.ts_utc DESC
+        LIMIT 1
+    ) prv ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT a.ts_utc, a.temp_c
+        FROM weather_current a
+        WHERE a.city_id = p.city_id
+          AND a.ts_utc > t.ts_target AND a.ts_utc <= t.ts_target + make_interval(mins => :tol)
+        ORDER BY a.ts_utc
+        LIMIT 1
+    ) nxt ON TRUE
+    CROSS JOIN LATERAL (
+        SELECT v.ts_utc, v.temp_c
+        FROM (VALUES (prv.ts_utc, prv.temp_c), (nxt.ts_utc, nxt.temp_c)) v(ts_utc, temp_c)
+        WHERE v.ts_utc IS NOT NULL
+        ORDER BY ABS(EXTRACT(EPOCH FROM v.ts_utc - t.ts_target)), v.ts_utc
+        LIMIT 1
+    ) m
+    WHERE t.ts_target <= :settled
+    ON CONFLICT (prediction_id) DO NOTHING
+"""
+
+# kandydaci bez pary liczeni osobno, przed INSERT: anty-złączenie z tabelą, do której dopisuje ten sam
+# INSERT, w planie z seq scan przechodziło rosnącą stertę dla każdego wiersza (kwadratowo przy --full)
+CANDIDATES_SQL = """
+    CREATE TEMP TABLE match_candidates ON COMMIT DROP AS
+    SELECT c.id FROM ({candidates}) c
+    WHERE NOT EXISTS (SELECT 1 FROM prediction_actuals pa WHERE pa.prediction_id = c.id)
+"""
+
+
+@metrics.timed("match_actuals")
+def run(full: bool = False, since=None) -> int:
+    """
+    Dopasowuje actuals do predykcji, których okno się domknęło. Zwraca liczbę nowych par.
+    `since` – sprawdź też predykcje z celem od tej chwili (np. po backfillu historii).
+    """
+    tol = timedelta(minutes=MATCH_TOLERANCE_MIN)
+    with get_engine().begin() as con:
+        con.execute(text("SELECT pg_advisory_xact_lock(hashtext(:n))"), {"n": "prediction_actuals"})
+        last_ts, last_id = get_watermark(con, WM_ACTUALS)
+        full = full or last_id is None
+
+        # nowe pomiary: zakres po kluczu głównym, bez skanu całej tabeli
+        new_min_ts, new_max_ts, until_id = con.execute(text("""
+            SELECT MIN(ts_utc), MAX(ts_utc), MAX(id) FROM weather_current WHERE id > :id
+        """), {"id": 0 if full else last_id}).one()
+        latest_ts = max((t for t in (last_ts, new_max_ts) if t is not None), default=None)
+        if latest_ts is None:
+            return 0
+        settled = latest_ts - tol
+
+        params = {"tol": MATCH_TOLERANCE_MIN, "settled": settled}
+        if full:
+            candidates = "SELECT id FROM weather_predictions"
+        else:
+            lo = last_ts - tol - RECENT_TARGET_WINDOW
+            if new_min_ts is not None:
+                lo = min(lo, new_min_ts - tol)
+            if since is not None:
+                lo = min(lo, pd.Timestamp(since).to_pydatetime())
+            candidates = f"SELECT id FROM weather_predictions WHERE {TARGET_TS_SQL} >= :lo AND {TARGET_TS_SQL} <= :settled"
+            params["lo"] = lo
+
+        con.execute(text(CANDIDATES_SQL.format(candidates=candidates)), params)
+        con.execute(text("ANALYZE match_candidates"))
+        n = con.execute(text(MATCH_SQL), params).rowcount
+        set_watermark(con, WM_ACTUALS, value_ts=latest_ts, value_id=until_id or last_id)
+    return n
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Dopasowanie predykcji do rzeczywistych pomiarów.")
+    ap.add_argument("--full", action="store_true", help="sprawdź wszystkie predykcje bez pary")
+    ap.add_argument("--since", type=pd.Timestamp, default=None, help="sprawdź też cele od tej daty (UTC)")
+    args = ap.parse_args()
+    print(f"Dopasowano {run(args.full, args.since)} predykcji (tolerancja ±{MATCH_TOLERANCE_MIN} min).")
+
+
+if __name__ == "__main__":
+    main()
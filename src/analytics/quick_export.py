@@ -1,58 +1,70 @@
-import os, pandas as pd
-from dotenv import load_dotenv
-from sqlalchemy import create_engine
-
-load_dotenv()
-engine = create_engine(os.getenv("DB_URL"), future=True)
+from .. import metrics
+from .exports import ExportSpec, run_exports
 
 sql_detailed = """
 SELECT 'current' AS source, c.name AS city, c.country, wc.ts_utc AS ts,
-       wc.temp_c, wc.feels_like_c, wc.humidity_pct, wc.pressure_hpa,
+       wc.temp_c, wc.feels_like_c, NULL::float8 AS temp_min_c, NULL::float8 AS temp_max_c,
+       wc.humidity_pct, wc.pressure_hpa,
        wc.wind_speed_ms, wc.wind_deg, wc.clouds_pct, wc.weather_main, wc.weather_desc
 FROM weather_current wc
 JOIN cities c USING(city_id)
 UNION ALL
 SELECT 'forecast', c.name, c.country, wf.ts_forecast_utc,
-       wf.temp_c, wf.temp_min_c, wf.temp_max_c, wf.humidity_pct, wf.pressure_hpa,
+       wf.temp_c, NULL, wf.temp_min_c, wf.temp_max_c, wf.humidity_pct, wf.pressure_hpa,
        wf.wind_speed_ms, wf.wind_deg, wf.clouds_pct, wf.weather_main, wf.weather_desc
 FROM weather_forecast wf
 JOIN cities c USING(city_id)
-ORDER BY ts;
 """
-pd.read_sql(sql_detailed, engine).to_csv("export_weather_detailed.csv", index=False)
-print("export_weather_detailed.csv")
 
+# z agregatu dziennego prognoz (src/etl/weather_rollups.py), nie z surowego weather_forecast
 sql_daily = """
-SELECT c.name AS city, DATE(wf.ts_forecast_utc) AS day,
-       ROUND(AVG(wf.temp_c)::numeric,2) AS avg_temp,
-       ROUND(MIN(wf.temp_c)::numeric,2) AS min_temp,
-       ROUND(MAX(wf.temp_c)::numeric,2) AS max_temp,
-       ROUND(AVG(wf.humidity_pct)::numeric,2) AS avg_humidity
-FROM weather_forecast wf
+SELECT c.name AS city, d.day,
+       ROUND((d.temp_sum / NULLIF(d.n_temp, 0))::numeric,2) AS avg_temp,
+       ROUND(d.temp_min::numeric,2) AS min_temp,
+       ROUND(d.temp_max::numeric,2) AS max_temp,
+       ROUND(d.humidity_sum::numeric / NULLIF(d.n_humidity, 0),2) AS avg_humidity
+FROM weather_forecast_daily d
 JOIN cities c USING(city_id)
-GROUP BY c.name, DATE(wf.ts_forecast_utc)
-ORDER BY day;
 """
-pd.read_sql(sql_daily, engine).to_excel("export_weather_daily.xlsx", index=False)
-print("export_weather_daily.xlsx")
 
 sql_wind = """
 SELECT c.name AS city, wf.ts_forecast_utc AS ts, wf.wind_speed_ms, wf.wind_deg
 FROM weather_forecast wf
 JOIN cities c USING(city_id)
 ORDER BY wf.wind_speed_ms DESC
-LIMIT 10;
+LIMIT 10
 """
-pd.read_sql(sql_wind, engine).to_csv("export_weather_wind.csv", index=False)
-print("export_weather_wind.csv")
 
 sql_pred = """
 SELECT c.name AS city, p.ts_utc AS ts_base, p.horizon_h, p.pred_temp_c, p.model_name, p.created_at
 FROM weather_predictions p
 JOIN cities c USING(city_id)
-ORDER BY p.created_at DESC, c.name;
 """
-pd.read_sql(sql_pred, engine).to_csv("export_weather_predictions.csv", index=False)
-print("export_weather_predictions.csv")
 
-print("Wszystkie eksporty zapisane w folderze projektu.")
+# dni ze zmianami od znacznika eksportu (exports.changed_days)
+changes_detailed = """
+SELECT ts_utc::date AS day FROM weather_current WHERE loaded_at >= %(since)s
+UNION
+SELECT ts_forecast_utc::date FROM weather_forecast WHERE loaded_at >= %(since)s
+"""
+
+# agregat dzienny jest odświeżany razem z wierszami prognozy tego dnia
+changes_daily = "SELECT ts_forecast_utc::date AS day FROM weather_forecast WHERE loaded_at >= %(since)s"
+
+changes_pred = "SELECT ts_utc::date AS day FROM weather_predictions WHERE created_at >= %(since)s"
+
+# partycje dzienne po kolumnie czasu (sortowanie po niej robi exports), top 10 wiatru – jeden plik
+EXPORTS = [
+    ExportSpec("weather_detailed", sql_detailed, "ts", changes_detailed),
+    ExportSpec("weather_daily", sql_daily, "day", changes_daily),
+    ExportSpec("weather_wind_top10", sql_wind),
+    ExportSpec("weather_predictions", sql_pred, "ts_base", changes_pred),
+]
+
+@metrics.job("quick_export")
+def run(full: bool = False):
+    run_exports(EXPORTS, full=full)
+    print("Wszystkie eksporty zapisane w powerbi/parquet/.")
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,85 @@
+import io
+from typing import List, Optional
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+# tyle wierszy na jedno COPY + merge; ogranicza pamięć bufora CSV przy dużych ramkach
+CHUNK_ROWS = 50_000
+
+
+def _as_copy_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Kolumny float, które są w całości całkowite (np. humidity z brakami -> float64),
+    zamieniamy na Int64 – inaczej COPY dostałby „75.0” do kolumny INT.
+    """
+    out = df
+    for col in df.columns:
+        s = df[col]
+        if pd.api.types.is_float_dtype(s):
+            vals = s.dropna()
+            if not vals.empty and (vals % 1 == 0).all():
+                if out is df:
+                    out = df.copy()
+                out[col] = s.astype("Int64")
+    return out
+
+
+def _copy_chunk(cur, df: pd.DataFrame, stg: str, cols: str):
+    buf = io.StringIO()
+    df.to_csv(buf, index=False, header=False, na_rep="\\N")
+    buf.seek(0)
+    cur.copy_expert(f"COPY {stg} ({cols}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buf)
+
+
+def copy_upsert(con: Connection, df: pd.DataFrame, table: str, conflict_cols: List[str],
+                update_cols: Optional[List[str]] = None, chunk_rows: int = CHUNK_ROWS,
+                touch: Optional[str] = None, where: Optional[str] = None) -> int:
+    """
+    Upsert DataFrame do `table` w ramach transakcji `con`:
+    COPY FROM STDIN (CSV) do tymczasowej tabeli sesji, potem INSERT ... ON CONFLICT.
+    Tabela tymczasowa jest widoczna tylko w tej sesji, więc równoległe joby sobie nie przeszkadzają.
+
+    `update_cols` – kolumny nadpisywane przy konflikcie (domyślnie wszystkie poza kluczem,
+    pusta lista -> DO NOTHING). `touch` – kolumna ustawiana na NOW() także przy nadpisaniu
+    (wstawiane wiersze biorą ją z DEFAULT). `where` – warunek nadpisania (DO UPDATE ... WHERE,
+    np. nowsza wersja wiersza); wiersz, który go nie spełnia, zostaje bez zmian.
+    Zwraca liczbę wierszy przekazanych do bazy.
+    """
+    if df is None or df.empty:
+        return 0
+
+    # ten sam klucz dwa razy w jednym INSERT ... ON CONFLICT DO UPDATE = błąd; zostaje ostatni
+    df = _as_copy_frame(df.drop_duplicates(subset=conflict_cols, keep="last"))
+    if update_cols is None:
+        update_cols = [c for c in df.columns if c not in conflict_cols]
+
+    stg = f"_stg_{table}"
+    cols = ", ".join(df.columns)
+    conflict = ", ".join(conflict_cols)
+    if update_cols:
+        on_conflict = "DO UPDATE SET " + ", ".join(
+            [f"{c} = EXCLUDED.{c}" for c in update_cols] + ([f"{touch} = NOW()"] if touch else []))
+        if where:
+            on_conflict += f" WHERE {where}"
+    else:
+        on_conflict = "DO NOTHING"
+
+    con.execute(text(f"DROP TABLE IF EXISTS pg_temp.{stg}"))
+    con.execute(text(f"CREATE TEMP TABLE {stg} ON COMMIT DROP AS SELECT {cols} FROM {table} WITH NO DATA"))
+    merge = text(f"""
+        INSERT INTO {table} ({cols})
+        SELECT {cols} FROM {stg}
+        ON CONFLICT ({conflict}) {on_conflict}
+    """)
+
+    cur = con.connection.cursor()
+    try:
+        for start in range(0, len(df), chunk_rows):
+            _copy_chunk(cur, df.iloc[start:start + chunk_rows], stg, cols)
+            con.execute(merge)
+            con.execute(text(f"TRUNCATE {stg}"))
+    finally:
+        cur.close()
+    con.execute(text(f"DROP TABLE {stg}"))
+    return len(df)
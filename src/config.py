@@ -3,12 +3,66 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-OWM_API_KEY = os.getenv("OWM_API_KEY")
-DB_URL = os.getenv("DB_URL")
 DEFAULT_UNITS = os.getenv("DEFAULT_UNITS", "metric")
 DEFAULT_LANG = os.getenv("DEFAULT_LANG", "pl")
 
-if not OWM_API_KEY:
-    raise RuntimeError("Brak OWM_API_KEY w .env")
-if not DB_URL:
-    raise RuntimeError("Brak DB_URL w .env")
+# OpenWeather – limity planu i współbieżność pobierania
+OWM_BASE_URL = os.getenv("OWM_BASE_URL", "https://api.openweathermap.org/data/2.5")
+OWM_RATE_PER_MIN = int(os.getenv("OWM_RATE_PER_MIN", "60"))   # darmowy plan: 60 zapytań/min
+OWM_MAX_WORKERS = int(os.getenv("OWM_MAX_WORKERS", "8"))
+OWM_MAX_RETRIES = int(os.getenv("OWM_MAX_RETRIES", "3"))
+OWM_BACKOFF_S = float(os.getenv("OWM_BACKOFF_S", "1.0"))
+OWM_TIMEOUT_S = float(os.getenv("OWM_TIMEOUT_S", "20"))
+
+# cache odpowiedzi OWM (SQLite); pusta ścieżka wyłącza cache, TTL = 0 wyłącza go dla endpointu
+OWM_CACHE_PATH = os.getenv("OWM_CACHE_PATH", ".cache/owm_responses.sqlite")
+OWM_CACHE_TTL_CURRENT_S = int(os.getenv("OWM_CACHE_TTL_CURRENT_S", "0"))
+OWM_CACHE_TTL_FORECAST_S = int(os.getenv("OWM_CACHE_TTL_FORECAST_S", "10800"))   # prognoza 5d/3h zmienia się co ~3h
+# ETL strumieniowy: wiersze na mikro-partię (osobna transakcja), limit pobranych, a jeszcze
+# nieprzetworzonych odpowiedzi (backpressure dla wątków) i ponowienia dla zapytań z błędem
+ETL_BATCH_ROWS = int(os.getenv("ETL_BATCH_ROWS", "20000"))
+ETL_QUEUE_SIZE = int(os.getenv("ETL_QUEUE_SIZE", "64"))
+ETL_RETRY_PASSES = int(os.getenv("ETL_RETRY_PASSES", "1"))
+ETL_RETRY_DELAY_S = float(os.getenv("ETL_RETRY_DELAY_S", "30"))
+# rezydentny harmonogram (src/scheduler.py): interwały w sekundach; 0 = po każdym udanym poprzednim kroku;
+# każdy termin przesuwany o losowe 0..SCHED_JITTER_S s
+SCHED_ETL_INTERVAL_S = int(os.getenv("SCHED_ETL_INTERVAL_S", "600"))
+SCHED_PREDICT_INTERVAL_S = int(os.getenv("SCHED_PREDICT_INTERVAL_S", "0"))
+SCHED_ANALYTICS_INTERVAL_S = int(os.getenv("SCHED_ANALYTICS_INTERVAL_S", "3600"))
+SCHED_JITTER_S = float(os.getenv("SCHED_JITTER_S", "30"))
+# łączenie zapytań dla pobliskich miast: bok komórki siatki [km]; miasta z jednej komórki dostają
+# dane pobrane raz (dla miasta o najmniejszym city_id); 0 = każde miasto osobno
+OWM_CELL_KM = float(os.getenv("OWM_CELL_KM", "0"))
+# archiwum surowych odpowiedzi (jsonl.gz na godzinę) do odtworzenia tabel bez API; pusta ścieżka wyłącza
+OWM_ARCHIVE_DIR = os.getenv("OWM_ARCHIVE_DIR", "data/owm_archive")
+
+# horyzonty prognozy [h] – magazyn cech, trening i predykcja
+ML_HORIZONS_H = [int(h) for h in os.getenv("ML_HORIZONS_H", "3,6").split(",") if h.strip()]
+# predykcja z artefaktu .npz (ewaluator NumPy, bez importu xgboost), jeśli istnieje
+ML_NUMPY_EVALUATOR = os.getenv("ML_NUMPY_EVALUATOR", "1") == "1"
+
+# retencja surowych weather_current / weather_forecast w dniach (0 = bez limitu);
+# usuwane są całe partycje miesięczne, agregaty godzinowe/dzienne zostają
+RAW_RETENTION_DAYS = int(os.getenv("RAW_RETENTION_DAYS", "0"))
+
+# metryki etapów (src/metrics.py): plik tekstowy Prometheusa (node_exporter textfile collector)
+# i wiersz w pipeline_runs na przebieg; wyłączone = same wywołania funkcji, bez pomiarów
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "0") == "1"
+METRICS_TEXTFILE = os.getenv("METRICS_TEXTFILE", "metrics/weather_pipeline.prom")
+
+# pula połączeń wspólnego engine'u (src.db.get_engine)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+
+# wymagane ustawienia sprawdzamy dopiero przy pierwszym użyciu (config.DB_URL),
+# żeby joby, które nie wołają API, nie potrzebowały OWM_API_KEY
+_REQUIRED = ("OWM_API_KEY", "DB_URL")
+
+
+def __getattr__(name):
+    if name in _REQUIRED:
+        value = os.getenv(name)
+        if not value:
+            raise RuntimeError(f"Brak {name} w .env")
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,15 +1,138 @@
+import re
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
 from sqlalchemy import create_engine, text
 from sqlalchemy.engine import Engine
+from datetime import datetime
 from pathlib import Path
-from .config import DB_URL
+from . import config, partitions
 
-def get_engine() -> Engine:
-    return create_engine(DB_URL, future=True)
+_engines: Dict[str, Engine] = {}
+_lock = threading.Lock()
 
-def init_schema():
-    sql = Path(__file__).with_name("schemas.sql").read_text(encoding="utf-8")
-    statements = [s.strip() for s in sql.split(";") if s.strip()]
+MIGRATIONS_DIR = Path(__file__).with_name("migrations")
+# url bazy -> wersja schematu potwierdzona w tym procesie (kolejne init_schema nic nie robią)
+_schema_versions: Dict[str, int] = {}
+
+def get_engine(url: str = None) -> Engine:
+    """
+    Wspólny dla procesu engine (z pulą połączeń) – tworzony leniwie przy pierwszym wywołaniu,
+    kolejne wywołania zwracają ten sam obiekt.
+    """
+    url = url or config.DB_URL
+    engine = _engines.get(url)
+    if engine is None:
+        with _lock:
+            engine = _engines.get(url)
+            if engine is None:
+                engine = create_engine(
+                    url, future=True, pool_pre_ping=True,
+                    pool_size=config.DB_POOL_SIZE, max_overflow=config.DB_MAX_OVERFLOW,
+                )
+                _engines[url] = engine
+    return engine
+
+def dispose_engines():
+    """Zamyka pule połączeń (np. w procesie potomnym po fork – połączeń rodzica nie wolno współdzielić)."""
+    with _lock:
+        for engine in _engines.values():
+            engine.dispose(close=False)
+        _engines.clear()
+
+def get_watermark(con, name: str) -> Tuple[Optional[datetime], Optional[int]]:
+    row = con.execute(text("SELECT value_ts, value_id FROM pipeline_watermarks WHERE name = :n"),
+                      {"n": name}).first()
+    return (row[0], row[1]) if row else (None, None)
+
+def set_watermark(con, name: str, value_ts=None, value_id: int = None):
+    con.execute(text("""
+        INSERT INTO pipeline_watermarks (name, value_ts, value_id, updated_at)
+        VALUES (:n, :ts, :id, NOW())
+        ON CONFLICT (name) DO UPDATE
+          SET value_ts = EXCLUDED.value_ts, value_id = EXCLUDED.value_id, updated_at = EXCLUDED.updated_at
+    """), {"n": name, "ts": value_ts, "id": value_id})
+
+def commit_bound(con) -> datetime:
+    """
+    Granica następnego odczytu przyrostowego po kolumnie ustawianej na NOW() (loaded_at, created_at,
+    matched_at): start najstarszej otwartej transakcji albo teraz, w czasie serwera. Wiersz zatwierdzony
+    po odczycie ma NOW() swojej transakcji, czyli nie wcześniejszy niż granica – stąd porównanie `>=`.
+    Cudze sesje widać w pg_stat_activity tylko dla tej samej roli (albo pg_read_all_stats).
+    """
+    return con.execute(text("""
+        SELECT LEAST(NOW(), MIN(xact_start))::timestamp FROM pg_stat_activity
+        WHERE xact_start IS NOT NULL AND datname = current_database()
+    """)).scalar()
+
+# blokada całego cyklu ETL -> predykcja -> analityka (src/scheduler.py, python -m src.etl.run_etl)
+PIPELINE_LOCK = "pipeline"
+
+@contextmanager
+def try_advisory_lock(name: str) -> Iterator[bool]:
+    """
+    Sesyjny pg_try_advisory_lock na osobnym połączeniu, trzymany do końca bloku (yield: czy się udało).
+    Nie czeka – drugi proces od razu dostaje False. Zerwane połączenie zwalnia blokadę samo.
+    """
+    with get_engine().connect().execution_options(isolation_level="AUTOCOMMIT") as con:
+        got = con.execute(text("SELECT pg_try_advisory_lock(hashtext(:n))"), {"n": name}).scalar()
+        try:
+            yield bool(got)
+        finally:
+            if got:
+                con.execute(text("SELECT pg_advisory_unlock(hashtext(:n))"), {"n": name})
+
+def migrations() -> List[Tuple[int, str, Path]]:
+    """Pliki migrations/NNNN_nazwa.sql posortowane po numerze wersji."""
+    out = []
+    for path in MIGRATIONS_DIR.glob("*.sql"):
+        m = re.match(r"(\d+)_(.+)\.sql$", path.name)
+        if m:
+            out.append((int(m.group(1)), m.group(2), path))
+    return sorted(out)
+
+def migrate(con) -> List[int]:
+    """Wykonuje brakujące migracje (każda raz, w kolejności wersji). Zwraca zastosowane wersje."""
+    con.execute(text("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP NOT NULL DEFAULT NOW()
+        )
+    """))
+    # dwa procesy startujące naraz: drugi czeka i widzi już zastosowane wersje
+    con.execute(text("SELECT pg_advisory_xact_lock(hashtext('schema_migrations'))"))
+    applied = set(con.execute(text("SELECT version FROM schema_migrations")).scalars())
+    done = []
+    for version, name, path in migrations():
+        if version in applied:
+            continue
+        # cały plik jednym wywołaniem – serwer sam dzieli go na instrukcje
+        con.exec_driver_sql(path.read_text(encoding="utf-8"))
+        con.execute(text("INSERT INTO schema_migrations (version, name) VALUES (:v, :n)"),
+                    {"v": version, "n": name})
+        done.append(version)
+    return done
+
+def init_schema(force: bool = False):
+    """
+    Schemat w najnowszej wersji. W procesie, który już to sprawdził, nic nie robi
+    (force=True – sprawdza ponownie, np. po DROP SCHEMA), w nowym procesie – jedno zapytanie
+    o wersję, DDL tylko przy nowych migracjach.
+    """
     engine = get_engine()
+    url = str(engine.url)
+    target = migrations()[-1][0]
+    if not force and _schema_versions.get(url) == target:
+        return
     with engine.begin() as con:
-        for stmt in statements:
-            con.execute(text(stmt + ";"))
+        has_table = con.execute(text("SELECT to_regclass('schema_migrations') IS NOT NULL")).scalar()
+        current = con.execute(text("SELECT MAX(version) FROM schema_migrations")).scalar() if has_table else None
+        if current != target:
+            applied = migrate(con)
+            if applied:
+                print(f"[db] zastosowano migracje: {', '.join(map(str, applied))}")
+        # raz na proces: stara instalacja z niepartycjonowanymi tabelami surowymi
+        partitions.warn_unpartitioned(con)
+        partitions.ensure_current(con)
+    _schema_versions[url] = target
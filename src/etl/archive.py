@@ -0,0 +1,155 @@
+# src/etl/archive.py
+"""
+Archiwum surowych odpowiedzi OWM. Każda nowa odpowiedź pobrana przez ETL (także taka, której zapis
+do bazy się nie uda) trafia jako linia JSON do pliku godzinowego wg czasu pobrania (UTC):
+
+    <OWM_ARCHIVE_DIR>/YYYY-MM-DD/HH.jsonl.gz
+
+    {"fetched_at": 1718000000, "kind": "group" | "current" | "forecast", "key": ..., "body": {...}}
+
+`key` jak w fetch_all: city_id albo – dla /group – pary [owm_id, [city_id, ...]].
+Jeden write() = jeden człon gzip dopisany na koniec pliku (gzip czyta kolejne człony jako
+jeden strumień), więc plik rośnie przez całą godzinę bez przepisywania.
+
+replay() wczytuje archiwum bez sieci: pliki są dekodowane i normalizowane równolegle w procesach,
+a zapisywane przez upsert_frames w kolejności czasu pobrania – nowsza prognoza dla tego
+samego slotu wygrywa, tak jak przy zwykłym ETL. Wiersze prognoz niosą fetched_at z archiwum,
+a upsert nie nadpisuje nimi prognoz pobranych później (load.UPSERT_GUARD) – odtworzenie
+starszego archiwum nie cofa bieżących danych.
+"""
+import gzip
+import json
+import os
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+from ..config import OWM_ARCHIVE_DIR
+from .cells import fan_out
+from .transform import current_frame, current_group_items, forecast_frame
+
+try:   # opcjonalnie – szybszy (de)serializator, format pliku ten sam
+    from orjson import dumps as _dumps, loads as _loads
+except ImportError:
+    _loads = json.loads
+
+    def _dumps(obj) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+REPLAY_WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))
+# tyle plików godzinowych na jeden upsert (jedna transakcja + odświeżenie agregatów)
+REPLAY_CHUNK_FILES = 24
+
+
+def _path(root: str, ts: float) -> str:
+    t = datetime.fromtimestamp(ts, tz=timezone.utc)
+    return os.path.join(root, f"{t:%Y-%m-%d}", f"{t:%H}.jsonl.gz")
+
+
+def _key(kind: str, key: Any):
+    if kind == "group":
+        return [[int(owm_id), [int(c) for c in city_ids]] for owm_id, city_ids in key.items()]
+    return int(key)
+
+
+def write(results: Iterable[Tuple[str, Any, Dict[str, Any]]], root: str = OWM_ARCHIVE_DIR,
+          fetched_at: float = None) -> Optional[str]:
+    """Dopisuje krotki (rodzaj, klucz, json) z fetch_all/fetch_iter do pliku bieżącej godziny. Pusty `root` wyłącza archiwum."""
+    if not root:
+        return None
+    fetched_at = int(time.time() if fetched_at is None else fetched_at)
+    lines = [_dumps({"fetched_at": fetched_at, "kind": kind, "key": _key(kind, key), "body": body})
+             for kind, key, body in results]
+    if not lines:
+        return None
+    path = _path(root, fetched_at)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    payload = gzip.compress(b"\n".join(lines) + b"\n")
+    # jednym write – przerwany zapis psuje najwyżej ostatni człon, wcześniejsze da się przeczytać
+    with open(path, "ab") as f:
+        f.write(payload)
+    return path
+
+
+def archive_files(since: date = None, until: date = None, root: str = OWM_ARCHIVE_DIR) -> List[str]:
+    """Pliki archiwum z dni [since, until), posortowane po czasie."""
+    if not root or not os.path.isdir(root):
+        return []
+    paths = []
+    for day in sorted(os.listdir(root)):
+        try:
+            d = date.fromisoformat(day)
+        except ValueError:
+            continue
+        if (since is None or d >= since) and (until is None or d < until):
+            paths.extend(os.path.join(root, day, f) for f in sorted(os.listdir(os.path.join(root, day)))
+                         if f.endswith(".jsonl.gz"))
+    return paths
+
+
+def read_file(path: str) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Plik archiwum -> (ramka weather_current, ramka weather_forecast)."""
+    curr_items, fc_responses, fc_fetched = [], [], []
+    try:
+        with gzip.open(path, "rb") as f:
+            for line in f:
+                rec = _loads(line)
+                kind, key, body = rec["kind"], rec["key"], rec["body"]
+                if kind == "group":
+                    curr_items.extend(current_group_items(body, {owm_id: ids for owm_id, ids in key}))
+                elif kind == "current":
+                    curr_items.append((key, body))
+                else:
+                    fc_responses.append((key, body))
+                    fc_fetched.append(rec["fetched_at"])
+    except (EOFError, OSError, zlib.error, ValueError) as e:
+        # urwany ostatni człon (np. przerwany ETL) – zostaje to, co dało się przeczytać
+        print(f"[archive] {path}: {e} – wczytano {len(curr_items)} + {len(fc_responses)} odpowiedzi")
+    return current_frame(curr_items), forecast_frame(fc_responses, fc_fetched)
+
+
+def replay(since: date = None, until: date = None, workers: int = REPLAY_WORKERS,
+           chunk_files: int = REPLAY_CHUNK_FILES, root: str = OWM_ARCHIVE_DIR,
+           members: Dict[int, List[int]] = None) -> Dict[str, Any]:
+    """
+    Wczytuje archiwum do bazy (transform + upsert_frames). Najwyżej 2 × workers plików
+    czeka naraz w pamięci. `members` – bieżące komórki miast (cells.active): wiersze miasta
+    pobieranego trafiają też do pozostałych miast komórki, jak w ETL.
+    Zwraca liczby wierszy i najstarszy wczytany ts_utc (dla feature_store).
+    """
+    from .load import upsert_frames
+
+    paths = archive_files(since, until, root)
+    stats = {"files": len(paths), "current": 0, "forecast": 0, "ts_min": None}
+    batch: List[Tuple[pd.DataFrame, pd.DataFrame]] = []
+
+    def _flush():
+        curr = fan_out(pd.concat([c for c, _ in batch], ignore_index=True), members)
+        fc = fan_out(pd.concat([f for _, f in batch], ignore_index=True), members)
+        batch.clear()
+        # ta sama para klucza w kilku plikach: copy_upsert zostawia ostatnią, czyli najnowszą
+        upsert_frames([(curr, "weather_current", ["city_id", "ts_utc"]),
+                       (fc, "weather_forecast", ["city_id", "ts_forecast_utc"])])
+        stats["current"] += len(curr)
+        stats["forecast"] += len(fc)
+        if not curr.empty:
+            ts = curr["ts_utc"].min()
+            stats["ts_min"] = ts if stats["ts_min"] is None else min(stats["ts_min"], ts)
+
+    todo = iter(paths)
+    with ProcessPoolExecutor(max_workers=max(1, workers)) as ex:
+        pending = deque(ex.submit(read_file, p) for _, p in zip(range(2 * max(1, workers)), todo))
+        while pending:
+            batch.append(pending.popleft().result())
+            nxt = next(todo, None)
+            if nxt is not None:
+                pending.append(ex.submit(read_file, nxt))
+            if len(batch) >= chunk_files:
+                _flush()
+    if batch:
+        _flush()
+    return stats
@@ -0,0 +1,118 @@
+# src/etl/cells.py
+"""
+Łączenie zapytań dla pobliskich miast. (lat, lon) każdego miasta trafia do komórki siatki o boku
+OWM_CELL_KM (wiersze co stały krok szerokości, w wierszu krok długości rosnący z cos(lat),
+więc komórki mają w przybliżeniu ten sam rozmiar w km). Przypisanie jest trzymane w city_cells
+i przeliczane tylko dla miast nowych, przesuniętych albo po zmianie OWM_CELL_KM.
+
+ETL pobiera dane raz na komórkę – dla miasta o najmniejszym city_id – a znormalizowane wiersze
+kopiuje (fan_out) na wszystkie aktywne miasta komórki. Gdy do komórki dochodzi miasto, odpowiedź
+jej przedstawiciela w cache OWM przestaje być „załadowana” (owm_client.forget_loaded) – inaczej
+nowe miasto czekałoby na prognozy, aż OWM zmieni odpowiedź (304 / ten sam hash).
+
+    python -m src.etl.cells      # przelicza przypisania i pokazuje, ile zapytań odpada
+"""
+from typing import Dict, Iterable, List, Tuple
+
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from .. import config
+
+KM_PER_DEG_LAT = 111.32
+
+REFRESH_SQL = """
+WITH k AS (
+    SELECT c.city_id, c.lat, c.lon,
+           CASE WHEN d.dlat IS NULL THEN 'city:' || c.city_id
+                ELSE floor(c.lat / d.dlat)::bigint || ':' ||
+                     floor(c.lon * greatest(cos(radians((floor(c.lat / d.dlat) + 0.5) * d.dlat)), 0.01)
+                           / d.dlat)::bigint
+           END AS cell_key
+    FROM cities c
+    CROSS JOIN (SELECT NULLIF(CAST(:km AS DOUBLE PRECISION), 0) / :km_per_deg AS dlat) d
+)
+INSERT INTO city_cells (city_id, cell_key, cell_km, lat, lon, updated_at)
+SELECT k.city_id, k.cell_key, :km, k.lat, k.lon, NOW()
+FROM k LEFT JOIN city_cells cc ON cc.city_id = k.city_id
+WHERE cc.city_id IS NULL OR cc.lat <> k.lat OR cc.lon <> k.lon OR cc.cell_km <> :km
+ON CONFLICT (city_id) DO UPDATE
+SET cell_key = EXCLUDED.cell_key, cell_km = EXCLUDED.cell_km,
+    lat = EXCLUDED.lat, lon = EXCLUDED.lon, updated_at = EXCLUDED.updated_at
+RETURNING city_id;
+"""
+
+ACTIVE_SQL = """
+SELECT c.city_id, c.lat, c.lon, c.owm_id, cc.cell_key
+FROM cities c LEFT JOIN city_cells cc ON cc.city_id = c.city_id
+WHERE c.is_active
+ORDER BY c.city_id;
+"""
+
+City = Tuple[int, float, float, object]
+
+
+def refresh(con: Connection, cell_km: float = None) -> List[int]:
+    """Przelicza komórki miast nowych/zmienionych (albo wszystkich po zmianie rozmiaru). Zwraca przeliczone city_id."""
+    cell_km = max(0.0, config.OWM_CELL_KM if cell_km is None else cell_km)
+    return list(con.execute(text(REFRESH_SQL), {"km": cell_km, "km_per_deg": KM_PER_DEG_LAT}).scalars())
+
+
+def coalesce(cities: Iterable[Tuple[int, float, float, object, str]]) -> Tuple[List[City], Dict[int, List[int]]]:
+    """
+    (city_id, lat, lon, owm_id, cell_key) -> (miasta do pobrania, {pobierane city_id: miasta jego komórki}).
+    Słownik ma tylko komórki z więcej niż jednym miastem; brak cell_key = osobna komórka.
+    """
+    by_cell: Dict[str, list] = {}
+    for city_id, lat, lon, owm_id, cell_key in cities:
+        by_cell.setdefault(cell_key or f"city:{city_id}", []).append((city_id, lat, lon, owm_id))
+    fetch, members = [], {}
+    for rows in by_cell.values():
+        rep = min(rows, key=lambda r: r[0])
+        fetch.append(rep)
+        if len(rows) > 1:
+            members[rep[0]] = sorted(r[0] for r in rows)
+    return fetch, members
+
+
+def active(con: Connection) -> Tuple[List[City], Dict[int, List[int]]]:
+    """Aktywne miasta po złączeniu w komórki (jak coalesce)."""
+    return coalesce(con.execute(text(ACTIVE_SQL)).all())
+
+
+def representatives(fetch: List[City], members: Dict[int, List[int]], city_ids: Iterable[int]) -> List[City]:
+    """Pobierane miasta komórek, do których należą `city_ids` (np. przeliczone w refresh)."""
+    ids = set(city_ids)
+    return [c for c in fetch if c[0] in ids or ids.intersection(members.get(c[0], ()))]
+
+
+def fan_out(df: pd.DataFrame, members: Dict[int, List[int]]) -> pd.DataFrame:
+    """Wiersze miasta pobieranego powielone na wszystkie miasta jego komórki (wektorowo, przez merge)."""
+    if df.empty or not members:
+        return df
+    pairs = pd.DataFrame([(rep, cid) for rep, ids in members.items() for cid in ids], columns=["_rep", "city_id"])
+    hit = df["city_id"].isin(pairs["_rep"])
+    if not hit.any():
+        return df
+    out = df[hit].rename(columns={"city_id": "_rep"}).merge(pairs, on="_rep")[df.columns]
+    # własne wiersze miast na końcu: przy tym samym kluczu copy_upsert zostawia ostatni
+    return pd.concat([out, df[~hit]], ignore_index=True)
+
+
+def main():
+    from ..db import get_engine, init_schema
+
+    init_schema()
+    with get_engine().begin() as con:
+        changed = refresh(con)
+        fetch, members = active(con)
+    n_active = len(fetch) + sum(len(ids) - 1 for ids in members.values())
+    print(f"OWM_CELL_KM={config.OWM_CELL_KM:g}: przeliczono {len(changed)} przypisań; "
+          f"{n_active} aktywnych miast -> {len(fetch)} komórek do pobrania")
+    for rep, ids in sorted(members.items(), key=lambda kv: -len(kv[1]))[:10]:
+        print(f"  city_id {rep}: {len(ids)} miast ({', '.join(map(str, ids[:8]))}{', ...' if len(ids) > 8 else ''})")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,38 @@
+from typing import List, Tuple
 import pandas as pd
-from sqlalchemy import text
+from ..bulk import copy_upsert
 from ..db import get_engine
+from .. import metrics, partitions
+from . import weather_rollups
+
+# warunek nadpisania istniejącego wiersza: prognoza ze starszej odpowiedzi (np. replay starego
+# archiwum) nie cofa nowszej; NULL = wiersz sprzed migracji 0008, czas pobrania nieznany
+UPSERT_GUARD = {
+    "weather_forecast": "weather_forecast.fetched_at IS NULL OR EXCLUDED.fetched_at >= weather_forecast.fetched_at",
+}
+
+def _upsert(con, df: pd.DataFrame, table: str, conflict_cols: list):
+    with metrics.timer("partitions_ensure", table=table):
+        partitions.ensure_for_frame(con, table, df)
+    with metrics.timer("db_upsert", table=table):
+        copy_upsert(con, df, table, conflict_cols, touch="loaded_at",   # znacznik dla eksportów
+                    where=UPSERT_GUARD.get(table))
+    # agregaty godzinowe/dzienne w tej samej transakcji – nigdy nie rozjadą się z surowymi danymi
+    with metrics.timer("rollup_refresh", table=table):
+        weather_rollups.refresh_for_frame(con, table, df)
+    metrics.inc("rows_loaded", len(df), table=table)
 
 def upsert_dataframe(df: pd.DataFrame, table: str, conflict_cols: list):
     if df is None or df.empty:
         return
-    engine = get_engine()
-    with engine.begin() as con:
-        tmp = "_stg_" + table
-        df.to_sql(tmp, con, if_exists="replace", index=False)
-        cols = ", ".join(df.columns)
-        conflict = ", ".join(conflict_cols)
-        updates = ", ".join([f"{c}=EXCLUDED.{c}" for c in df.columns if c not in conflict_cols])
-        con.execute(text(f"""
-            INSERT INTO {table} ({cols})
-            SELECT {cols} FROM {tmp}
-            ON CONFLICT ({conflict}) DO UPDATE SET {updates};
-        """))
-        con.execute(text(f"DROP TABLE {tmp};"))
+    with get_engine().begin() as con:
+        _upsert(con, df, table, conflict_cols)
+
+def upsert_frames(frames: List[Tuple[pd.DataFrame, str, list]]):
+    """Kilka ramek (df, tabela, klucz) w jednej transakcji – mikro-partia ETL zapisuje się w całości albo wcale."""
+    frames = [f for f in frames if f[0] is not None and not f[0].empty]
+    if not frames:
+        return
+    with get_engine().begin() as con:
+        for df, table, conflict_cols in frames:
+            _upsert(con, df, table, conflict_cols)
@@ -1,24 +1,346 @@
+import json
+import queue
+import random
+import threading
+import time
 import requests
-from typing import Dict, Any
-from ..config import OWM_API_KEY, DEFAULT_UNITS, DEFAULT_LANG
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple
+from .. import config, metrics
+from ..config import (
+    DEFAULT_UNITS, DEFAULT_LANG, OWM_BASE_URL, OWM_RATE_PER_MIN,
+    OWM_MAX_WORKERS, OWM_MAX_RETRIES, OWM_BACKOFF_S, OWM_TIMEOUT_S,
+    OWM_CACHE_PATH, OWM_CACHE_TTL_CURRENT_S, OWM_CACHE_TTL_FORECAST_S, ETL_QUEUE_SIZE,
+)
+from .response_cache import ResponseCache, body_hash
+
+try:   # opcjonalnie – kilka razy szybszy dekoder, wynik ten sam co json.loads
+    from orjson import loads as _loads
+except ImportError:
+    _loads = json.loads
+
+BASE = OWM_BASE_URL
+
+# /group przyjmuje maksymalnie 20 id miast w jednym zapytaniu
+GROUP_MAX_IDS = 20
+
+CACHE_TTL_S = {"weather": OWM_CACHE_TTL_CURRENT_S, "forecast": OWM_CACHE_TTL_FORECAST_S}
+
+# statusy, przy których warto ponowić zapytanie (limit planu / chwilowa awaria po stronie OWM)
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """
+    Limiter zapytań typu „token bucket”: średnio `rate_per_min` zapytań na minutę,
+    chwilowo maksymalnie `capacity` naraz. `rate_per_min <= 0` wyłącza limit.
+    """
+
+    def __init__(self, rate_per_min: float, capacity: float = None):
+        self.rate = rate_per_min / 60.0
+        self.capacity = capacity if capacity is not None else max(1.0, self.rate)
+        self._tokens = self.capacity
+        self._ts = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        # czekanie pod lockiem ustawia wątki w kolejce – kolejne dostają token po kolei
+        with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._ts) * self.rate)
+                self._ts = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                time.sleep((1 - self._tokens) / self.rate)
+
+
+_bucket = TokenBucket(OWM_RATE_PER_MIN)
+_local = threading.local()
+
+
+def _session() -> requests.Session:
+    # jedna sesja keep-alive na wątek – połączenia TCP/TLS są używane ponownie między miastami
+    s = getattr(_local, "session", None)
+    if s is None:
+        s = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=2)
+        s.mount("https://", adapter)
+        s.mount("http://", adapter)
+        _local.session = s
+    return s
+
+
+def _backoff(attempt: int) -> float:
+    delay = OWM_BACKOFF_S * (2 ** attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def _request(endpoint: str, params: Dict[str, Any], headers: Dict[str, str] = None) -> requests.Response:
+    for attempt in range(OWM_MAX_RETRIES + 1):
+        with metrics.timer("owm_rate_wait"):
+            _bucket.acquire()
+        try:
+            with metrics.timer("owm_request", endpoint=endpoint):
+                r = _session().get(f"{BASE}/{endpoint}", params=params, headers=headers, timeout=OWM_TIMEOUT_S)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            metrics.inc("owm_requests", endpoint=endpoint, status=type(e).__name__)
+            if attempt == OWM_MAX_RETRIES:
+                raise
+            time.sleep(_backoff(attempt))
+            continue
+
+        metrics.inc("owm_requests", endpoint=endpoint, status=r.status_code)
+        if r.status_code in RETRY_STATUS and attempt < OWM_MAX_RETRIES:
+            retry_after = r.headers.get("Retry-After", "")
+            time.sleep(float(retry_after) if retry_after.isdigit() else _backoff(attempt))
+            continue
+
+        r.raise_for_status()
+        return r
+
+
+def _get(endpoint: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    return _loads(_request(endpoint, params).content)
+
+
+_cache: Optional[ResponseCache] = None
+_cache_lock = threading.Lock()
+_pending: set = set()
+
+
+def _get_cache() -> Optional[ResponseCache]:
+    global _cache
+    if _cache is None and OWM_CACHE_PATH:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache(OWM_CACHE_PATH)
+    return _cache
+
+
+def cache_key(endpoint: str, lat: float, lon: float) -> str:
+    return f"{endpoint}:{lat:.4f}:{lon:.4f}:{DEFAULT_UNITS}:{DEFAULT_LANG}"
+
+
+def _fetch_cached(endpoint: str, lat: float, lon: float) -> Tuple[Dict[str, Any], bool]:
+    """
+    Zwraca (json, czy_nowy). W okresie TTL odpowiedź pochodzi z cache; po jego upływie
+    idzie zapytanie warunkowe (If-None-Match / If-Modified-Since). `czy_nowy` = False
+    oznacza, że ta wersja odpowiedzi jest już w bazie i można pominąć normalize + upsert.
+    """
+    params = _params(lat, lon)
+    cache = _get_cache() if CACHE_TTL_S.get(endpoint, 0) > 0 else None
+    if cache is None:
+        return _get(endpoint, params), True
+
+    key = cache_key(endpoint, lat, lon)
+    entry = cache.get(key)
+    if entry is None or time.time() - entry.fetched_at >= CACHE_TTL_S[endpoint]:
+        headers = {}
+        if entry is not None and entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry is not None and entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+        r = _request(endpoint, params, headers)
+        if entry is not None and (r.status_code == 304 or body_hash(r.content) == entry.body_hash):
+            cache.touch(key)
+            metrics.inc("owm_cache", endpoint=endpoint, result="unchanged")
+        else:
+            entry = cache.put(key, r.content, r.headers.get("ETag"), r.headers.get("Last-Modified"))
+            metrics.inc("owm_cache", endpoint=endpoint, result="new")
+    else:
+        metrics.inc("owm_cache", endpoint=endpoint, result="fresh")
+
+    if entry.is_loaded:
+        return _loads(entry.body), False
+    with _cache_lock:
+        _pending.add(key)
+    return _loads(entry.body), True
+
+
+def forget_loaded(cities: Iterable[Tuple[int, float, float, Any]]) -> int:
+    """
+    Wersje odpowiedzi tych miast w cache uznajemy za niezapisane: następny fetch (także 304 / ten sam
+    hash) odda je do zapisu. Np. przedstawiciel komórki, do której doszło miasto (cells.refresh).
+    """
+    cache = _get_cache()
+    if cache is None:
+        return 0
+    keys = [cache_key(endpoint, lat, lon) for _, lat, lon, _ in cities for endpoint in CACHE_TTL_S]
+    cache.forget_loaded(keys)
+    return len(keys)
+
+
+def commit_cache(keys: Iterable[str] = None):
+    """
+    Wywoływane po udanym zapisie do bazy: pobrane wersje odpowiedzi oznaczamy jako załadowane.
+    `keys` – tylko te (klucze z fetch_iter zapisanej mikro-partii); None = wszystkie oczekujące.
+    """
+    cache = _get_cache()
+    with _cache_lock:
+        if keys is None:
+            keys = list(_pending)
+            _pending.clear()
+        else:
+            keys = [k for k in keys if k in _pending]
+            _pending.difference_update(keys)
+    if cache is not None and keys:
+        cache.mark_loaded(keys)
 
-BASE = "https://api.openweathermap.org/data/2.5"
 
 def _params(lat: float, lon: float):
     return {
         "lat": lat,
         "lon": lon,
-        "appid": OWM_API_KEY,
+        "appid": config.OWM_API_KEY,
         "units": DEFAULT_UNITS,
         "lang": DEFAULT_LANG
     }
 
 def fetch_current(lat: float, lon: float) -> Dict[str, Any]:
-    r = requests.get(f"{BASE}/weather", params=_params(lat, lon), timeout=20)
-    r.raise_for_status()
-    return r.json()
+    return _fetch_cached("weather", lat, lon)[0]
 
 def fetch_forecast(lat: float, lon: float) -> Dict[str, Any]:
-    r = requests.get(f"{BASE}/forecast", params=_params(lat, lon), timeout=20)
-    r.raise_for_status()
-    return r.json()
+    return _fetch_cached("forecast", lat, lon)[0]
+
+
+def fetch_current_group(owm_ids: List[int]) -> Dict[str, Any]:
+    """Pogoda bieżąca dla maks. GROUP_MAX_IDS miast (id OpenWeather) w jednym zapytaniu."""
+    params = {k: v for k, v in _params(0, 0).items() if k not in ("lat", "lon")}
+    params["id"] = ",".join(str(i) for i in owm_ids)
+    return _get("group", params)
+
+
+def _has_id(owm_id) -> bool:
+    # brak id w DataFrame przychodzi jako None albo NaN
+    return owm_id is not None and owm_id == owm_id
+
+
+class _Plan:
+    """Zadania pobrania dla listy miast: ("group", (owm_id, ...)), ("current", city_id), ("forecast", city_id)."""
+
+    def __init__(self, cities: Iterable[Tuple[int, float, float, Any]]):
+        self.by_owm_id: Dict[int, List[int]] = {}
+        self.coords: Dict[int, Tuple[float, float]] = {}
+        no_id: List[int] = []
+        for city_id, lat, lon, owm_id in cities:
+            self.coords[city_id] = (lat, lon)
+            if _has_id(owm_id):
+                self.by_owm_id.setdefault(int(owm_id), []).append(city_id)
+            else:
+                no_id.append(city_id)
+        owm_ids = list(self.by_owm_id)
+        self.tasks: List[Tuple[str, Any]] = [("group", tuple(owm_ids[i:i + GROUP_MAX_IDS]))
+                                             for i in range(0, len(owm_ids), GROUP_MAX_IDS)]
+        self.tasks += [("current", city_id) for city_id in no_id]
+        self.tasks += [("forecast", city_id) for city_id in self.coords]
+
+    def run(self, task: Tuple[str, Any]) -> list:
+        """Wyniki jednego zadania; błąd (po ponowieniach w _request) -> ("failed", zadanie, wyjątek, None)."""
+        kind, key = task
+        try:
+            if kind == "group":
+                with metrics.timer("owm_fetch", endpoint="group"):
+                    return self._group(key)
+            endpoint = "weather" if kind == "current" else "forecast"
+            lat, lon = self.coords[key]
+            with metrics.timer("owm_fetch", endpoint=endpoint):
+                j, is_new = _fetch_cached(endpoint, lat, lon)
+            return [(kind, key, j, cache_key(endpoint, lat, lon))] if is_new else []
+        except Exception as e:
+            metrics.inc("owm_failed", endpoint=kind)
+            return [("failed", task, e, None)]
+
+    def _group(self, ids: Tuple[int, ...]) -> list:
+        j = fetch_current_group(list(ids))
+        out = [("group", {i: self.by_owm_id[i] for i in ids}, j, None)]
+        # id nieznane po stronie OWM -> fallback po współrzędnych
+        returned = {it.get("id") for it in j.get("list", [])}
+        for i in ids:
+            if i not in returned:
+                for city_id in self.by_owm_id[i]:
+                    out.extend(self.run(("current", city_id)))
+        return out
+
+
+def fetch_iter(cities: Iterable[Tuple[int, float, float, Any]], tasks: Iterable[Tuple[str, Any]] = None,
+               max_workers: int = OWM_MAX_WORKERS, queue_size: int = ETL_QUEUE_SIZE
+               ) -> Iterator[Tuple[str, Any, Any, Optional[str]]]:
+    """
+    Strumieniowa wersja fetch_all: krotki (rodzaj, klucz, json, klucz_cache) w kolejności pobrania.
+    Gdy w kolejce czeka `queue_size` nieodebranych wyników, wątki pobierające stają (backpressure),
+    więc pamięć nie rośnie z liczbą miast (0 = bez limitu).
+
+    Błąd jednego zapytania nie przerywa reszty – przychodzi jako ("failed", zadanie, wyjątek, None);
+    zadania można przekazać w `tasks` kolejnego wywołania (kolejka ponowień).
+    `klucz_cache` przekazujemy do commit_cache() po zapisie partii, w której była odpowiedź.
+    """
+    plan = _Plan(cities)
+    todo = plan.tasks if tasks is None else list(tasks)
+    if not todo:
+        return
+    q: queue.Queue = queue.Queue(maxsize=max(0, queue_size))
+    stop = threading.Event()
+    done = object()
+    left = [len(todo)]
+    left_lock = threading.Lock()
+
+    def _put(item):
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _worker(task):
+        try:
+            if not stop.is_set():
+                for item in plan.run(task):
+                    _put(item)
+        finally:
+            with left_lock:
+                left[0] -= 1
+                last = left[0] == 0
+            if last:
+                _put(done)
+
+    worker = metrics.bind(_worker)   # czasy zapytań z wątków trafiają do przebiegu joba, który pobiera
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="owm") as ex:
+        for task in todo:
+            ex.submit(worker, task)
+        try:
+            while True:
+                item = q.get()
+                if item is done:
+                    break
+                yield item
+        finally:
+            # konsument przerwał (np. błąd zapisu) – wątki nie czekają już na miejsce w kolejce
+            stop.set()
+
+
+def fetch_all(cities: Iterable[Tuple[int, float, float, Any]],
+              max_workers: int = OWM_MAX_WORKERS) -> List[Tuple[str, Any, Dict[str, Any]]]:
+    """
+    Pobiera pogodę bieżącą i prognozę dla wielu miast równolegle (pula wątków).
+    `cities` – krotki (city_id, lat, lon, owm_id). Limit zapytań/min jest wspólny dla wszystkich wątków.
+
+    Wynik to lista krotek (rodzaj, klucz, json):
+      - ("group", {owm_id: [city_id, ...]}, json z /group)  – miasta z id OWM, po GROUP_MAX_IDS na zapytanie,
+      - ("current", city_id, json z /weather)               – miasta bez id (albo pominięte przez /group),
+      - ("forecast", city_id, json z /forecast)             – tylko prognozy, których jeszcze nie ma w bazie.
+
+    Pierwszy błąd pobrania przerywa całość (strumieniowo i z tolerancją błędów: fetch_iter).
+    Po zapisaniu wyników do bazy należy wywołać `commit_cache()`.
+    """
+    out = []
+    for kind, key, j, _ in fetch_iter(cities, max_workers=max_workers, queue_size=0):
+        if kind == "failed":
+            raise j
+        out.append((kind, key, j))
+    return out
@@ -0,0 +1,90 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional, NamedTuple, Iterable
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    body_hash: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fetched_at: float
+    loaded_hash: Optional[str]
+
+    @property
+    def is_loaded(self) -> bool:
+        """Czy ta wersja odpowiedzi została już zapisana do bazy (ETL ją pominie)."""
+        return self.loaded_hash == self.body_hash
+
+
+def body_hash(body: bytes) -> str:
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+class ResponseCache:
+    """
+    Cache odpowiedzi OpenWeather w SQLite (jeden plik, bezpieczny dla wątków ETL).
+    Poza treścią trzyma ETag/Last-Modified do rewalidacji warunkowej oraz hash
+    wersji już załadowanej do bazy – niezmienione odpowiedzi nie są ponownie upsertowane.
+    """
+
+    def __init__(self, path: str):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._con = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._con.execute("PRAGMA journal_mode=WAL")
+            self._con.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    body BLOB NOT NULL,
+                    body_hash TEXT NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    fetched_at REAL NOT NULL,
+                    loaded_hash TEXT
+                )
+            """)
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        with self._lock:
+            row = self._con.execute(
+                "SELECT body, body_hash, etag, last_modified, fetched_at, loaded_hash "
+                "FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+        return CachedResponse(*row) if row else None
+
+    def put(self, key: str, body: bytes, etag: Optional[str], last_modified: Optional[str]) -> CachedResponse:
+        h = body_hash(body)
+        now = time.time()
+        with self._lock:
+            self._con.execute("""
+                INSERT INTO responses (key, body, body_hash, etag, last_modified, fetched_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (key) DO UPDATE SET
+                    body = excluded.body, body_hash = excluded.body_hash, etag = excluded.etag,
+                    last_modified = excluded.last_modified, fetched_at = excluded.fetched_at
+            """, (key, body, h, etag, last_modified, now))
+            row = self._con.execute("SELECT loaded_hash FROM responses WHERE key = ?", (key,)).fetchone()
+        return CachedResponse(body, h, etag, last_modified, now, row[0])
+
+    def touch(self, key: str):
+        """Odpowiedź zrewalidowana (304 / ta sama treść) – przedłuża TTL."""
+        with self._lock:
+            self._con.execute("UPDATE responses SET fetched_at = ? WHERE key = ?", (time.time(), key))
+
+    def forget_loaded(self, keys: Iterable[str]):
+        """Ta wersja odpowiedzi ma być zapisana ponownie (np. dla nowych miast komórki)."""
+        with self._lock:
+            self._con.executemany(
+                "UPDATE responses SET loaded_hash = NULL WHERE key = ?", [(k,) for k in keys]
+            )
+
+    def mark_loaded(self, keys: Iterable[str]):
+        with self._lock:
+            self._con.executemany(
+                "UPDATE responses SET loaded_hash = body_hash WHERE key = ?", [(k,) for k in keys]
+            )
@@ -1,10 +1,20 @@
+import argparse
+import time
+from datetime import date
+
 import pandas as pd
+import psycopg2
 from pathlib import Path
 from sqlalchemy import text
-from ..db import init_schema, get_engine
-from .owm_client import fetch_current, fetch_forecast
-from .transform import normalize_current, normalize_forecast
-from .load import upsert_dataframe
+from sqlalchemy.exc import SQLAlchemyError
+from ..db import PIPELINE_LOCK, init_schema, get_engine, try_advisory_lock
+from .. import config, metrics, partitions
+from .owm_client import fetch_iter, commit_cache, forget_loaded
+from . import archive, cells
+from .transform import current_frame, current_group_items, forecast_frame
+from .load import upsert_frames
+from ..ml import feature_store
+from ..analytics import kpi_rollups
 
 def seed_cities_if_empty():
     engine = get_engine()
@@ -14,24 +24,170 @@ def seed_cities_if_empty():
             df = pd.read_csv(Path(__file__).with_name("cities_seed.csv"))
             df.to_sql("cities", con, if_exists="append", index=False)
 
-def run():
+class _MicroBatch:
+    """
+    Odpowiedzi czekające na zapis. Po ETL_BATCH_ROWS wierszach flush(): archiwum, normalizacja,
+    powielenie wierszy na miasta tej samej komórki (`members`, cells.fan_out), jedna transakcja
+    dla obu tabel i commit_cache tylko dla odpowiedzi z tej partii.
+    Partia, której zapis się nie udał (błąd bazy), czeka w `failed` – gotowe ramki, bez ponownego
+    pobierania – na retry_failed() w przebiegu ponowień; reszta partii idzie dalej.
+    """
+
+    def __init__(self, batch_rows: int, members: dict = None):
+        self.batch_rows = batch_rows
+        self.members = members or {}
+        self.stats = {"batches": 0, "current": 0, "forecast": 0, "failed_batches": 0}
+        self.failed = []   # (ramka current, ramka forecast, klucze cache)
+        self._reset()
+
+    def _reset(self):
+        self.results, self.cache_keys = [], []
+        self.curr_items, self.fc_responses = [], []
+        self.rows = 0
+
+    def add(self, kind: str, key, j, cache_key=None):
+        self.results.append((kind, key, j))
+        if cache_key:
+            self.cache_keys.append(cache_key)
+        if kind == "group":
+            items = current_group_items(j, key)
+            self.curr_items.extend(items)
+            self.rows += len(items)
+        elif kind == "current":
+            self.curr_items.append((key, j))
+            self.rows += 1
+        else:
+            self.fc_responses.append((key, j))
+            self.rows += len(j.get("list", []))
+        if self.rows >= self.batch_rows:
+            self.flush()
+
+    def flush(self):
+        if not self.results:
+            return
+        fetched_at = time.time()   # ten sam czas w archiwum i w weather_forecast.fetched_at
+        archive.write(self.results, fetched_at=fetched_at)   # przed zapisem do bazy – surowa odpowiedź zostaje nawet przy błędzie ładowania
+        curr = cells.fan_out(current_frame(self.curr_items), self.members)
+        fc = cells.fan_out(forecast_frame(self.fc_responses, int(fetched_at)), self.members)
+        cache_keys = self.cache_keys
+        self._reset()
+        self._load(curr, fc, cache_keys)
+
+    def _load(self, curr: pd.DataFrame, fc: pd.DataFrame, cache_keys: list) -> bool:
+        try:
+            upsert_frames([(curr, "weather_current", ["city_id", "ts_utc"]),
+                           (fc, "weather_forecast", ["city_id", "ts_forecast_utc"])])
+        except (SQLAlchemyError, psycopg2.Error) as e:
+            # transakcja partii wycofana w całości; cache bez commitu, więc kolejny ETL i tak pobierze od nowa
+            print(f"[etl] zapis partii ({len(curr)} + {len(fc)} wierszy) nieudany: {type(e).__name__}: {str(e).splitlines()[0]}")
+            metrics.inc("etl_batches_failed")
+            self.stats["failed_batches"] += 1
+            self.failed.append((curr, fc, cache_keys))
+            return False
+        commit_cache(cache_keys)
+        self.stats["batches"] += 1
+        self.stats["current"] += len(curr)
+        self.stats["forecast"] += len(fc)
+        return True
+
+    def retry_failed(self):
+        """Ponawia zapis partii z `failed`; te, które znów się nie zapiszą, zostają na liście."""
+        todo, self.failed = self.failed, []
+        for curr, fc, cache_keys in todo:
+            self._load(curr, fc, cache_keys)
+
+def _fetch_into(batch: _MicroBatch, cities: list, tasks=None) -> list:
+    """Pobiera (wszystko albo tylko `tasks`) do mikro-partii. Zwraca zadania, które się nie udały."""
+    failed = []
+    for kind, key, j, cache_key in fetch_iter(cities, tasks=tasks, queue_size=config.ETL_QUEUE_SIZE):
+        if kind == "failed":
+            print(f"[etl] {key[0]} {key[1]}: {j}")
+            failed.append(key)
+        else:
+            batch.add(kind, key, j, cache_key)
+    return failed
+
+@metrics.job("etl")
+def run() -> dict:
+    """
+    fetch -> normalizacja -> upsert mikro-partiami; każda partia zatwierdzana osobno, więc
+    dane trafiają do bazy w trakcie pobierania, a błąd jednego miasta nie wstrzymuje reszty.
+    Zapytania z błędem wracają do kolejki ponowień (ETL_RETRY_PASSES przebiegów).
+    """
     init_schema()
     seed_cities_if_empty()
 
     engine = get_engine()
-    cities = pd.read_sql("SELECT city_id, lat, lon FROM cities WHERE is_active", engine)
+    with engine.begin() as con:
+        changed = cells.refresh(con)   # tylko miasta nowe/zmienione albo po zmianie OWM_CELL_KM
+        cities, members = cells.active(con)
+    if changed:
+        # nowi członkowie komórek dostają wiersze tylko z odpowiedzi przedstawiciela – zapisać ją znowu
+        forget_loaded(cells.representatives(cities, members, changed))
+    if members:
+        n_all = len(cities) + sum(len(ids) - 1 for ids in members.values())
+        print(f"[etl] {n_all} miast w {len(cities)} komórkach po {config.OWM_CELL_KM:g} km")
 
-    curr_rows, fc_rows = [], []
+    batch = _MicroBatch(config.ETL_BATCH_ROWS, members)
+    failed = _fetch_into(batch, cities)
+    batch.flush()
+    for _ in range(config.ETL_RETRY_PASSES):
+        if not failed and not batch.failed:
+            break
+        print(f"[etl] ponawiam {len(failed)} zapytań i {len(batch.failed)} partii zapisu "
+              f"za {config.ETL_RETRY_DELAY_S:.0f} s")
+        time.sleep(config.ETL_RETRY_DELAY_S)
+        batch.retry_failed()
+        if failed:
+            failed = _fetch_into(batch, cities, tasks=failed)
+            batch.flush()
+    if failed:
+        print(f"[etl] nie pobrano ({len(failed)}): {', '.join(f'{k} {v}' for k, v in failed)}")
+    if batch.failed:
+        n_rows = sum(len(c) + len(f) for c, f, _ in batch.failed)
+        print(f"[etl] nie zapisano {len(batch.failed)} partii ({n_rows} wierszy)"
+              + (" – odpowiedzi są w archiwum (--replay)" if config.OWM_ARCHIVE_DIR else ""))
 
-    for _, row in cities.iterrows():
-        jcur = fetch_current(row.lat, row.lon)
-        jfc  = fetch_forecast(row.lat, row.lon)
+    # agregaty godzinowe/dzienne są już odświeżone w upsert_frames – stare partycje można usunąć
+    with engine.begin() as con:
+        dropped = partitions.apply_retention(con)
+    if dropped:
+        print(f"Retencja: usunięto partycje {', '.join(dropped)}")
 
-        curr_rows.append(normalize_current(row.city_id, jcur))
-        fc_rows.extend(normalize_forecast(row.city_id, jfc))
+    feature_store.refresh()
+    kpi_rollups.refresh()   # nowe actuals domykają KPI starszych predykcji
+    return {**batch.stats, "failed": failed, "unsaved_batches": len(batch.failed)}
+
+@metrics.job("etl_replay")
+def replay(since: date = None, until: date = None, workers: int = archive.REPLAY_WORKERS):
+    """Odtworzenie/uzupełnienie tabel z archiwum odpowiedzi – bez sieci i bez cache OWM."""
+    init_schema()
+    seed_cities_if_empty()
+    with get_engine().begin() as con:
+        cells.refresh(con)
+        _, members = cells.active(con)
+    stats = archive.replay(since, until, workers=workers, members=members)
+    print(f"Replay: {stats['files']} plików, {stats['current']} wierszy weather_current, "
+          f"{stats['forecast']} wierszy weather_forecast")
+    if stats["current"] or stats["forecast"]:
+        feature_store.refresh(since=stats["ts_min"])
+        kpi_rollups.refresh(match_since=stats["ts_min"])
 
-    upsert_dataframe(pd.DataFrame(curr_rows), "weather_current", ["city_id", "ts_utc"])
-    upsert_dataframe(pd.DataFrame(fc_rows),   "weather_forecast", ["city_id", "ts_forecast_utc"])
+def main():
+    ap = argparse.ArgumentParser(description="ETL OpenWeather -> PostgreSQL.")
+    ap.add_argument("--replay", action="store_true", help="wczytaj archiwum odpowiedzi zamiast pobierać z API")
+    ap.add_argument("--since", type=date.fromisoformat, help="replay: od dnia (YYYY-MM-DD, UTC)")
+    ap.add_argument("--until", type=date.fromisoformat, help="replay: do dnia (bez niego)")
+    ap.add_argument("--workers", type=int, default=archive.REPLAY_WORKERS, help="replay: procesy dekodujące")
+    args = ap.parse_args()
+    with try_advisory_lock(PIPELINE_LOCK) as got:
+        if not got:
+            print("Inny przebieg potoku trwa (src.scheduler albo run_etl) – pomijam.")
+            return
+        if args.replay:
+            replay(args.since, args.until, args.workers)
+        else:
+            run()
 
 if __name__ == "__main__":
-    run()
+    main()
@@ -1,5 +1,9 @@
 from datetime import datetime, timezone
-from typing import Dict, Any, List
+from typing import Dict, Any, Iterable, List, Tuple
+
+import numpy as np
+import pandas as pd
+from .. import metrics
 
 def _to_dt(ts_unix: int):
     return datetime.fromtimestamp(ts_unix, tz=timezone.utc).replace(tzinfo=None)
@@ -37,3 +41,107 @@ def normalize_forecast(city_id: int, j: Dict[str, Any]) -> List[Dict[str, Any]]:
             "weather_desc": (it.get("weather") or [{}])[0].get("description"),
         })
     return out
+
+def normalize_current_group(j: Dict[str, Any], city_ids_by_owm_id: Dict[int, List[int]]) -> List[Dict[str, Any]]:
+    """Odpowiedź z /group (wiele miast naraz) -> wiersze weather_current dla wszystkich pasujących city_id."""
+    out: List[Dict[str, Any]] = []
+    for it in j.get("list", []):
+        for city_id in city_ids_by_owm_id.get(it.get("id"), []):
+            out.append(normalize_current(city_id, it))
+    return out
+
+
+# --- wersja kolumnowa: prealokowane tablice zamiast słownika na wiersz ---
+
+CURRENT_COLUMNS = ["city_id", "ts_utc", "temp_c", "feels_like_c", "humidity_pct", "pressure_hpa",
+                   "wind_speed_ms", "wind_deg", "clouds_pct", "weather_main", "weather_desc"]
+FORECAST_COLUMNS = ["city_id", "ts_forecast_utc", "temp_c", "temp_min_c", "temp_max_c", "humidity_pct",
+                    "pressure_hpa", "wind_speed_ms", "wind_deg", "clouds_pct", "weather_main", "weather_desc"]
+
+# klucz w "main" -> kolumna (temp jest wymagane, jak w normalize_*)
+_CURRENT_MAIN = {"feels_like": "feels_like_c", "humidity": "humidity_pct", "pressure": "pressure_hpa"}
+_FORECAST_MAIN = {"temp_min": "temp_min_c", "temp_max": "temp_max_c",
+                  "humidity": "humidity_pct", "pressure": "pressure_hpa"}
+
+
+def _frame(items: List[Tuple[int, Dict[str, Any]]], ts_col: str, main_keys: Dict[str, str],
+           columns: List[str]) -> pd.DataFrame:
+    """
+    (city_id, element odpowiedzi OWM) -> DataFrame gotowy do copy_upsert.
+    Liczby trafiają do float64 z NaN (całkowite zamienia na Int64 dopiero _as_copy_frame),
+    `dt` konwertowane jest naraz jako datetime64 – bez obiektu datetime na wiersz.
+    """
+    n = len(items)
+    city = np.empty(n, dtype=np.int64)
+    dt = np.empty(n, dtype=np.int64)
+    temp = np.empty(n, dtype=np.float64)
+    main_cols = {key: np.full(n, np.nan) for key in main_keys}
+    wind_speed, wind_deg, clouds = np.full(n, np.nan), np.full(n, np.nan), np.full(n, np.nan)
+    w_main, w_desc = np.full(n, None, dtype=object), np.full(n, None, dtype=object)
+    main_items = list(main_cols.items())
+
+    for i, (city_id, it) in enumerate(items):
+        city[i] = city_id
+        dt[i] = it["dt"]
+        m = it["main"]
+        v = m["temp"]
+        temp[i] = np.nan if v is None else v
+        for key, arr in main_items:
+            v = m.get(key)
+            if v is not None:
+                arr[i] = v
+        wind = it.get("wind")
+        if wind:
+            v = wind.get("speed")
+            if v is not None:
+                wind_speed[i] = v
+            v = wind.get("deg")
+            if v is not None:
+                wind_deg[i] = v
+        c = it.get("clouds")
+        if c:
+            v = c.get("all")
+            if v is not None:
+                clouds[i] = v
+        weather = it.get("weather")
+        if weather:
+            w_main[i] = weather[0].get("main")
+            w_desc[i] = weather[0].get("description")
+
+    data = {"city_id": city, ts_col: pd.to_datetime(dt, unit="s"), "temp_c": temp,
+            "wind_speed_ms": wind_speed, "wind_deg": wind_deg, "clouds_pct": clouds,
+            "weather_main": w_main, "weather_desc": w_desc}
+    data.update((main_keys[key], arr) for key, arr in main_cols.items())
+    return pd.DataFrame(data, columns=columns)
+
+
+@metrics.timed("normalize", table="weather_current")
+def current_frame(responses: Iterable[Tuple[int, Dict[str, Any]]]) -> pd.DataFrame:
+    """(city_id, json z /weather albo element listy z /group) -> ramka weather_current."""
+    return _frame(list(responses), "ts_utc", _CURRENT_MAIN, CURRENT_COLUMNS)
+
+
+@metrics.timed("normalize", table="weather_forecast")
+def forecast_frame(responses: Iterable[Tuple[int, Dict[str, Any]]], fetched_at=None) -> pd.DataFrame:
+    """
+    (city_id, json z /forecast) -> ramka weather_forecast (wszystkie sloty wszystkich odpowiedzi).
+    `fetched_at` – czas pobrania (unix) wspólny albo lista po jednym na odpowiedź; bez niego kolumnę
+    wypełni DEFAULT NOW() w bazie.
+    """
+    responses = list(responses)
+    items = [(city_id, it) for city_id, j in responses for it in j.get("list", [])]
+    df = _frame(items, "ts_forecast_utc", _FORECAST_MAIN, FORECAST_COLUMNS)
+    if fetched_at is not None:
+        if np.ndim(fetched_at) == 0:
+            fetched_at = np.full(len(df), fetched_at)
+        else:
+            fetched_at = np.repeat(fetched_at, [len(j.get("list", [])) for _, j in responses])
+        df["fetched_at"] = pd.to_datetime(np.asarray(fetched_at, dtype=np.int64), unit="s")
+    return df
+
+
+def current_group_items(j: Dict[str, Any], city_ids_by_owm_id: Dict[int, List[int]]
+                        ) -> List[Tuple[int, Dict[str, Any]]]:
+    """Odpowiedź z /group -> pary (city_id, element) dla current_frame."""
+    return [(city_id, it) for it in j.get("list", [])
+            for city_id in city_ids_by_owm_id.get(it.get("id"), [])]
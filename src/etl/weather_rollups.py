@@ -0,0 +1,172 @@
+# src/etl/weather_rollups.py
+"""
+Agregaty surowych danych pogodowych, utrzymywane przyrostowo przy każdym zapisie:
+
+  weather_current_hourly  – (city_id, hour_utc)  z weather_current
+  weather_current_daily   – (city_id, day)       z weather_current_hourly
+  weather_forecast_daily  – (city_id, day)       z weather_forecast
+
+Trzymamy sumy i liczniki (średnia = suma / licznik), więc agregat dzienny składa się z godzinowych,
+a godziny/dni przeliczane są tylko dla kluczy, które zmienił bieżący zapis (refresh_for_frame,
+w tej samej transakcji co upsert). Po retencji surowych partycji agregaty zostają.
+
+    python -m src.etl.weather_rollups --rebuild   # przeliczenie z surowych danych, które są w bazie
+"""
+import argparse
+
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+HOT_TEMP_C = 30.0   # próg upału dla n_hot (heatwave_analysis)
+
+CURRENT_AGG_SQL = """
+      COUNT(*) AS n_obs,
+      COUNT(w.temp_c) AS n_temp, SUM(w.temp_c) AS temp_sum, MIN(w.temp_c) AS temp_min, MAX(w.temp_c) AS temp_max,
+      COUNT(*) FILTER (WHERE w.temp_c > :hot) AS n_hot,
+      COUNT(w.humidity_pct) AS n_humidity, SUM(w.humidity_pct) AS humidity_sum,
+      COUNT(w.pressure_hpa) AS n_pressure, SUM(w.pressure_hpa) AS pressure_sum,
+      COUNT(w.wind_speed_ms) AS n_wind, SUM(w.wind_speed_ms) AS wind_speed_sum, MAX(w.wind_speed_ms) AS wind_speed_max
+"""
+# to samo z agregatów godzinowych
+CURRENT_REAGG_SQL = """
+      SUM(h.n_obs), SUM(h.n_temp), SUM(h.temp_sum), MIN(h.temp_min), MAX(h.temp_max), SUM(h.n_hot),
+      SUM(h.n_humidity), SUM(h.humidity_sum), SUM(h.n_pressure), SUM(h.pressure_sum),
+      SUM(h.n_wind), SUM(h.wind_speed_sum), MAX(h.wind_speed_max)
+"""
+CURRENT_COLUMNS = ("n_obs, n_temp, temp_sum, temp_min, temp_max, n_hot, n_humidity, humidity_sum, "
+                   "n_pressure, pressure_sum, n_wind, wind_speed_sum, wind_speed_max")
+
+FORECAST_AGG_SQL = """
+      COUNT(*) AS n_slots,
+      COUNT(w.temp_c) AS n_temp, SUM(w.temp_c) AS temp_sum, MIN(w.temp_c) AS temp_min, MAX(w.temp_c) AS temp_max,
+      COUNT(w.humidity_pct) AS n_humidity, SUM(w.humidity_pct) AS humidity_sum
+"""
+FORECAST_COLUMNS = "n_slots, n_temp, temp_sum, temp_min, temp_max, n_humidity, humidity_sum"
+
+
+def _refresh_current_hours(con: Connection, city_ids, hours):
+    keys = "unnest(CAST(:cities AS int[]), CAST(:hours AS timestamp[])) AS k(city_id, hour_utc)"
+    params = {"cities": city_ids, "hours": hours, "hot": HOT_TEMP_C}
+    con.execute(text(f"""
+        DELETE FROM weather_current_hourly r USING {keys}
+        WHERE r.city_id = k.city_id AND r.hour_utc = k.hour_utc
+    """), params)
+    con.execute(text(f"""
+        INSERT INTO weather_current_hourly (city_id, hour_utc, {CURRENT_COLUMNS})
+        SELECT k.city_id, k.hour_utc, {CURRENT_AGG_SQL}
+        FROM {keys}
+        JOIN weather_current w
+          ON w.city_id = k.city_id AND w.ts_utc >= k.hour_utc AND w.ts_utc < k.hour_utc + INTERVAL '1 hour'
+        GROUP BY k.city_id, k.hour_utc
+    """), params)
+
+
+def _refresh_current_days(con: Connection, city_ids, days):
+    keys = "unnest(CAST(:cities AS int[]), CAST(:days AS date[])) AS k(city_id, day)"
+    params = {"cities": city_ids, "days": days}
+    con.execute(text(f"""
+        DELETE FROM weather_current_daily r USING {keys}
+        WHERE r.city_id = k.city_id AND r.day = k.day
+    """), params)
+    con.execute(text(f"""
+        INSERT INTO weather_current_daily (city_id, day, {CURRENT_COLUMNS})
+        SELECT k.city_id, k.day, {CURRENT_REAGG_SQL}
+        FROM {keys}
+        JOIN weather_current_hourly h
+          ON h.city_id = k.city_id AND h.hour_utc >= k.day AND h.hour_utc < k.day + 1
+        GROUP BY k.city_id, k.day
+    """), params)
+
+
+def _refresh_forecast_days(con: Connection, city_ids, days):
+    keys = "unnest(CAST(:cities AS int[]), CAST(:days AS date[])) AS k(city_id, day)"
+    params = {"cities": city_ids, "days": days}
+    con.execute(text(f"""
+        DELETE FROM weather_forecast_daily r USING {keys}
+        WHERE r.city_id = k.city_id AND r.day = k.day
+    """), params)
+    con.execute(text(f"""
+        INSERT INTO weather_forecast_daily (city_id, day, {FORECAST_COLUMNS})
+        SELECT k.city_id, k.day, {FORECAST_AGG_SQL}
+        FROM {keys}
+        JOIN weather_forecast w
+          ON w.city_id = k.city_id AND w.ts_forecast_utc >= k.day AND w.ts_forecast_utc < k.day + 1
+        GROUP BY k.city_id, k.day
+    """), params)
+
+
+def _distinct_keys(df: pd.DataFrame, ts_col: str, freq: str):
+    keys = pd.DataFrame({"city_id": df["city_id"].astype(int),
+                         "key": pd.to_datetime(df[ts_col]).dt.floor(freq)}).drop_duplicates()
+    return keys["city_id"].tolist(), keys["key"].dt.to_pydatetime().tolist()
+
+
+def refresh_for_frame(con: Connection, table: str, df: pd.DataFrame):
+    """Przelicza godziny/dni dotknięte zapisem `df` do `table` (ta sama transakcja co upsert)."""
+    if df is None or df.empty:
+        return
+    if table == "weather_current":
+        city_ids, hours = _distinct_keys(df, "ts_utc", "h")
+        _refresh_current_hours(con, city_ids, hours)
+        city_ids, days = _distinct_keys(df, "ts_utc", "D")
+        _refresh_current_days(con, city_ids, [d.date() for d in days])
+    elif table == "weather_forecast":
+        city_ids, days = _distinct_keys(df, "ts_forecast_utc", "D")
+        _refresh_forecast_days(con, city_ids, [d.date() for d in days])
+
+
+def rebuild(con: Connection):
+    """
+    Przelicza agregaty z surowych danych. Okresy sprzed najstarszego zachowanego wiersza
+    (usunięte przez retencję) zostają nietknięte.
+    """
+    ts_min = con.execute(text("SELECT MIN(ts_utc) FROM weather_current")).scalar()
+    if ts_min is not None:
+        lo = pd.Timestamp(ts_min).floor("D").to_pydatetime()
+        con.execute(text("DELETE FROM weather_current_hourly WHERE hour_utc >= :lo"), {"lo": lo})
+        con.execute(text("DELETE FROM weather_current_daily WHERE day >= :lo"), {"lo": lo.date()})
+        con.execute(text(f"""
+            INSERT INTO weather_current_hourly (city_id, hour_utc, {CURRENT_COLUMNS})
+            SELECT w.city_id, date_trunc('hour', w.ts_utc), {CURRENT_AGG_SQL}
+            FROM weather_current w
+            WHERE w.ts_utc >= :lo
+            GROUP BY w.city_id, date_trunc('hour', w.ts_utc)
+        """), {"lo": lo, "hot": HOT_TEMP_C})
+        con.execute(text(f"""
+            INSERT INTO weather_current_daily (city_id, day, {CURRENT_COLUMNS})
+            SELECT h.city_id, h.hour_utc::date, {CURRENT_REAGG_SQL}
+            FROM weather_current_hourly h
+            WHERE h.hour_utc >= :lo
+            GROUP BY h.city_id, h.hour_utc::date
+        """), {"lo": lo})
+
+    ts_min = con.execute(text("SELECT MIN(ts_forecast_utc) FROM weather_forecast")).scalar()
+    if ts_min is not None:
+        lo = pd.Timestamp(ts_min).floor("D").date()
+        con.execute(text("DELETE FROM weather_forecast_daily WHERE day >= :lo"), {"lo": lo})
+        con.execute(text(f"""
+            INSERT INTO weather_forecast_daily (city_id, day, {FORECAST_COLUMNS})
+            SELECT w.city_id, w.ts_forecast_utc::date, {FORECAST_AGG_SQL}
+            FROM weather_forecast w
+            WHERE w.ts_forecast_utc >= :lo
+            GROUP BY w.city_id, w.ts_forecast_utc::date
+        """), {"lo": lo})
+
+
+def main():
+    from ..db import get_engine
+
+    ap = argparse.ArgumentParser(description="Agregaty godzinowe/dzienne danych pogodowych.")
+    ap.add_argument("--rebuild", action="store_true", help="przelicz z surowych danych")
+    args = ap.parse_args()
+    if not args.rebuild:
+        ap.print_help()
+        return
+    with get_engine().begin() as con:
+        rebuild(con)
+    print("Agregaty przeliczone.")
+
+
+if __name__ == "__main__":
+    main()
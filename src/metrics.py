@@ -0,0 +1,290 @@
+# src/metrics.py
+"""
+Lekkie metryki etapów potoku: liczniki, histogramy czasów i gauge, bez zależności zewnętrznych.
+
+    with metrics.timer("db_upsert", table="weather_current"): ...
+    @metrics.timed("build_dataset")
+    metrics.inc("rows_loaded", len(df), table="weather_current")
+
+Przebieg joba (metrics.run("etl") albo dekorator @metrics.job("etl")) zbiera czasy i liczniki
+tylko z tego przebiegu i na końcu:
+  - zapisuje wiersz do pipeline_runs (status, czas, metryki jako JSON),
+  - przepisuje plik METRICS_TEXTFILE w formacie tekstowym Prometheusa (wartości narastająco
+    od startu procesu, jak oczekuje textfile collector node_exportera).
+
+Przy METRICS_ENABLED=0 timer() zwraca wspólny pusty kontekst, a inc/observe kończą się na
+jednym sprawdzeniu flagi – bez blokad i alokacji.
+
+Bieżące przebiegi są w ContextVar, nie w zmiennej modułu: joby równoległe w innych wątkach
+nie dostają cudzych pomiarów, a przebieg zagnieżdżony widzi też przebieg zewnętrzny. Nowy wątek
+startuje z pustym kontekstem – funkcje dla puli wątków joba owijamy w metrics.bind().
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+from typing import Callable, Dict, Iterator, List, Tuple
+
+from . import config
+
+PREFIX = "weather_"
+# granice kubełków histogramu czasu [s]
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+_enabled = config.METRICS_ENABLED
+_lock = threading.Lock()
+_counters: Dict[Key, float] = {}
+_gauges: Dict[Key, float] = {}
+_hists: Dict[Key, List[float]] = {}   # [kubełki..., +Inf, suma]
+# przebiegi obejmujące bieżący kod (zewnętrzny pierwszy)
+_runs: contextvars.ContextVar[Tuple["_Run", ...]] = contextvars.ContextVar("metrics_runs", default=())
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def enable(on: bool = True):
+    """Włącza/wyłącza pomiary w tym procesie (np. w benchmarku)."""
+    global _enabled
+    _enabled = on
+
+
+def _key(name: str, labels: Dict[str, object]) -> Key:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class _Run:
+    def __init__(self, job: str):
+        self.job = job
+        self.started_at = datetime.utcnow()
+        self.t0 = time.perf_counter()
+        self.timers: Dict[Key, List[float]] = {}     # [liczba, suma, max]
+        self.counters: Dict[Key, float] = {}
+
+    def as_json(self) -> Dict[str, Dict[str, object]]:
+        return {
+            "timers": {_fmt(k): {"count": int(v[0]), "sum_s": round(v[1], 6), "max_s": round(v[2], 6)}
+                       for k, v in self.timers.items()},
+            "counters": {_fmt(k): v for k, v in self.counters.items()},
+        }
+
+
+def inc(name: str, value: float = 1, **labels):
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    runs = _runs.get()
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+        for r in runs:
+            r.counters[key] = r.counters.get(key, 0) + value
+
+
+def set_gauge(name: str, value: float, **labels):
+    if not _enabled:
+        return
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def observe(name: str, seconds: float, **labels):
+    """Pomiar czasu do histogramu `name`_seconds (i do bieżącego przebiegu)."""
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    runs = _runs.get()
+    with _lock:
+        h = _hists.get(key)
+        if h is None:
+            h = _hists[key] = [0.0] * (len(BUCKETS) + 2)
+        for i, le in enumerate(BUCKETS):
+            if seconds <= le:
+                h[i] += 1
+                break
+        else:
+            h[len(BUCKETS)] += 1
+        h[-1] += seconds
+        for r in runs:
+            t = r.timers.get(key)
+            if t is None:
+                r.timers[key] = [1, seconds, seconds]
+            else:
+                t[0] += 1
+                t[1] += seconds
+                t[2] = max(t[2], seconds)
+
+
+class _Timer:
+    __slots__ = ("name", "labels", "t0")
+
+    def __init__(self, name: str, labels: Dict[str, object]):
+        self.name, self.labels = name, labels
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.name, time.perf_counter() - self.t0, **self.labels)
+        return False
+
+
+class _NoopTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopTimer()
+
+
+def timer(name: str, **labels):
+    return _Timer(name, labels) if _enabled else _NOOP
+
+
+def timed(name: str, **labels):
+    """Dekorator: czas każdego wywołania funkcji w histogramie `name`."""
+    def deco(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with _Timer(name, labels):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+def _fmt(key: Key) -> str:
+    name, labels = key
+    return name + ("{" + ",".join(f"{k}={v}" for k, v in labels) + "}" if labels else "")
+
+
+def _prom_labels(labels, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    esc = lambda v: v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in items) + "}"
+
+
+def render() -> str:
+    """Wszystkie metryki procesu w formacie tekstowym Prometheusa."""
+    with _lock:
+        counters, gauges = dict(_counters), dict(_gauges)
+        hists = {k: list(v) for k, v in _hists.items()}
+    lines: List[str] = []
+
+    def _section(items, typ, suffix=""):
+        seen = set()
+        for (name, labels), value in sorted(items.items()):
+            metric = f"{PREFIX}{name}{suffix}"
+            if metric not in seen:
+                lines.append(f"# TYPE {metric} {typ}")
+                seen.add(metric)
+            yield metric, labels, value
+
+    for metric, labels, value in _section(counters, "counter", "_total"):
+        lines.append(f"{metric}{_prom_labels(labels)} {value:.15g}")
+    for metric, labels, value in _section(gauges, "gauge"):
+        lines.append(f"{metric}{_prom_labels(labels)} {value:.15g}")
+    for metric, labels, h in _section(hists, "histogram", "_seconds"):
+        cum = 0.0
+        for le, n in zip([*(f"{b:g}" for b in BUCKETS), "+Inf"], h[:-1]):
+            cum += n
+            lines.append(f"{metric}_bucket{_prom_labels(labels, (('le', le),))} {cum:.15g}")
+        lines.append(f"{metric}_sum{_prom_labels(labels)} {h[-1]:.6f}")
+        lines.append(f"{metric}_count{_prom_labels(labels)} {cum:.15g}")
+    return "\n".join(lines) + "\n"
+
+
+def write_textfile(path: str = None):
+    path = config.METRICS_TEXTFILE if path is None else path
+    if not path:
+        return
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # textfile collector czyta plik w dowolnym momencie – podmiana atomowa
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        f.write(render())
+    os.replace(path + ".tmp", path)
+
+
+def _save_run(r: "_Run", finished_at: datetime, duration_s: float, status: str, error: str):
+    from sqlalchemy import text
+    from .db import get_engine
+    with get_engine().begin() as con:
+        con.execute(text("""
+            INSERT INTO pipeline_runs (job, started_at, finished_at, duration_s, status, error, metrics)
+            VALUES (:job, :started, :finished, :dur, :status, :error, CAST(:metrics AS jsonb))
+        """), {"job": r.job, "started": r.started_at, "finished": finished_at, "dur": duration_s,
+               "status": status, "error": error, "metrics": json.dumps(r.as_json())})
+
+
+def job(name: str):
+    """Dekorator: każde wywołanie funkcji to przebieg joba `name` (metrics.run)."""
+    def deco(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with run(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+def bind(fn: Callable) -> Callable:
+    """fn do uruchomienia w innym wątku, z pomiarami przypisanymi do przebiegów bieżącego kontekstu."""
+    runs = _runs.get()
+    if not runs:
+        return fn
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        token = _runs.set(runs)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _runs.reset(token)
+    return wrapper
+
+
+@contextmanager
+def run(job: str) -> Iterator[None]:
+    """Przebieg joba: metryki tylko z tego przebiegu -> pipeline_runs, stan procesu -> METRICS_TEXTFILE."""
+    if not _enabled:
+        yield
+        return
+    r = _Run(job)
+    token = _runs.set(_runs.get() + (r,))
+    status, error = "ok", None
+    try:
+        yield
+    except BaseException as e:
+        status, error = "error", f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _runs.reset(token)
+        duration = time.perf_counter() - r.t0
+        set_gauge("last_run_timestamp_seconds", time.time(), job=job)
+        set_gauge("last_run_duration_seconds", duration, job=job)
+        set_gauge("last_run_success", float(status == "ok"), job=job)
+        inc("runs", job=job, status=status)
+        # metryki nie mogą wywrócić potoku – błąd zapisu tylko logujemy
+        try:
+            _save_run(r, datetime.utcnow(), duration, status, error)
+        except Exception as e:
+            print(f"[metrics] nie zapisano pipeline_runs: {e}")
+        try:
+            write_textfile()
+        except OSError as e:
+            print(f"[metrics] nie zapisano {config.METRICS_TEXTFILE}: {e}")
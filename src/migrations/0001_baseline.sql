@@ -0,0 +1,183 @@
+-- schemat bazowy (dawny src/schemas.sql) – idempotentny, bezpieczny dla istniejących baz
+
+CREATE TABLE IF NOT EXISTS cities (
+    city_id SERIAL PRIMARY KEY,
+    name TEXT NOT NULL,
+    country TEXT NOT NULL,
+    lat DOUBLE PRECISION NOT NULL,
+    lon DOUBLE PRECISION NOT NULL,
+    is_active BOOLEAN NOT NULL DEFAULT TRUE,
+    UNIQUE (name, country)
+);
+
+-- id miasta w OpenWeather dla endpointu /group (NULL = pobieranie po współrzędnych)
+ALTER TABLE cities ADD COLUMN IF NOT EXISTS owm_id INT;
+
+-- surowe dane pogodowe: partycje miesięczne zakłada src/partitions.py
+-- (klucz główny musi zawierać kolumnę partycjonowania)
+CREATE TABLE IF NOT EXISTS weather_current (
+    id BIGSERIAL,
+    city_id INT REFERENCES cities(city_id),
+    ts_utc TIMESTAMP NOT NULL,
+    temp_c DOUBLE PRECISION,
+    feels_like_c DOUBLE PRECISION,
+    humidity_pct INT,
+    pressure_hpa INT,
+    wind_speed_ms DOUBLE PRECISION,
+    wind_deg INT,
+    clouds_pct INT,
+    weather_main TEXT,
+    weather_desc TEXT,
+    PRIMARY KEY (id, ts_utc),
+    UNIQUE (city_id, ts_utc)
+) PARTITION BY RANGE (ts_utc);
+
+CREATE TABLE IF NOT EXISTS weather_forecast (
+    id BIGSERIAL,
+    city_id INT REFERENCES cities(city_id),
+    ts_forecast_utc TIMESTAMP NOT NULL,
+    temp_c DOUBLE PRECISION,
+    temp_min_c DOUBLE PRECISION,
+    temp_max_c DOUBLE PRECISION,
+    humidity_pct INT,
+    pressure_hpa INT,
+    wind_speed_ms DOUBLE PRECISION,
+    wind_deg INT,
+    clouds_pct INT,
+    weather_main TEXT,
+    weather_desc TEXT,
+    PRIMARY KEY (id, ts_forecast_utc),
+    UNIQUE (city_id, ts_forecast_utc)
+) PARTITION BY RANGE (ts_forecast_utc);
+
+CREATE TABLE IF NOT EXISTS weather_predictions (
+    id BIGSERIAL PRIMARY KEY,
+    city_id INT REFERENCES cities(city_id),
+    ts_utc TIMESTAMP NOT NULL,
+    horizon_h SMALLINT NOT NULL, 
+    pred_temp_c DOUBLE PRECISION,
+    model_name TEXT, 
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    UNIQUE (city_id, ts_utc, horizon_h, model_name)
+);
+
+-- materializowane cechy ML (src/ml/feature_store.py), dopisywane przyrostowo po każdym ETL
+CREATE TABLE IF NOT EXISTS ml_features (
+    horizon_h SMALLINT NOT NULL,
+    city_id INT NOT NULL REFERENCES cities(city_id),
+    ts_utc TIMESTAMP NOT NULL,
+    temp_c DOUBLE PRECISION,
+    humidity_pct INT,
+    pressure_hpa INT,
+    wind_speed_ms DOUBLE PRECISION,
+    clouds_pct INT,
+    hour_sin DOUBLE PRECISION,
+    hour_cos DOUBLE PRECISION,
+    dow_sin DOUBLE PRECISION,
+    dow_cos DOUBLE PRECISION,
+    target_temp_plus_h DOUBLE PRECISION,
+    PRIMARY KEY (horizon_h, city_id, ts_utc)
+);
+
+-- wybór nowych wierszy po czasie (predict.fetch_unscored)
+CREATE INDEX IF NOT EXISTS ml_features_horizon_ts_idx ON ml_features (horizon_h, ts_utc);
+
+-- przyrostowe odświeżanie agregatów KPI (src/analytics/kpi_rollups.py)
+CREATE INDEX IF NOT EXISTS weather_predictions_created_at_idx ON weather_predictions (created_at);
+
+-- znaczniki postępu etapów pipeline'u (ostatni przetworzony created_at / id)
+CREATE TABLE IF NOT EXISTS pipeline_watermarks (
+    name TEXT PRIMARY KEY,
+    value_ts TIMESTAMP,
+    value_id BIGINT,
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+-- dzienne sumy do KPI (MAE/MAPE) i alertów upał/mróz, per miasto/horyzont/model/dzień ts_utc
+CREATE TABLE IF NOT EXISTS forecast_daily_rollup (
+    city_id INT NOT NULL REFERENCES cities(city_id),
+    horizon_h SMALLINT NOT NULL,
+    model_name TEXT NOT NULL,
+    day DATE NOT NULL,
+    n_pred INT NOT NULL,
+    n_with_actual INT NOT NULL,
+    n_abs_err INT NOT NULL,
+    sum_abs_err DOUBLE PRECISION,
+    n_ape INT NOT NULL,
+    sum_ape DOUBLE PRECISION,
+    heat_hours INT NOT NULL,
+    cold_hours INT NOT NULL,
+    sum_pred_temp DOUBLE PRECISION,
+    PRIMARY KEY (city_id, horizon_h, model_name, day)
+);
+
+-- czas docelowy predykcji (ts_utc + horyzont) – kandydaci do dopasowania actuals (src/analytics/match_actuals.py)
+CREATE INDEX IF NOT EXISTS weather_predictions_target_ts_idx
+    ON weather_predictions ((ts_utc + make_interval(hours => horizon_h)));
+
+-- predykcja -> najbliższy pomiar w tolerancji, zapisywane raz
+CREATE TABLE IF NOT EXISTS prediction_actuals (
+    prediction_id BIGINT PRIMARY KEY,
+    city_id INT NOT NULL REFERENCES cities(city_id),
+    horizon_h SMALLINT NOT NULL,
+    target_ts_utc TIMESTAMP NOT NULL,
+    actual_ts_utc TIMESTAMP NOT NULL,
+    actual_temp_c DOUBLE PRECISION,
+    lag_s INT NOT NULL,
+    matched_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS prediction_actuals_matched_at_idx ON prediction_actuals (matched_at);
+
+-- agregaty surowych danych (src/etl/weather_rollups.py), odświeżane przy każdym zapisie
+-- średnia = *_sum / n_*
+CREATE TABLE IF NOT EXISTS weather_current_hourly (
+    city_id INT NOT NULL REFERENCES cities(city_id),
+    hour_utc TIMESTAMP NOT NULL,
+    n_obs INT NOT NULL,
+    n_temp INT NOT NULL,
+    temp_sum DOUBLE PRECISION,
+    temp_min DOUBLE PRECISION,
+    temp_max DOUBLE PRECISION,
+    n_hot INT NOT NULL,
+    n_humidity INT NOT NULL,
+    humidity_sum BIGINT,
+    n_pressure INT NOT NULL,
+    pressure_sum BIGINT,
+    n_wind INT NOT NULL,
+    wind_speed_sum DOUBLE PRECISION,
+    wind_speed_max DOUBLE PRECISION,
+    PRIMARY KEY (city_id, hour_utc)
+);
+
+CREATE TABLE IF NOT EXISTS weather_current_daily (
+    city_id INT NOT NULL REFERENCES cities(city_id),
+    day DATE NOT NULL,
+    n_obs INT NOT NULL,
+    n_temp INT NOT NULL,
+    temp_sum DOUBLE PRECISION,
+    temp_min DOUBLE PRECISION,
+    temp_max DOUBLE PRECISION,
+    n_hot INT NOT NULL,
+    n_humidity INT NOT NULL,
+    humidity_sum BIGINT,
+    n_pressure INT NOT NULL,
+    pressure_sum BIGINT,
+    n_wind INT NOT NULL,
+    wind_speed_sum DOUBLE PRECISION,
+    wind_speed_max DOUBLE PRECISION,
+    PRIMARY KEY (city_id, day)
+);
+
+CREATE TABLE IF NOT EXISTS weather_forecast_daily (
+    city_id INT NOT NULL REFERENCES cities(city_id),
+    day DATE NOT NULL,
+    n_slots INT NOT NULL,
+    n_temp INT NOT NULL,
+    temp_sum DOUBLE PRECISION,
+    temp_min DOUBLE PRECISION,
+    temp_max DOUBLE PRECISION,
+    n_humidity INT NOT NULL,
+    humidity_sum BIGINT,
+    PRIMARY KEY (city_id, day)
+);
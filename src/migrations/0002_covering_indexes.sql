@@ -0,0 +1,16 @@
+-- indeksy pokrywające pod faktyczne wzorce dostępu (index-only scan zamiast wizyt w stercie)
+
+-- ostatnie obserwacje miasta + cechy ML (feature_store, dataset_sql)
+CREATE INDEX IF NOT EXISTS weather_current_city_ts_desc_idx
+    ON weather_current (city_id, ts_utc DESC)
+    INCLUDE (temp_c, humidity_pct, pressure_hpa, wind_speed_ms, clouds_pct);
+
+-- najbliższy slot prognozy (NEAREST_FORECAST_SQL): dwa zapytania LIMIT 1 bez odczytu wierszy
+CREATE INDEX IF NOT EXISTS weather_forecast_city_ts_temp_idx
+    ON weather_forecast (city_id, ts_forecast_utc)
+    INCLUDE (temp_c);
+
+-- KPI: predykcje miasta/horyzontu w zakresie dni (kpi_rollups)
+CREATE INDEX IF NOT EXISTS weather_predictions_city_h_ts_idx
+    ON weather_predictions (city_id, horizon_h, ts_utc)
+    INCLUDE (model_name, pred_temp_c);
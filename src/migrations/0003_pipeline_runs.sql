@@ -0,0 +1,14 @@
+-- jeden wiersz na przebieg joba (src/metrics.py: metrics.run) – czasy etapów i liczniki jako JSON
+
+CREATE TABLE IF NOT EXISTS pipeline_runs (
+    id BIGSERIAL PRIMARY KEY,
+    job TEXT NOT NULL,
+    started_at TIMESTAMP NOT NULL,
+    finished_at TIMESTAMP NOT NULL,
+    duration_s DOUBLE PRECISION NOT NULL,
+    status TEXT NOT NULL,                -- ok | error
+    error TEXT,
+    metrics JSONB NOT NULL DEFAULT '{}'
+);
+
+CREATE INDEX IF NOT EXISTS pipeline_runs_job_started_idx ON pipeline_runs (job, started_at DESC);
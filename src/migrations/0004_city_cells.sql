@@ -0,0 +1,14 @@
+-- miasto -> komórka siatki (src/etl/cells.py): miasta z tej samej komórki ETL pobiera jednym
+-- zapytaniem. lat/lon/cell_km to stan, z którego policzono komórkę – zmiana miasta albo
+-- OWM_CELL_KM przelicza wiersz przy następnym cells.refresh()
+
+CREATE TABLE IF NOT EXISTS city_cells (
+    city_id INT PRIMARY KEY REFERENCES cities(city_id) ON DELETE CASCADE,
+    cell_key TEXT NOT NULL,
+    cell_km DOUBLE PRECISION NOT NULL,
+    lat DOUBLE PRECISION NOT NULL,
+    lon DOUBLE PRECISION NOT NULL,
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS city_cells_cell_idx ON city_cells (cell_key);
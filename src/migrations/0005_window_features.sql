@@ -0,0 +1,15 @@
+-- cechy okienkowe per miasto (src/ml/window_features.py) w magazynie cech
+
+ALTER TABLE ml_features
+    ADD COLUMN IF NOT EXISTS temp_delta_1h DOUBLE PRECISION,
+    ADD COLUMN IF NOT EXISTS temp_delta_3h DOUBLE PRECISION,
+    ADD COLUMN IF NOT EXISTS pressure_tendency_3h DOUBLE PRECISION,
+    ADD COLUMN IF NOT EXISTS temp_mean_3h DOUBLE PRECISION,
+    ADD COLUMN IF NOT EXISTS temp_mean_24h DOUBLE PRECISION;
+
+-- istniejące wiersze zostają (cechy okienkowe na razie NULL): znacznik per horyzont każe najbliższemu
+-- feature_store.refresh() tego horyzontu przeliczyć upsertem wszystko od najstarszego ts_utc.
+-- Pełne przebudowanie od zera tylko na żądanie: python -m src.ml.feature_store --rebuild
+INSERT INTO pipeline_watermarks (name, value_ts)
+SELECT 'feature_store.backfill_since.' || horizon_h, MIN(ts_utc) FROM ml_features GROUP BY horizon_h
+ON CONFLICT (name) DO UPDATE SET value_ts = LEAST(pipeline_watermarks.value_ts, EXCLUDED.value_ts), updated_at = NOW();
@@ -0,0 +1,61 @@
+-- kolejka grup dziennych forecast_daily_rollup do przeliczenia (src/analytics/kpi_rollups.py).
+-- Wypełniają ją triggery na weather_predictions i prediction_actuals, a refresh() zabiera wiersze
+-- przez DELETE ... RETURNING. Wiersz staje się widoczny dopiero z commitem transakcji, która zmieniła
+-- predykcje, więc długo trwający predict/backfill nie przepada (jak przy znaczniku created_at)
+
+CREATE TABLE IF NOT EXISTS forecast_rollup_dirty (
+    city_id INT NOT NULL,
+    horizon_h SMALLINT NOT NULL,
+    model_name TEXT NOT NULL,
+    day DATE NOT NULL,
+    PRIMARY KEY (city_id, horizon_h, model_name, day)
+);
+
+CREATE OR REPLACE FUNCTION forecast_rollup_mark_predictions() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO forecast_rollup_dirty (city_id, horizon_h, model_name, day)
+    SELECT DISTINCT city_id, horizon_h, COALESCE(model_name, ''), ts_utc::date FROM changed_rows
+    ON CONFLICT DO NOTHING;
+    RETURN NULL;
+END $$;
+
+CREATE OR REPLACE FUNCTION forecast_rollup_mark_actuals() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO forecast_rollup_dirty (city_id, horizon_h, model_name, day)
+    SELECT DISTINCT p.city_id, p.horizon_h, COALESCE(p.model_name, ''), p.ts_utc::date
+    FROM changed_rows a JOIN weather_predictions p ON p.id = a.prediction_id
+    ON CONFLICT DO NOTHING;
+    RETURN NULL;
+END $$;
+
+-- triggery na poziomie instrukcji: jeden INSERT ... SELECT DISTINCT na cały COPY/upsert,
+-- tabela przejściowa może mieć tylko jedno zdarzenie, stąd osobno INSERT i UPDATE
+DROP TRIGGER IF EXISTS weather_predictions_rollup_ins ON weather_predictions;
+CREATE TRIGGER weather_predictions_rollup_ins AFTER INSERT ON weather_predictions
+    REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION forecast_rollup_mark_predictions();
+
+DROP TRIGGER IF EXISTS weather_predictions_rollup_upd ON weather_predictions;
+CREATE TRIGGER weather_predictions_rollup_upd AFTER UPDATE ON weather_predictions
+    REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION forecast_rollup_mark_predictions();
+
+DROP TRIGGER IF EXISTS weather_predictions_rollup_del ON weather_predictions;
+CREATE TRIGGER weather_predictions_rollup_del AFTER DELETE ON weather_predictions
+    REFERENCING OLD TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION forecast_rollup_mark_predictions();
+
+DROP TRIGGER IF EXISTS prediction_actuals_rollup_ins ON prediction_actuals;
+CREATE TRIGGER prediction_actuals_rollup_ins AFTER INSERT ON prediction_actuals
+    REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION forecast_rollup_mark_actuals();
+
+-- przejście ze znaczników created_at/matched_at: raz przeliczamy wszystkie grupy z predykcjami
+-- (tyle, co --rebuild, ale bez okna, w którym KPI byłyby puste)
+INSERT INTO forecast_rollup_dirty (city_id, horizon_h, model_name, day)
+SELECT DISTINCT city_id, horizon_h, COALESCE(model_name, ''), ts_utc::date FROM weather_predictions
+ON CONFLICT DO NOTHING;
+
+DELETE FROM pipeline_watermarks WHERE name IN ('kpi_rollup.predictions_created_at', 'kpi_rollup.actuals_matched_at');
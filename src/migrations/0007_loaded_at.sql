@@ -0,0 +1,9 @@
+-- czas zapisu/nadpisania surowego wiersza (ustawiany przy każdym upsert, src/etl/load.py):
+-- eksporty Parquet przepisują tylko dni z wierszami zmienionymi od swojego znacznika.
+-- DEFAULT NOW() jest stały w obrębie instrukcji, więc ADD COLUMN nie przepisuje tabel
+
+ALTER TABLE weather_current ADD COLUMN IF NOT EXISTS loaded_at TIMESTAMP NOT NULL DEFAULT NOW();
+ALTER TABLE weather_forecast ADD COLUMN IF NOT EXISTS loaded_at TIMESTAMP NOT NULL DEFAULT NOW();
+
+CREATE INDEX IF NOT EXISTS weather_current_loaded_at_idx ON weather_current (loaded_at);
+CREATE INDEX IF NOT EXISTS weather_forecast_loaded_at_idx ON weather_forecast (loaded_at);
@@ -0,0 +1,8 @@
+-- czas pobrania odpowiedzi OWM, z której pochodzi wiersz prognozy (ETL: chwila zapisu mikro-partii,
+-- replay: fetched_at z archiwum). Upsert nadpisuje slot tylko nowszą albo równie świeżą prognozą
+-- (src/etl/load.py), więc odtworzenie starszego archiwum nie cofa bieżących prognoz.
+-- Istniejące wiersze zostają z NULL (czas nieznany – nadpisze je dowolna wersja); DEFAULT dopiero
+-- po ADD COLUMN, żeby nie udawał dla nich czasu pobrania.
+
+ALTER TABLE weather_forecast ADD COLUMN IF NOT EXISTS fetched_at TIMESTAMP;
+ALTER TABLE weather_forecast ALTER COLUMN fetched_at SET DEFAULT NOW();
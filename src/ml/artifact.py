@@ -0,0 +1,177 @@
+# src/ml/artifact.py
+"""
+Kompaktowy artefakt modelu, niezależny od pickle:
+
+  model_xgb_temp_{H}h.ubj  – natywny booster XGBoost (UBJSON), wczytywalny przez xgboost.Booster
+  model_xgb_temp_{H}h.npz  – drzewa jako tablice NumPy + metadane (lista cech, metryki, wersja formatu)
+
+NumpyTreeModel liczy predykcje z .npz bez importu xgboost/sklearn – wczytanie to jedno np.load.
+Obsługiwane: gbtree + reg:squarederror (to, co trenuje train_model).
+
+    python -m src.ml.artifact --horizons 3 6     # eksport istniejących modeli .joblib
+"""
+import argparse
+import json
+import os
+from datetime import datetime
+from typing import Any, Dict, List
+
+import numpy as np
+
+FORMAT_VERSION = 1
+PREDICT_CHUNK_ROWS = 8192
+
+
+def artifact_path(horizon_h: int) -> str:
+    return f"model_xgb_temp_{horizon_h}h.npz"
+
+
+def booster_path(horizon_h: int) -> str:
+    return f"model_xgb_temp_{horizon_h}h.ubj"
+
+
+def _parse_base_score(raw: str) -> float:
+    # XGBoost >= 3 zapisuje base_score jako wektor: "[1.02E1]"
+    return float(raw.strip("[]").split(",")[0])
+
+
+def _tree_depth(left: List[int], right: List[int]) -> int:
+    depth, stack = 0, [(0, 0)]
+    while stack:
+        node, d = stack.pop()
+        if left[node] == -1:
+            depth = max(depth, d)
+        else:
+            stack.extend([(left[node], d + 1), (right[node], d + 1)])
+    return depth
+
+
+def pack_booster(booster_json: Dict[str, Any]) -> Dict[str, np.ndarray]:
+    """JSON boostera XGBoost -> prostokątne tablice (drzewo × węzeł) dla NumpyTreeModel."""
+    learner = booster_json["learner"]
+    objective = learner["objective"]["name"]
+    gbm = learner["gradient_booster"]
+    if gbm["name"] != "gbtree" or objective != "reg:squarederror":
+        raise ValueError(f"Nieobsługiwany model: {gbm['name']} / {objective}")
+
+    trees = gbm["model"]["trees"]
+    n_nodes = max(len(t["left_children"]) for t in trees)
+    shape = (len(trees), n_nodes)
+    left = np.full(shape, -1, dtype=np.int32)
+    right = np.full(shape, -1, dtype=np.int32)
+    feature = np.zeros(shape, dtype=np.int32)
+    threshold = np.zeros(shape, dtype=np.float32)
+    default_left = np.zeros(shape, dtype=bool)
+    depth = 0
+    for i, t in enumerate(trees):
+        if any(t.get("split_type", [])):
+            raise ValueError("Podziały kategoryczne nie są obsługiwane")
+        n = len(t["left_children"])
+        left[i, :n] = t["left_children"]
+        right[i, :n] = t["right_children"]
+        feature[i, :n] = t["split_indices"]
+        # w liściu split_conditions trzyma wartość liścia
+        threshold[i, :n] = t["split_conditions"]
+        default_left[i, :n] = np.asarray(t["default_left"], dtype=bool)
+        depth = max(depth, _tree_depth(t["left_children"], t["right_children"]))
+
+    return {
+        "left": left, "right": right, "feature": feature, "threshold": threshold,
+        "default_left": default_left,
+        "base_score": np.float32(_parse_base_score(learner["learner_model_param"]["base_score"])),
+        "max_depth": np.int32(depth),
+    }
+
+
+class NumpyTreeModel:
+    """Ewaluator drzew na tablicach NumPy – wszystkie drzewa schodzą naraz, poziom po poziomie."""
+
+    def __init__(self, arrays: Dict[str, np.ndarray], meta: Dict[str, Any]):
+        self.left = arrays["left"]
+        self.right = arrays["right"]
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        self.default_left = arrays["default_left"]
+        self.base_score = np.float32(arrays["base_score"])
+        self.max_depth = int(arrays["max_depth"])
+        self.meta = meta
+        self.features: List[str] = meta["features"]
+
+    def _predict_chunk(self, X: np.ndarray) -> np.ndarray:
+        n_trees = self.left.shape[0]
+        trees = np.arange(n_trees)[None, :]
+        rows = np.arange(X.shape[0])[:, None]
+        node = np.zeros((X.shape[0], n_trees), dtype=np.int32)
+        for _ in range(self.max_depth):
+            lchild = self.left[trees, node]
+            x = X[rows, self.feature[trees, node]]
+            go_left = np.where(np.isnan(x), self.default_left[trees, node], x < self.threshold[trees, node])
+            nxt = np.where(go_left, lchild, self.right[trees, node])
+            node = np.where(lchild == -1, node, nxt)
+        leaf = self.threshold[trees, node]
+        return self.base_score + leaf.sum(axis=1, dtype=np.float32)
+
+    def predict(self, X) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float32)
+        if X.shape[0] == 0:
+            return np.zeros(0, dtype=np.float32)
+        return np.concatenate([self._predict_chunk(X[i:i + PREDICT_CHUNK_ROWS])
+                               for i in range(0, X.shape[0], PREDICT_CHUNK_ROWS)])
+
+
+def _atomic_write(path: str, write):
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        write(f)
+    os.replace(tmp, path)
+
+
+def export(model, horizon_h: int, metrics: Dict[str, Any]) -> str:
+    """Zapisuje .ubj i .npz dla wytrenowanego XGBRegressor. Zwraca ścieżkę .npz."""
+    import xgboost
+
+    booster = model.get_booster()
+    arrays = pack_booster(json.loads(booster.save_raw("json")))
+    meta = {
+        "format_version": FORMAT_VERSION,
+        "model_name": metrics.get("model_name"),
+        "horizon_h": horizon_h,
+        "features": metrics["features"],
+        "metrics": metrics,
+        "xgboost_version": xgboost.__version__,
+        "exported_at": datetime.utcnow().isoformat(timespec="seconds"),
+    }
+    _atomic_write(booster_path(horizon_h), lambda f: f.write(booster.save_raw("ubj")))
+    _atomic_write(artifact_path(horizon_h),
+                  lambda f: np.savez_compressed(f, meta=np.array(json.dumps(meta)), **arrays))
+    return artifact_path(horizon_h)
+
+
+def load(path: str) -> NumpyTreeModel:
+    with np.load(path) as z:
+        meta = json.loads(str(z["meta"]))
+        if meta.get("format_version") != FORMAT_VERSION:
+            raise ValueError(f"{path}: nieobsługiwana wersja formatu {meta.get('format_version')}")
+        arrays = {k: z[k] for k in z.files if k != "meta"}
+    return NumpyTreeModel(arrays, meta)
+
+
+def main():
+    import joblib
+    from .features import HORIZONS_H
+
+    ap = argparse.ArgumentParser(description="Eksport modeli .joblib do artefaktów .ubj + .npz.")
+    ap.add_argument("--horizons", type=int, nargs="+", default=HORIZONS_H)
+    args = ap.parse_args()
+    for H in args.horizons:
+        model_file, metrics_file = f"model_xgb_temp_{H}h.joblib", f"metrics_xgb_temp_{H}h.json"
+        if not (os.path.exists(model_file) and os.path.exists(metrics_file)):
+            print(f"+{H}h: brak {model_file} albo {metrics_file} – pomijam.")
+            continue
+        with open(metrics_file, encoding="utf-8") as f:
+            metrics = json.load(f)
+        print(f"+{H}h → {export(joblib.load(model_file), H, metrics)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+# src/ml/backtest.py
+"""
+Backtest z przesuwanym punktem odcięcia (rolling origin) na danych z ml_features:
+
+    python -m src.ml.backtest --horizons 3 6 --cutoffs 8 --min-train-days 14
+
+Punkty odcięcia c_0 < c_1 < ... dzielą historię (posortowaną po ts_utc) na segmenty. Model dla
+c_i uczy się na wierszach z ts_utc < c_i − horyzont (target musi być znany w chwili odcięcia)
+i jest oceniany na [c_i, c_i+1). Pełny trening (FINAL_PARAMS) jest tylko na początku; dalej
+model idzie naprzód jak train_model --incremental – dokładka INCREMENTAL_PARAMS drzew na
+kolejnym segmencie treningowym, a pełny trening tylko wtedy, gdy train_model.refit_reason
+tak zdecyduje (dryf, limit drzew). --refit-every-cutoff to dawny koszt: pełny trening w każdym punkcie.
+
+Dane są czytane raz i trzymane w jednej tablicy; segmenty to jej widoki. Kwantyle cech (granice
+kubełków hist) dla punktu c_i liczone są tylko z jego wierszy treningowych (X[:koniec treningu]):
+pełny trening bierze je z własnej macierzy, dokładka dostaje je przez `ref` – nic z przyszłych
+segmentów, nawet zakres wartości cech, nie wpływa na model.
+
+Wynik: MAE per (horyzont, odcięcie, miasto) w CSV i podsumowanie per odcięcie.
+"""
+import argparse
+import os
+import time
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from .. import metrics
+from . import feature_store
+from .features import FEATURES, HORIZONS_H, TARGET
+from .train_model import FINAL_PARAMS, INCREMENTAL_PARAMS, MIN_ROWS, refit_reason
+
+N_CUTOFFS = 6
+MIN_TRAIN_DAYS = 7
+OUT_DIR = "powerbi/exports"
+
+
+def _native(params: dict, nthread: int):
+    """Parametry w stylu XGBRegressor -> (parametry xgboost.train, liczba rund)."""
+    p = dict(params)
+    rounds = p.pop("n_estimators")
+    p.update(nthread=nthread, tree_method="hist")
+    return p, rounds
+
+
+def cutoffs(ts: pd.Series, n: int, min_train: pd.Timedelta) -> List[pd.Timestamp]:
+    """
+    n punktów po początku historii + min_train, dzielących resztę na segmenty o równej liczbie
+    wierszy (kwantyle ts_utc) – luki w danych nie dają pustych segmentów.
+    """
+    rest = ts[ts >= ts.min() + min_train]
+    if rest.empty:
+        return []
+    return sorted(set(rest.quantile(np.linspace(0, 1, n + 1)[:-1], interpolation="lower")))
+
+
+def backtest_horizon(df: pd.DataFrame, horizon_h: int, points: List[pd.Timestamp],
+                     refit_every: bool = False, nthread: int = None) -> Dict[str, pd.DataFrame]:
+    """Rolling origin dla jednego horyzontu. Zwraca {"by_city": ..., "summary": ...}."""
+    import xgboost as xgb
+
+    nthread = nthread or os.cpu_count() or 1
+    df = df.sort_values("ts_utc", kind="stable").reset_index(drop=True)
+    X = df[FEATURES].to_numpy(np.float32)
+    y = df[TARGET].to_numpy(np.float32)
+    city = df["city_id"].to_numpy()
+    ts = df["ts_utc"].to_numpy("datetime64[ns]")
+    ends = [*points[1:], None]
+    lag = np.timedelta64(horizon_h, "h")
+    # granice treningu (bez wierszy, których target jeszcze nieznany) i oceny
+    train_end = [int(np.searchsorted(ts, np.datetime64(c) - lag)) for c in points]
+    eval_lo = [int(np.searchsorted(ts, np.datetime64(c))) for c in points]
+    eval_hi = eval_lo[1:] + [len(df)]
+
+    full_params, full_rounds = _native(FINAL_PARAMS, nthread)
+    inc_params, inc_rounds = _native(INCREMENTAL_PARAMS, nthread)
+    booster, info = None, {}
+    by_city, summary = [], []
+    for i, cutoff in enumerate(points):
+        t0 = time.perf_counter()
+        if booster is None or refit_every or info.get("refit"):
+            if train_end[i] < MIN_ROWS:
+                continue
+            dtrain = xgb.QuantileDMatrix(X[:train_end[i]], y[:train_end[i]], nthread=nthread)
+            booster = xgb.train(full_params, dtrain, full_rounds)
+            mode, info = "full", {"test_mae": None}
+        elif train_end[i] > train_end[i - 1]:
+            # granice kubełków z całego treningu do tego punktu, nie tylko z krótkiego segmentu
+            ref = xgb.QuantileDMatrix(X[:train_end[i]], nthread=nthread)
+            dseg = xgb.QuantileDMatrix(X[train_end[i - 1]:train_end[i]], y[train_end[i - 1]:train_end[i]],
+                                       ref=ref, nthread=nthread)
+            booster = xgb.train(inc_params, dseg, inc_rounds, xgb_model=booster)
+            mode = "incremental"
+        else:
+            mode = "unchanged"
+        fit_s = time.perf_counter() - t0
+
+        lo, hi = eval_lo[i], eval_hi[i]
+        if hi <= lo:
+            continue
+        err = np.abs(booster.inplace_predict(X[lo:hi]) - y[lo:hi])
+        mae = float(err.mean())
+        seg = pd.DataFrame({"city_id": city[lo:hi], "abs_err": err})
+        per_city = seg.groupby("city_id")["abs_err"].agg(n="size", mae="mean").reset_index()
+        per_city.insert(0, "cutoff", cutoff)
+        per_city.insert(0, "horizon_h", horizon_h)
+        by_city.append(per_city)
+
+        n_trees = booster.num_boosted_rounds()
+        # MAE pierwszego segmentu po pełnym treningu to punkt odniesienia dryfu (jak test_mae w treningu)
+        if info["test_mae"] is None:
+            info["test_mae"] = mae
+        info["refit"] = refit_reason(info, mae, n_trees) is not None
+        summary.append({"horizon_h": horizon_h, "cutoff": cutoff, "until": ends[i] or df["ts_utc"].iloc[-1],
+                        "mode": mode, "n_train": train_end[i], "n_eval": hi - lo, "mae": mae,
+                        "n_trees": n_trees, "fit_s": round(fit_s, 3)})
+
+    cols = ["horizon_h", "cutoff", "city_id", "n", "mae"]
+    return {"by_city": pd.concat(by_city, ignore_index=True) if by_city else pd.DataFrame(columns=cols),
+            "summary": pd.DataFrame(summary)}
+
+
+@metrics.job("backtest")
+def run(horizons=None, n_cutoffs: int = N_CUTOFFS, min_train_days: float = MIN_TRAIN_DAYS,
+        refit_every: bool = False, out_dir: str = OUT_DIR) -> pd.DataFrame:
+    """Backtest wszystkich horyzontów; zapisuje CSV i zwraca podsumowanie per odcięcie."""
+    horizons = list(horizons or HORIZONS_H)
+    feature_store.refresh(horizons)
+    data = feature_store.load_training_many(horizons)
+
+    by_city, summary = [], []
+    for H in horizons:
+        df = data[H]
+        points = cutoffs(df["ts_utc"], n_cutoffs, pd.Timedelta(days=min_train_days)) if len(df) else []
+        if not points:
+            print(f"+{H}h: za krótka historia na backtest (min. {min_train_days:g} dni treningu).")
+            continue
+        with metrics.timer("backtest_horizon", horizon_h=H):
+            res = backtest_horizon(df, H, points, refit_every)
+        by_city.append(res["by_city"])
+        summary.append(res["summary"])
+    if not summary:
+        return pd.DataFrame()
+
+    by_city, summary = pd.concat(by_city, ignore_index=True), pd.concat(summary, ignore_index=True)
+    os.makedirs(out_dir, exist_ok=True)
+    by_city.to_csv(f"{out_dir}/backtest_mae_by_city.csv", index=False, encoding="utf-8")
+    summary.to_csv(f"{out_dir}/backtest_summary.csv", index=False, encoding="utf-8")
+
+    print(summary[["horizon_h", "cutoff", "mode", "n_train", "n_eval", "mae", "n_trees", "fit_s"]]
+          .to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+    print(f"Czas treningów: {summary['fit_s'].sum():.1f} s "
+          f"({'pełny trening w każdym punkcie' if refit_every else 'dokładki + pełny trening przy dryfie'})")
+    print(f"Zapisano: {out_dir}/backtest_mae_by_city.csv, {out_dir}/backtest_summary.csv")
+    return summary
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Backtest rolling origin modeli temperatury (MAE per miasto/odcięcie).")
+    ap.add_argument("--horizons", type=int, nargs="+", default=HORIZONS_H)
+    ap.add_argument("--cutoffs", type=int, default=N_CUTOFFS, help="liczba punktów odcięcia")
+    ap.add_argument("--min-train-days", type=float, default=MIN_TRAIN_DAYS,
+                    help="historia przed pierwszym odcięciem [dni]")
+    ap.add_argument("--refit-every-cutoff", action="store_true",
+                    help="pełny trening w każdym punkcie (dla porównania kosztu i MAE)")
+    ap.add_argument("--out-dir", default=OUT_DIR)
+    args = ap.parse_args()
+    run(args.horizons, args.cutoffs, args.min_train_days, args.refit_every_cutoff, args.out_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+# src/ml/feature_store.py
+"""
+Magazyn cech ML (tabela ml_features, klucz horizon_h + city_id + ts_utc).
+
+refresh() dopisuje przyrostowo nowe obserwacje od znacznika (MAX(ts_utc) dla horyzontu),
+z cechami okienkowymi (window_features) liczonymi na historii sięgającej LOOKBACK wstecz; trening (load_training*) i predykcja (predict.fetch_unscored) tylko czytają gotowe cechy – bez ponownego joinu z prognozami.
+Migracja, która dodaje cechy, zostawia w pipeline_watermarks znaczniki WM_BACKFILL.<H>: najbliższy
+refresh() horyzontu przelicza (upsertem, bez kasowania wierszy) wszystko od tej chwili.
+
+    python -m src.ml.feature_store [--horizons 3 6] [--since 2025-01-01] [--rebuild]
+"""
+import argparse
+from datetime import timedelta
+from typing import Dict, Iterable
+
+import pandas as pd
+from sqlalchemy import text
+
+from ..bulk import copy_upsert
+from ..db import get_engine, get_watermark, init_schema
+from .. import metrics
+from .features import FEATURES, HORIZONS_H, POINT_FEATURES, TARGET, add_time_features, dataset_sql
+from .window_features import LOOKBACK, add_window_features, window_context
+
+TABLE = "ml_features"
+KEY = ["horizon_h", "city_id", "ts_utc"]
+COLUMNS = KEY + FEATURES + [TARGET]
+
+# Prognoza dla slotu w przyszłości jest nadpisywana przy każdym ETL, więc target wiersza
+# może się zmieniać, dopóki ts_utc + horyzont (± pół slotu 3h) nie minie.
+# Dlatego odświeżamy też ostatnie `horyzont + SLOT_MARGIN` godzin przed znacznikiem.
+SLOT_MARGIN = timedelta(hours=3)
+READ_CHUNK_ROWS = 200_000
+# + ".<horyzont>"; value_ts = od kiedy przeliczyć istniejące wiersze (ustawia migracja, np. 0005)
+WM_BACKFILL = "feature_store.backfill_since"
+
+
+def high_water_mark(horizon_h: int):
+    with get_engine().connect() as con:
+        return con.execute(
+            text(f"SELECT MAX(ts_utc) FROM {TABLE} WHERE horizon_h = :h"), {"h": horizon_h}
+        ).scalar()
+
+
+@metrics.timed("feature_refresh")
+def refresh(horizons: Iterable[int] = HORIZONS_H, since=None) -> int:
+    """
+    Uzupełnia ml_features dla podanych horyzontów. Zwraca liczbę zapisanych wierszy.
+    `since` – przelicz też wiersze od tej chwili (np. po wczytaniu starszych danych z archiwum).
+    """
+    engine = get_engine()
+    total = 0
+    for H in horizons:
+        hwm = high_water_mark(H)
+        with engine.connect() as con:
+            backfill, _ = get_watermark(con, f"{WM_BACKFILL}.{H}")
+        params = {"horizon_h": H}
+        where, start = "", None
+        if hwm is not None:
+            start = hwm - timedelta(hours=H) - SLOT_MARGIN
+            for t in (since, backfill):
+                if t is not None:
+                    start = min(start, pd.Timestamp(t).to_pydatetime() - SLOT_MARGIN)
+            # wiersze sprzed `start` tylko jako historia okien – nie są zapisywane
+            where = "WHERE c.ts_utc > :since"
+            params["since"] = start - LOOKBACK
+
+        with engine.connect().execution_options(stream_results=True) as src:
+            chunks = pd.read_sql(text(dataset_sql(where)), src, params=params, chunksize=READ_CHUNK_ROWS)
+            context = None
+            for chunk in chunks:
+                # porcje idą po (city_id, ts_utc) – miasto z końca porcji ciągnie się w następnej
+                feats = add_window_features(add_time_features(chunk), context)
+                context = window_context(chunk, context)
+                chunk = feats if start is None else feats[feats["ts_utc"] > start].copy()
+                if chunk.empty:
+                    continue
+                chunk["horizon_h"] = H
+                with engine.begin() as con:
+                    total += copy_upsert(con, chunk[COLUMNS], TABLE, KEY)
+                metrics.inc("rows_loaded", len(chunk), table=TABLE)
+        if backfill is not None:
+            # tylko przeliczony znacznik – wcześniejszy, dopisany w międzyczasie, zostaje na następny przebieg
+            with engine.begin() as con:
+                con.execute(text("DELETE FROM pipeline_watermarks WHERE name = :n AND value_ts = :ts"),
+                            {"n": f"{WM_BACKFILL}.{H}", "ts": backfill})
+    return total
+
+
+def rebuild(horizons: Iterable[int] = HORIZONS_H) -> int:
+    """Kasuje wiersze horyzontów i liczy je od zera (tylko na żądanie – CLI --rebuild)."""
+    horizons = list(horizons)
+    with get_engine().begin() as con:
+        con.execute(text(f"DELETE FROM {TABLE} WHERE horizon_h = ANY(:hs)"), {"hs": horizons})
+    return refresh(horizons)
+
+
+def load_training(horizon_h: int) -> pd.DataFrame:
+    """Kompletne wiersze (cechy + target) dla treningu, posortowane po city_id, ts_utc."""
+    return load_training_many([horizon_h])[horizon_h]
+
+
+def load_training_many(horizons: Iterable[int]) -> Dict[int, pd.DataFrame]:
+    """Jak load_training, ale dla wielu horyzontów jednym zapytaniem."""
+    horizons = list(horizons)
+    sql = f"""
+    SELECT horizon_h, city_id, ts_utc, {", ".join(FEATURES)}, {TARGET}
+    FROM {TABLE}
+    WHERE horizon_h = ANY(:hs) AND {TARGET} IS NOT NULL
+    ORDER BY horizon_h, city_id, ts_utc;
+    """
+    df = pd.read_sql(text(sql), get_engine(), params={"hs": horizons})
+    # brak cechy okienkowej (początek historii, luka w danych) to poprawne wejście dla XGBoost
+    df.dropna(subset=POINT_FEATURES + [TARGET], inplace=True)
+    out = {H: g.drop(columns="horizon_h").reset_index(drop=True) for H, g in df.groupby("horizon_h")}
+    return {H: out.get(H, df.iloc[:0].drop(columns="horizon_h")) for H in horizons}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Magazyn cech ML (ml_features).")
+    ap.add_argument("--horizons", type=int, nargs="+", default=HORIZONS_H)
+    ap.add_argument("--since", type=pd.Timestamp, default=None, help="przelicz też wiersze od tej chwili (UTC)")
+    ap.add_argument("--rebuild", action="store_true", help="skasuj wiersze horyzontów i policz od zera")
+    args = ap.parse_args()
+    init_schema()
+    n = rebuild(args.horizons) if args.rebuild else refresh(args.horizons, args.since)
+    print(f"ml_features: zapisano {n} wierszy (horyzonty {', '.join(map(str, args.horizons))}).")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,55 @@
 # src/ml/features.py
-from sqlalchemy import create_engine
+import numpy as np
 import pandas as pd
-import os
-from dotenv import load_dotenv
+from sqlalchemy import text
+from ..config import ML_HORIZONS_H
+from ..db import get_engine
+from .. import metrics
+from .window_features import WINDOW_FEATURES
 
-load_dotenv()
-engine = create_engine(os.getenv("DB_URL"), future=True)
+HORIZONS_H = ML_HORIZONS_H
 
-def build_dataset(horizon_h: int = 3) -> pd.DataFrame:
-    sql = f"""
-    WITH curr AS (
-      SELECT city_id, ts_utc,
-             temp_c, humidity_pct, pressure_hpa, wind_speed_ms, clouds_pct
-      FROM weather_current
-    )
+POINT_FEATURES = [
+    "temp_c", "humidity_pct", "pressure_hpa", "wind_speed_ms", "clouds_pct",
+    "hour_sin", "hour_cos", "dow_sin", "dow_cos"
+]
+# nowe cechy tylko na końcu: starszy model używa pierwszych n_features_in_ (model_features)
+FEATURES = POINT_FEATURES + WINDOW_FEATURES
+TARGET = "target_temp_plus_h"
+
+# Najbliższa prognoza dla ts_utc + horyzont: dwa zapytania po indeksie (city_id, ts_forecast_utc)
+# – ostatni slot <= cel i pierwszy slot > cel – zamiast sortowania wszystkich prognoz miasta.
+# Przy remisie (cel dokładnie w połowie między slotami) wygrywa wcześniejszy slot.
+NEAREST_FORECAST_SQL = """
+    CROSS JOIN LATERAL (SELECT c.ts_utc + make_interval(hours => :horizon_h) AS ts_target) t
+    LEFT JOIN LATERAL (
+        SELECT wf.ts_forecast_utc, wf.temp_c
+        FROM weather_forecast wf
+        WHERE wf.city_id = c.city_id AND wf.ts_forecast_utc <= t.ts_target
+        ORDER BY wf.ts_forecast_utc DESC
+        LIMIT 1
+    ) prv ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT wf.ts_forecast_utc, wf.temp_c
+        FROM weather_forecast wf
+        WHERE wf.city_id = c.city_id AND wf.ts_forecast_utc > t.ts_target
+        ORDER BY wf.ts_forecast_utc
+        LIMIT 1
+    ) nxt ON TRUE
+"""
+
+NEAREST_TARGET_SQL = """
+    CASE
+      WHEN nxt.ts_forecast_utc IS NULL THEN prv.temp_c
+      WHEN prv.ts_forecast_utc IS NULL THEN nxt.temp_c
+      WHEN nxt.ts_forecast_utc - t.ts_target < t.ts_target - prv.ts_forecast_utc THEN nxt.temp_c
+      ELSE prv.temp_c
+    END
+"""
+
+def dataset_sql(where: str = "") -> str:
+    """Obserwacje z weather_current + najbliższa prognoza dla ts_utc + :horizon_h (target może być NULL)."""
+    return f"""
     SELECT
       c.city_id,
       c.ts_utc,
@@ -22,19 +58,30 @@ def build_dataset(horizon_h: int = 3) -> pd.DataFrame:
       c.pressure_hpa,
       c.wind_speed_ms,
       c.clouds_pct,
-      f.target_temp AS target_temp_plus_h
-    FROM curr c
-    JOIN LATERAL (
-        SELECT wf.temp_c AS target_temp
-        FROM weather_forecast wf
-        WHERE wf.city_id = c.city_id
-        ORDER BY ABS(EXTRACT(EPOCH FROM (
-            wf.ts_forecast_utc - (c.ts_utc + INTERVAL '{horizon_h} hours')
-        )))
-        LIMIT 1
-    ) f ON TRUE
-    ORDER BY c.city_id, c.ts_utc;
+      {NEAREST_TARGET_SQL} AS target_temp_plus_h
+    FROM weather_current c
+    {NEAREST_FORECAST_SQL}
+    {where}
+    ORDER BY c.city_id, c.ts_utc
     """
-    df = pd.read_sql(sql, engine)
+
+@metrics.timed("build_dataset")
+def build_dataset(horizon_h: int = 3) -> pd.DataFrame:
+    df = pd.read_sql(text(dataset_sql()), get_engine(), params={"horizon_h": horizon_h})
     df.dropna(inplace=True)
     return df
+
+def model_features(model) -> list:
+    """Cechy, na których trenowano model: artefakt .npz niesie listę, .joblib – liczbę kolumn."""
+    return getattr(model, "features", None) or FEATURES[:getattr(model, "n_features_in_", len(FEATURES))]
+
+def add_time_features(df: pd.DataFrame) -> pd.DataFrame:
+    out = df.copy()
+    out["ts_utc"] = pd.to_datetime(out["ts_utc"])
+    out["hour"] = out["ts_utc"].dt.hour.astype(int)
+    out["dow"] = out["ts_utc"].dt.dayofweek.astype(int)
+    out["hour_sin"] = np.sin(2 * np.pi * out["hour"] / 24)
+    out["hour_cos"] = np.cos(2 * np.pi * out["hour"] / 24)
+    out["dow_sin"] = np.sin(2 * np.pi * out["dow"] / 7)
+    out["dow_cos"] = np.cos(2 * np.pi * out["dow"] / 7)
+    return out
@@ -1,51 +1,57 @@
 # src/ml/predict.py
+import argparse
 import os
 import joblib
 import numpy as np
 import pandas as pd
-from datetime import datetime
-from dotenv import load_dotenv
-from sqlalchemy import create_engine, text
+from datetime import datetime, timedelta
+from typing import Any, Callable, Optional
+from sqlalchemy import text
+from ..analytics import kpi_rollups
+from ..bulk import copy_upsert
+from ..config import ML_NUMPY_EVALUATOR
+from ..db import get_engine, init_schema
+from .. import metrics
+from . import artifact, feature_store
+from .features import FEATURES, HORIZONS_H, model_features
 
-load_dotenv()
-engine = create_engine(os.getenv("DB_URL"), future=True)
+# tryb domyślny: tylko wiersze z ostatnich NEW_ROWS_LOOKBACK_H godzin, które nie mają jeszcze predykcji
+NEW_ROWS_LOOKBACK_H = 24
+# tryb --backfill: historia przetwarzana porcjami po tyle wierszy
+BACKFILL_CHUNK_ROWS = 50_000
 
-LAST_PER_CITY = 12
-
-FEATURES = [
-    "temp_c", "humidity_pct", "pressure_hpa", "wind_speed_ms", "clouds_pct",
-    "hour_sin", "hour_cos", "dow_sin", "dow_cos"
-]
-
-HORIZONS_H = [3, 6]
+@metrics.timed("predict_fetch")
+def fetch_unscored(horizon_h: int, model_name: str, since=None, after_city_id: int = None,
+                   limit: int = None) -> pd.DataFrame:
+    """
+    Wiersze z ml_features bez predykcji danego modelu/horyzontu (anti-join po unikalnym
+    indeksie weather_predictions), od `since` w górę, w kolejności (ts_utc, city_id).
+    `since` + `after_city_id` działają jak kursor (keyset) przy backfillu.
+    """
+    cond = ""
+    params = {"h": horizon_h, "m": model_name, "limit": limit}
+    if since is not None and after_city_id is not None:
+        cond = "AND (f.ts_utc, f.city_id) > (:since, :cid)"
+        params.update(since=since, cid=after_city_id)
+    elif since is not None:
+        cond = "AND f.ts_utc > :since"
+        params["since"] = since
 
-def fetch_recent_features(last_per_city: int = LAST_PER_CITY) -> pd.DataFrame:
     sql = f"""
-    WITH ranked AS (
-      SELECT
-        city_id, ts_utc,
-        temp_c, humidity_pct, pressure_hpa, wind_speed_ms, clouds_pct,
-        ROW_NUMBER() OVER (PARTITION BY city_id ORDER BY ts_utc DESC) AS rn
-      FROM weather_current
-    )
-    SELECT
-      city_id, ts_utc,
-      temp_c, humidity_pct, pressure_hpa, wind_speed_ms, clouds_pct
-    FROM ranked
-    WHERE rn <= {last_per_city}
-    ORDER BY city_id, ts_utc DESC;
+    SELECT f.city_id, f.ts_utc, {", ".join(f"f.{c}" for c in FEATURES)}
+    FROM {feature_store.TABLE} f
+    WHERE f.horizon_h = :h {cond}
+      AND NOT EXISTS (
+        SELECT 1 FROM weather_predictions p
+        WHERE p.city_id = f.city_id AND p.ts_utc = f.ts_utc
+          AND p.horizon_h = f.horizon_h AND p.model_name = :m
+      )
+    ORDER BY f.ts_utc, f.city_id
+    LIMIT :limit;
     """
-    df = pd.read_sql(sql, engine)
-    if df.empty:
-        return df
-
-    df["ts_utc"] = pd.to_datetime(df["ts_utc"])
-    df["hour"] = df["ts_utc"].dt.hour.astype(int)
-    df["dow"]  = df["ts_utc"].dt.dayofweek.astype(int)
-    df["hour_sin"] = np.sin(2*np.pi*df["hour"]/24)
-    df["hour_cos"] = np.cos(2*np.pi*df["hour"]/24)
-    df["dow_sin"]  = np.sin(2*np.pi*df["dow"]/7)
-    df["dow_cos"]  = np.cos(2*np.pi*df["dow"]/7)
+    df = pd.read_sql(text(sql), get_engine(), params=params)
+    if not df.empty:
+        df["ts_utc"] = pd.to_datetime(df["ts_utc"])
     return df
 
 def upsert_predictions(df_feats: pd.DataFrame, preds: np.ndarray, horizon_h: int, model_name: str):
@@ -53,60 +59,103 @@ def upsert_predictions(df_feats: pd.DataFrame, preds: np.ndarray, horizon_h: int
     out["horizon_h"]   = horizon_h
     out["pred_temp_c"] = preds
     out["model_name"]  = model_name
-    out["created_at"]  = datetime.utcnow()
-
-    with engine.begin() as con:
-        out.to_sql("_stg_weather_predictions", con, if_exists="replace", index=False)
-        con.execute(text("""
-            CREATE TABLE IF NOT EXISTS weather_predictions (
-              id BIGSERIAL PRIMARY KEY,
-              city_id INT REFERENCES cities(city_id),
-              ts_utc TIMESTAMP NOT NULL,
-              horizon_h SMALLINT NOT NULL,
-              pred_temp_c DOUBLE PRECISION,
-              model_name TEXT,
-              created_at TIMESTAMP NOT NULL DEFAULT NOW(),
-              UNIQUE (city_id, ts_utc, horizon_h, model_name)
-            );
-        """))
-        con.execute(text("""
-            INSERT INTO weather_predictions
-              (city_id, ts_utc, horizon_h, pred_temp_c, model_name, created_at)
-            SELECT city_id, ts_utc, horizon_h, pred_temp_c, model_name, created_at
-            FROM _stg_weather_predictions
-            ON CONFLICT (city_id, ts_utc, horizon_h, model_name)
-            DO UPDATE SET pred_temp_c = EXCLUDED.pred_temp_c,
-                          created_at  = EXCLUDED.created_at;
-        """))
-        con.execute(text("DROP TABLE _stg_weather_predictions;"))
-
-def run():
-    feats = fetch_recent_features(LAST_PER_CITY)
-    if feats.empty:
-        print("Brak danych w weather_current.")
-        return
-
-    X = feats[FEATURES].copy()
 
+    # created_at z zegara serwera (DEFAULT / touch) – ten sam co znacznik eksportów
+    with get_engine().begin() as con:
+        copy_upsert(con, out, "weather_predictions",
+                    ["city_id", "ts_utc", "horizon_h", "model_name"],
+                    update_cols=["pred_temp_c"], touch="created_at")
+
+def _score(model, feats: pd.DataFrame, horizon_h: int, model_name: str) -> int:
+    cols = model_features(model)
+    with metrics.timer("model_predict", horizon_h=horizon_h):
+        preds = model.predict(feats[cols])
+    with metrics.timer("db_upsert", table="weather_predictions"):
+        upsert_predictions(feats, preds, horizon_h, model_name)
+    metrics.inc("predictions", len(preds), horizon_h=horizon_h)
+    return len(preds)
+
+def model_path(horizon_h: int) -> str:
+    return f"model_xgb_temp_{horizon_h}h.joblib"
+
+def model_file(horizon_h: int) -> Optional[str]:
+    """Plik, z którego zostanie wczytany model: artefakt .npz (jeśli włączony i jest), inaczej .joblib."""
+    for path, enabled in ((artifact.artifact_path(horizon_h), ML_NUMPY_EVALUATOR),
+                          (model_path(horizon_h), True)):
+        if enabled and os.path.exists(path):
+            return path
+    return None
+
+@metrics.timed("model_load")
+def load_model_file(path: str):
+    return artifact.load(path) if path.endswith(".npz") else joblib.load(path)
+
+def load_model(horizon_h: int):
+    """Model dla horyzontu albo None, jeśli nie został jeszcze wytrenowany."""
+    path = model_file(horizon_h)
+    return load_model_file(path) if path else None
+
+@metrics.job("predict")
+def run(backfill: bool = False, since=None, lookback_h: float = NEW_ROWS_LOOKBACK_H,
+        chunk_rows: int = BACKFILL_CHUNK_ROWS, models: Callable[[int], Any] = load_model) -> int:
+    """
+    Domyślnie: predykcje tylko dla nowych wierszy (ostatnie `lookback_h` godzin) bez predykcji.
+    backfill=True: cała historia od `since` (albo od początku), porcjami po `chunk_rows`.
+    `models` – skąd brać model dla horyzontu (serwis predykcji podaje modele trzymane w pamięci).
+    Zwraca liczbę zapisanych predykcji.
+    """
+    init_schema()   # tabele z migracji; w tym procesie sprawdzane raz
     total_saved = 0
+    first_ts = None   # najstarszy ts_utc z nowymi predykcjami – od niego dopasowanie actuals
     for H in HORIZONS_H:
-        model_path = f"model_xgb_temp_{H}h.joblib"
         model_name = f"xgb_temp_{H}h_v1"
 
-        if not os.path.exists(model_path):
-            print(f"Brak modelu dla +{H}h ({model_path}). Ten horyzont zostaje pominięty.")
+        model = models(H)
+        if model is None:
+            print(f"Brak modelu dla +{H}h ({model_path(H)}). Ten horyzont zostaje pominięty.")
             continue
 
-        model = joblib.load(model_path)
-        preds = model.predict(X)
-        upsert_predictions(feats, preds, H, model_name)
-        print(f"Zapisano {len(preds)} predykcji dla horyzontu +{H}h.")
-        total_saved += len(preds)
+        saved = 0
+        if backfill:
+            cursor_ts, cursor_city = since, None
+            while True:
+                feats = fetch_unscored(H, model_name, cursor_ts, cursor_city, limit=chunk_rows)
+                if feats.empty:
+                    break
+                saved += _score(model, feats, H, model_name)
+                first_ts = feats["ts_utc"].min() if first_ts is None else min(first_ts, feats["ts_utc"].min())
+                cursor_ts, cursor_city = feats["ts_utc"].iloc[-1], int(feats["city_id"].iloc[-1])
+                print(f"  +{H}h: {saved} predykcji (do {cursor_ts})")
+        else:
+            start = datetime.utcnow() - timedelta(hours=lookback_h)
+            feats = fetch_unscored(H, model_name, since=start)
+            if not feats.empty:
+                saved = _score(model, feats, H, model_name)
+                first_ts = feats["ts_utc"].min() if first_ts is None else min(first_ts, feats["ts_utc"].min())
+
+        print(f"Zapisano {saved} predykcji dla horyzontu +{H}h.")
+        total_saved += saved
 
     if total_saved == 0:
-        print("Nie zapisano żadnych predykcji (brak dostępnych modeli).")
+        print("Nie zapisano żadnych predykcji (brak nowych wierszy albo modeli).")
     else:
         print(f"Razem zapisano: {total_saved} predykcji (horyzonty: {HORIZONS_H}).")
+        if backfill:
+            # po dużym backfillu autovacuum nie zdąży odświeżyć statystyk, a plan dopasowania
+            # actuals liczony dla „pustej” tabeli predykcji jest o rząd wielkości wolniejszy
+            with get_engine().begin() as con:
+                con.execute(text("ANALYZE weather_predictions"))
+        kpi_rollups.refresh(match_since=first_ts)
+    return total_saved
+
+def main():
+    ap = argparse.ArgumentParser(description="Predykcje temperatury dla wierszy bez predykcji.")
+    ap.add_argument("--backfill", action="store_true", help="przetwórz całą historię porcjami")
+    ap.add_argument("--since", type=pd.Timestamp, default=None, help="backfill od tej daty (UTC)")
+    ap.add_argument("--lookback-h", type=float, default=NEW_ROWS_LOOKBACK_H)
+    ap.add_argument("--chunk-rows", type=int, default=BACKFILL_CHUNK_ROWS)
+    args = ap.parse_args()
+    run(args.backfill, args.since, args.lookback_h, args.chunk_rows)
 
 if __name__ == "__main__":
-    run()
+    main()
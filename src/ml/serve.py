@@ -0,0 +1,314 @@
+# src/ml/serve.py
+"""
+Rezydentny serwis predykcji: modele model_xgb_temp_{H}h trzymane w pamięci,
+przeładowywane przy zmianie mtime pliku. Lokalne HTTP (domyślnie 127.0.0.1:8765):
+
+    GET  /health  – załadowane modele + opóźnienia ostatnich zapytań (p50/p95)
+    POST /score   – {"horizon_h": 3, "rows": [{"city_id": 1, "ts_utc": "...", "temp_c": .., ...}]} -> predykcje
+                    cechy okienkowe (window_features) z bufora miasta w pamięci, jeśli ich nie podano;
+                    bufor jest rozgrzewany przy starcie ostatnimi obserwacjami z bazy i dociąga nowe
+                    (BufferSync, najwyżej co BUFFER_SYNC_S); wiersz starszy niż bufor miasta dostaje
+                    cechy z historii w weather_current; wiersze z zapytania liczone są na kopii
+                    buforów i ich nie zmieniają
+    POST /run     – „policz nowe wiersze teraz” (predict.run na modelach z pamięci),
+                    opcjonalnie {"backfill": true, "lookback_h": 24}
+
+    python -m src.ml.serve --port 8765
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from . import predict
+from .features import HORIZONS_H, add_time_features, model_features
+from .window_features import INPUT_COLUMNS, LOOKBACK, WINDOW_FEATURES, RingBuffers, add_window_features
+
+DEFAULT_PORT = 8765
+LATENCY_WINDOW = 1000
+# najwyżej tak często /score dociąga do buforów nowe obserwacje z bazy
+BUFFER_SYNC_S = 30
+
+
+class ModelRegistry:
+    """
+    Modele w pamięci. get() sprawdza mtime pliku; nowy model jest wczytywany w całości,
+    a dopiero potem podmieniany pod lockiem – trwające zapytania kończą na starym obiekcie.
+    """
+
+    def __init__(self):
+        self._models: Dict[int, Tuple[str, float, Any]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, horizon_h: int):
+        path = predict.model_file(horizon_h)
+        try:
+            mtime = os.stat(path).st_mtime if path else None
+        except FileNotFoundError:
+            mtime = None
+        if mtime is None:
+            return None
+
+        loaded = self._models.get(horizon_h)
+        if loaded is not None and loaded[:2] == (path, mtime):
+            return loaded[2]
+
+        model = predict.load_model_file(path)
+        with self._lock:
+            self._models[horizon_h] = (path, mtime, model)
+        print(f"[serve] wczytano model +{horizon_h}h ({path}, mtime {time.ctime(mtime)})")
+        return model
+
+    def describe(self) -> Dict[str, Any]:
+        return {f"{H}h": {"path": path, "mtime": mtime}
+                for H, (path, mtime, _) in sorted(self._models.items())}
+
+
+class _Latency:
+    def __init__(self):
+        self._samples = deque(maxlen=LATENCY_WINDOW)
+        self._lock = threading.Lock()
+
+    def add(self, endpoint: str, ms: float):
+        with self._lock:
+            self._samples.append((endpoint, ms))
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            samples = list(self._samples)
+        out = {}
+        for endpoint in sorted({e for e, _ in samples}):
+            ms = np.array([m for e, m in samples if e == endpoint])
+            out[endpoint] = {"n": int(len(ms)), "p50_ms": round(float(np.percentile(ms, 50)), 2),
+                             "p95_ms": round(float(np.percentile(ms, 95)), 2)}
+        return out
+
+
+_OBS_SQL = f"""
+SELECT c.city_id, c.ts_utc, {", ".join(f"c.{col}" for col in INPUT_COLUMNS)}
+FROM weather_current c JOIN cities ci ON ci.city_id = c.city_id AND ci.is_active
+WHERE {{where}}
+ORDER BY c.city_id, c.ts_utc
+"""
+
+
+class BufferSync:
+    """
+    Bufory okien nadążające za weather_current. warm() wczytuje ostatnie LOOKBACK obserwacji
+    aktywnych miast, sync() – wiersze zapisane od poprzedniego odczytu (loaded_at). Miasto,
+    do którego doszła obserwacja starsza niż ostatnia w buforze (np. replay archiwum), jest
+    wczytywane od nowa z bazy.
+    """
+
+    def __init__(self, buffers: RingBuffers, interval_s: float = BUFFER_SYNC_S):
+        self.buffers = buffers
+        self.interval_s = interval_s
+        self.since = None          # granica loaded_at; None = bufory jeszcze nie rozgrzane
+        self._synced = 0.0
+        self._lock = threading.Lock()
+
+    def _read(self, where: str, **params):
+        from sqlalchemy import text
+        from ..db import commit_bound, get_engine
+        with get_engine().connect() as con:
+            bound = commit_bound(con)   # przed odczytem danych (db.commit_bound)
+            df = pd.read_sql(text(_OBS_SQL.format(where=where)), con, params=params)
+        return bound, df
+
+    def _reload(self, city_ids) -> int:
+        self.buffers.reset(city_ids)
+        _, df = self._read("""c.city_id = ANY(:ids) AND c.ts_utc > (
+            SELECT MAX(ts_utc) FROM weather_current m WHERE m.city_id = c.city_id) - make_interval(secs => :lookback_s)""",
+                           ids=sorted(city_ids), lookback_s=LOOKBACK.total_seconds())
+        self.buffers.warm(df)
+        return len(df)
+
+    def warm(self) -> int:
+        """Ostatnie LOOKBACK obserwacji aktywnych miast -> bufory okien. Zwraca liczbę obserwacji."""
+        with self._lock:
+            bound, df = self._read("c.ts_utc > (SELECT MAX(ts_utc) FROM weather_current) - make_interval(secs => :lookback_s)",
+                                   lookback_s=LOOKBACK.total_seconds())
+            behind = self.buffers.warm(df)
+            n = len(df) + (self._reload(behind) if behind else 0)
+            self.since, self._synced = bound, time.monotonic()
+        return n
+
+    def sync(self, force: bool = False) -> int:
+        """
+        Dopisuje obserwacje zapisane od poprzedniego odczytu; najwyżej raz na interval_s (chyba że
+        `force`), a gdy odczyt już trwa w innym wątku – od razu wraca. Zwraca liczbę wczytanych wierszy.
+        """
+        from sqlalchemy.exc import SQLAlchemyError
+        if self.since is None or not self._lock.acquire(blocking=False):
+            return 0
+        try:
+            if not force and time.monotonic() - self._synced < self.interval_s:
+                return 0
+            bound, df = self._read("c.loaded_at >= :since", since=self.since)
+            behind = self.buffers.warm(df)
+            n = len(df) + (self._reload(behind) if behind else 0)
+            self.since, self._synced = bound, time.monotonic()
+            return n
+        except SQLAlchemyError as e:
+            # baza chwilowo niedostępna – zapytanie liczy na dotychczasowych buforach, granica bez zmian
+            print(f"[serve] nie odświeżono buforów okien: {type(e).__name__}: {str(e).splitlines()[0]}")
+            self._synced = time.monotonic()
+            return 0
+        finally:
+            self._lock.release()
+
+
+def _history_features(df: pd.DataFrame) -> pd.DataFrame:
+    """Cechy okienkowe wierszy starszych niż bufor ich miasta – z historii w weather_current."""
+    from sqlalchemy import text
+    from ..db import get_engine
+    rows = df.assign(city_id=df["city_id"].astype(int),
+                     ts_utc=pd.to_datetime(df["ts_utc"], utc=True).dt.tz_localize(None))
+    sql = f"""
+    SELECT city_id, ts_utc, {", ".join(INPUT_COLUMNS)} FROM weather_current
+    WHERE city_id = ANY(:ids) AND ts_utc > :lo AND ts_utc <= :hi
+    """
+    params = {"ids": sorted(rows["city_id"].unique().tolist()),
+              "lo": rows["ts_utc"].min() - LOOKBACK, "hi": rows["ts_utc"].max()}
+    ctx = pd.read_sql(text(sql), get_engine(), params=params)
+    # obserwacja z zapytania zastępuje tę samą (city_id, ts_utc) z bazy
+    ctx = ctx.merge(rows[["city_id", "ts_utc"]], how="left", indicator=True)
+    ctx = ctx[ctx["_merge"] == "left_only"].drop(columns="_merge")
+    for col in INPUT_COLUMNS:
+        if col not in rows.columns:
+            rows[col] = np.nan
+    return add_window_features(rows, ctx)[WINDOW_FEATURES]
+
+
+def _add_buffered_features(df: pd.DataFrame, buffers: RingBuffers) -> pd.DataFrame:
+    # wiersze klienta (także hipotetyczne) idą do kopii okien – współdzielone bufory karmi tylko BufferSync
+    buffers = buffers.snapshot({int(c) for c in df["city_id"]})
+    # po kolei w czasie – każda obserwacja przesuwa okna swojego miasta (w obrębie zapytania)
+    order = pd.to_datetime(df["ts_utc"]).argsort(kind="stable")
+    feats = [None] * len(df)
+    behind = []
+    for i in order:
+        row = df.iloc[i]
+        feats[i] = buffers.update(int(row["city_id"]), row["ts_utc"], **{c: row.get(c) for c in INPUT_COLUMNS})
+        if feats[i] is None:
+            behind.append(i)
+    out = pd.DataFrame([f or {} for f in feats], index=df.index, columns=WINDOW_FEATURES)
+    if behind:
+        idx = df.index[sorted(behind)]
+        out.loc[idx] = _history_features(df.loc[idx]).to_numpy()
+    return df.join(out)
+
+
+def score_rows(registry: ModelRegistry, horizon_h: int, rows, buffers: RingBuffers = None) -> Optional[np.ndarray]:
+    model = registry.get(horizon_h)
+    if model is None:
+        return None
+    df = pd.DataFrame(rows)
+    if "hour_sin" not in df.columns and "ts_utc" in df.columns:
+        df = add_time_features(df)
+    cols = model_features(model)
+    missing = [c for c in WINDOW_FEATURES if c in cols and c not in df.columns]
+    if missing and buffers is not None and {"city_id", "ts_utc"} <= set(df.columns):
+        df = _add_buffered_features(df.drop(columns=[c for c in WINDOW_FEATURES if c in df.columns]), buffers)
+    elif missing:
+        df = df.assign(**{c: np.nan for c in missing})   # brak historii -> brak cechy, jak w magazynie
+    return model.predict(df[cols].astype(float))
+
+
+def make_server(host: str = "127.0.0.1", port: int = DEFAULT_PORT,
+                registry: ModelRegistry = None, buffers: RingBuffers = None) -> ThreadingHTTPServer:
+    registry = registry or ModelRegistry()
+    buffers = RingBuffers() if buffers is None else buffers
+    buffer_sync = BufferSync(buffers)   # aktywny po warm() (main); bez niego bufory zostają, jak je przekazano
+    latency = _Latency()
+    run_lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, status: int, body: Dict[str, Any], t0: float):
+            ms = (time.perf_counter() - t0) * 1000
+            latency.add(self.path, ms)
+            print(f"[serve] {self.command} {self.path} {status} {ms:.1f} ms")
+            body["latency_ms"] = round(ms, 2)
+            raw = json.dumps(body, default=str).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(raw)))
+            self.end_headers()
+            self.wfile.write(raw)
+
+        def _body(self) -> Dict[str, Any]:
+            n = int(self.headers.get("Content-Length") or 0)
+            return json.loads(self.rfile.read(n) or b"{}")
+
+        def do_GET(self):
+            t0 = time.perf_counter()
+            if self.path != "/health":
+                return self._reply(404, {"error": "nieznany endpoint"}, t0)
+            self._reply(200, {"models": registry.describe(), "buffered_cities": len(buffers),
+                              "latency": latency.summary()}, t0)
+
+        def do_POST(self):
+            t0 = time.perf_counter()
+            try:
+                req = self._body()
+                if self.path == "/score":
+                    H = int(req["horizon_h"])
+                    buffer_sync.sync()
+                    preds = score_rows(registry, H, req["rows"], buffers)
+                    if preds is None:
+                        return self._reply(404, {"error": f"brak modelu dla +{H}h"}, t0)
+                    return self._reply(200, {"horizon_h": H, "predictions": preds.tolist()}, t0)
+                if self.path == "/run":
+                    # jedno przeliczenie naraz – kolejne czeka, zamiast dublować predykcje
+                    with run_lock:
+                        saved = predict.run(backfill=bool(req.get("backfill", False)),
+                                            lookback_h=float(req.get("lookback_h", predict.NEW_ROWS_LOOKBACK_H)),
+                                            models=registry.get)
+                    return self._reply(200, {"saved": saved}, t0)
+                return self._reply(404, {"error": "nieznany endpoint"}, t0)
+            except (KeyError, ValueError, TypeError) as e:
+                return self._reply(400, {"error": str(e)}, t0)
+
+        def log_request(self, code="-", size="-"):
+            pass   # każde zapytanie logujemy w _reply, razem z czasem obsługi
+
+        def log_message(self, fmt, *args):
+            print(f"[serve] {self.address_string()} {fmt % args}")
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    server.registry = registry
+    server.buffers = buffers
+    server.buffer_sync = buffer_sync
+    return server
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Rezydentny serwis predykcji temperatury.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=DEFAULT_PORT)
+    args = ap.parse_args()
+
+    server = make_server(args.host, args.port)
+    for H in HORIZONS_H:
+        server.registry.get(H)   # rozgrzanie – pierwsze zapytanie nie płaci za wczytanie modelu
+    n_obs = server.buffer_sync.warm()
+    print(f"[serve] bufory okien: {len(server.buffers)} miast, {n_obs} obserwacji")
+    print(f"[serve] nasłuch na http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
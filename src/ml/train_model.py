@@ -1,36 +1,90 @@
 # src/ml/train_model.py
-import os
+"""
+Trening modeli XGBoost dla wielu horyzontów naraz:
+
+    python -m src.ml.train_model --horizons 3 6 12 24
+
+Dane dla wszystkich horyzontów są czytane z ml_features jednym zapytaniem, a foldy CV
+i modele finalne wszystkich horyzontów idą równolegle w puli procesów. Wątki XGBoost
+(n_jobs) są dzielone między procesy, żeby nie przeciążać rdzeni.
+
+    python -m src.ml.train_model --incremental
+
+Pełny trening mierzy MAE na teście (ostatnie 20% wierszy), a zapisuje model uczony na wszystkich
+wierszach – `trained_until` to najnowszy wiersz, który model faktycznie widział.
+
+Tryb przyrostowy dokłada INCREMENTAL_PARAMS["n_estimators"] drzew do zapisanego modelu,
+ucząc je tylko na wierszach po `trained_until` z pliku metryk (bez CV). Pełny trening
+zamiast tego, gdy model na nowych danych jest wyraźnie gorszy niż na teście z ostatniego
+pełnego treningu (dryf), gdy model urósł do MAX_TREES drzew albo zmieniła się lista cech.
+"""
+import argparse
 import json
 import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
 import joblib
 import numpy as np
 import pandas as pd
-from dotenv import load_dotenv
-from sqlalchemy import create_engine
 from sklearn.metrics import mean_absolute_error
 from sklearn.model_selection import TimeSeriesSplit
 from xgboost import XGBRegressor
-from .features import build_dataset
+from .features import FEATURES, HORIZONS_H, TARGET
+from . import artifact, feature_store
+from .. import metrics
+
+N_SPLITS = 5
+MIN_ROWS = 100
+
+CV_PARAMS = dict(
+    n_estimators=300,
+    learning_rate=0.05,
+    max_depth=3,
+    subsample=0.8,
+    colsample_bytree=0.8,
+    reg_lambda=1.0,
+    reg_alpha=0.1,
+    objective="reg:squarederror",
+    eval_metric="mae",
+    random_state=42
+)
+
+FINAL_PARAMS = dict(
+    n_estimators=500,
+    learning_rate=0.03,
+    max_depth=3,
+    subsample=0.85,
+    colsample_bytree=0.85,
+    reg_lambda=1.5,
+    reg_alpha=0.2,
+    objective="reg:squarederror",
+    eval_metric="mae",
+    random_state=42
+)
 
-load_dotenv()
-ENGINE = create_engine(os.getenv("DB_URL"), future=True)
 
-MODEL_PATH = "model_xgb_temp_3h.joblib"
-METRICS_PATH = "metrics_xgb_temp_3h.json"
-MODEL_NAME = "xgb_temp_3h_v1"
-HORIZON_H = 3
+# dokładka do istniejącego modelu (--incremental): mniej drzew z większym krokiem, żeby nadgonić
+# zmianę (np. sezonową) na nowych danych – w backteście tyle samo albo lepiej niż pełny trening
+INCREMENTAL_PARAMS = dict(FINAL_PARAMS, n_estimators=100, learning_rate=0.1)
+# MAE starego modelu na nowych wierszach > DRIFT_MAE_RATIO × test MAE z pełnego treningu -> pełny trening
+DRIFT_MAE_RATIO = 1.25
+# każda dokładka wydłuża predykcję i artefakt – po tylu drzewach pełny trening
+MAX_TREES = 1500
 
 
-def _add_time_features(df: pd.DataFrame) -> pd.DataFrame:
-    out = df.copy()
-    out["ts_utc"] = pd.to_datetime(out["ts_utc"])
-    out["hour"] = out["ts_utc"].dt.hour.astype(int)
-    out["dow"] = out["ts_utc"].dt.dayofweek.astype(int)
-    out["hour_sin"] = np.sin(2 * np.pi * out["hour"] / 24)
-    out["hour_cos"] = np.cos(2 * np.pi * out["hour"] / 24)
-    out["dow_sin"] = np.sin(2 * np.pi * out["dow"] / 7)
-    out["dow_cos"] = np.cos(2 * np.pi * out["dow"] / 7)
-    return out
+def model_path(horizon_h: int) -> str:
+    return f"model_xgb_temp_{horizon_h}h.joblib"
+
+
+def metrics_path(horizon_h: int) -> str:
+    return f"metrics_xgb_temp_{horizon_h}h.json"
+
+
+def model_name(horizon_h: int) -> str:
+    return f"xgb_temp_{horizon_h}h_v1"
 
 
 def _chronological_split(df: pd.DataFrame, test_size: float = 0.2):
@@ -40,91 +94,187 @@ def _chronological_split(df: pd.DataFrame, test_size: float = 0.2):
     return df.iloc[:n_train], df.iloc[n_train:]
 
 
-def train():
-    df = build_dataset(horizon_h=HORIZON_H)
-    if df.empty or len(df) < 100:
-        print("Za mało danych do sensownego treningu (min ~100 wierszy).")
-        return
+def _fit(params: dict, n_jobs: int, X_tr, y_tr, X_val, y_val):
+    """Jedno zadanie w puli procesów: fold CV albo model finalny. Zwraca (model, MAE na walidacji)."""
+    model = XGBRegressor(**params, n_jobs=n_jobs)
+    model.fit(X_tr, y_tr, eval_set=[(X_val, y_val)], verbose=False)
+    mae = float(mean_absolute_error(y_val, model.predict(X_val)))
+    return model, mae
+
+
+def _cv_fold(n_jobs: int, X_tr, y_tr, X_val, y_val) -> float:
+    return _fit(CV_PARAMS, n_jobs, X_tr, y_tr, X_val, y_val)[1]
+
+
+def _final(n_jobs: int, X_tr, y_tr, X_te, y_te):
+    return _fit(FINAL_PARAMS, n_jobs, X_tr, y_tr, X_te, y_te)
+
+
+def _refit(n_jobs: int, X, y):
+    """Model do zapisu: FINAL_PARAMS na wszystkich wierszach (trening + test), bez walidacji."""
+    model = XGBRegressor(**FINAL_PARAMS, n_jobs=n_jobs)
+    model.fit(X, y, verbose=False)
+    return model
 
-    df = df.sort_values(["city_id", "ts_utc"]).reset_index(drop=True)
-    df = _add_time_features(df)
-
-    FEATURES = [
-        "temp_c", "humidity_pct", "pressure_hpa", "wind_speed_ms", "clouds_pct",
-        "hour_sin", "hour_cos", "dow_sin", "dow_cos"
-    ]
-    TARGET = "target_temp_plus_h"
-
-    X = df[FEATURES]
-    y = df[TARGET]
-
-    df_train, df_test = _chronological_split(df, test_size=0.2)
-    X_train, y_train = df_train[FEATURES], df_train[TARGET]
-    X_test, y_test = df_test[FEATURES], df_test[TARGET]
-    tscv = TimeSeriesSplit(n_splits=5)
-    cv_maes = []
-    for fold, (tr_idx, val_idx) in enumerate(tscv.split(X_train), start=1):
-        X_tr, X_val = X_train.iloc[tr_idx], X_train.iloc[val_idx]
-        y_tr, y_val = y_train.iloc[tr_idx], y_train.iloc[val_idx]
-
-        model_cv = XGBRegressor(
-            n_estimators=300,
-            learning_rate=0.05,
-            max_depth=3,
-            subsample=0.8,
-            colsample_bytree=0.8,
-            reg_lambda=1.0,
-            reg_alpha=0.1,
-            objective="reg:squarederror",
-            eval_metric="mae",
-            random_state=42
-        )
-        model_cv.fit(X_tr, y_tr, eval_set=[(X_val, y_val)], verbose=False)
-        pred_val = model_cv.predict(X_val)
-        mae_val = float(mean_absolute_error(y_val, pred_val))
-        cv_maes.append(mae_val)
-
-    cv_mae_mean = float(np.mean(cv_maes))
-    cv_mae_std = float(np.std(cv_maes))
-
-    model = XGBRegressor(
-        n_estimators=500,
-        learning_rate=0.03,
-        max_depth=3,
-        subsample=0.85,
-        colsample_bytree=0.85,
-        reg_lambda=1.5,
-        reg_alpha=0.2,
-        objective="reg:squarederror",
-        eval_metric="mae",
-        random_state=42
-    )
-    model.fit(X_train, y_train, eval_set=[(X_test, y_test)], verbose=False)
-
-    y_pred_test = model.predict(X_test)
-    mae_test = float(mean_absolute_error(y_test, y_pred_test))
-
-    joblib.dump(model, MODEL_PATH)
-    metrics = {
-        "model_name": MODEL_NAME,
-        "horizon_h": HORIZON_H,
+
+def refit_reason(info: dict, drift_mae: float, n_trees: int) -> Optional[str]:
+    """Powód pełnego treningu zamiast dokładki albo None (używane też przez backtest)."""
+    ref = info.get("test_mae")
+    if ref and drift_mae > DRIFT_MAE_RATIO * ref:
+        return f"dryf: MAE {drift_mae:.2f} °C na nowych danych wobec {ref:.2f} °C na teście"
+    if n_trees + INCREMENTAL_PARAMS["n_estimators"] > MAX_TREES:
+        return f"model ma już {n_trees} drzew (limit {MAX_TREES})"
+    return None
+
+
+def _load_info(horizon_h: int) -> Optional[dict]:
+    try:
+        with open(metrics_path(horizon_h), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _save(model, horizon_h: int, info: dict):
+    # zapis przez plik tymczasowy + os.replace: serwis predykcji nigdy nie wczyta połowy pliku
+    tmp_path = model_path(horizon_h) + ".tmp"
+    joblib.dump(model, tmp_path)
+    os.replace(tmp_path, model_path(horizon_h))
+    with open(metrics_path(horizon_h), "w", encoding="utf-8") as f:
+        json.dump(info, f, ensure_ascii=False, indent=2)
+    artifact.export(model, horizon_h, info)
+
+
+def _incremental(horizon_h: int, df: pd.DataFrame, n_jobs: int) -> bool:
+    """
+    Dokładka drzew na wierszach po `trained_until`. Zwraca False, jeśli potrzebny jest pełny
+    trening (brak modelu/znacznika, inne cechy, dryf, limit drzew).
+    """
+    info = _load_info(horizon_h)
+    if not info or not info.get("trained_until") or info.get("features") != FEATURES \
+            or not os.path.exists(model_path(horizon_h)):
+        print(f"+{horizon_h}h: brak modelu ze znacznikiem dla obecnych cech – pełny trening.")
+        return False
+    new = df[df["ts_utc"] > pd.Timestamp(info["trained_until"])]
+    if len(new) < MIN_ROWS:
+        print(f"+{horizon_h}h: {len(new)} nowych wierszy od {info['trained_until']} – model bez zmian.")
+        return True
+
+    old = joblib.load(model_path(horizon_h))
+    booster = old.get_booster()
+    X_new, y_new = new[FEATURES].to_numpy(), new[TARGET].to_numpy()
+    # stary model jeszcze nie widział tych wierszy – to uczciwy pomiar dryfu
+    drift_mae = float(mean_absolute_error(y_new, old.predict(X_new)))
+    n_trees = booster.num_boosted_rounds()
+    reason = refit_reason(info, drift_mae, n_trees)
+    if reason:
+        print(f"+{horizon_h}h: {reason} – pełny trening.")
+        return False
+
+    with metrics.timer("train_incremental", horizon_h=horizon_h):
+        model = XGBRegressor(**INCREMENTAL_PARAMS, n_jobs=n_jobs)
+        model.fit(X_new, y_new, xgb_model=booster, verbose=False)
+    info.update({
+        "mode": "incremental",
         "n_samples_total": int(len(df)),
-        "n_train": int(len(df_train)),
-        "n_test": int(len(df_test)),
-        "features": FEATURES,
-        "cv_mae_mean": cv_mae_mean,
-        "cv_mae_std": cv_mae_std,
-        "test_mae": mae_test,
-    }
-    with open(METRICS_PATH, "w", encoding="utf-8") as f:
-        json.dump(metrics, f, ensure_ascii=False, indent=2)
-
-    print("Wyniki:")
-    print(f"CV MAE: {cv_mae_mean:.2f} ± {cv_mae_std:.2f} °C")
-    print(f" TEST MAE: {mae_test:.2f} °C")
-    print(f"Model zapisany → {MODEL_PATH}")
-    print(f"Metryki zapisane → {METRICS_PATH}")
+        "n_new": int(len(new)),
+        "drift_mae": drift_mae,
+        "n_trees": model.get_booster().num_boosted_rounds(),
+        "updates_since_full": int(info.get("updates_since_full", 0)) + 1,
+        "trained_until": new["ts_utc"].max().isoformat(),
+    })
+    _save(model, horizon_h, info)
+    print(f"+{horizon_h}h: dokładka {INCREMENTAL_PARAMS['n_estimators']} drzew na {len(new)} nowych wierszach "
+          f"(MAE przed dokładką {drift_mae:.2f} °C, razem {info['n_trees']} drzew) → {model_path(horizon_h)}")
+    return True
+
+
+@metrics.job("train")
+def train(horizons=None, workers: int = None, incremental: bool = False):
+    """Pełny trening horyzontów; incremental=True – najpierw próba dokładki do istniejących modeli."""
+    horizons = list(horizons or HORIZONS_H)
+    t0 = time.perf_counter()
+
+    feature_store.refresh(horizons)
+    data = feature_store.load_training_many(horizons)
+
+    splits = {}
+    for H in horizons:
+        df = data[H]
+        if df.empty or len(df) < MIN_ROWS:
+            print(f"+{H}h: za mało danych do sensownego treningu (min ~{MIN_ROWS} wierszy).")
+            continue
+        if incremental and _incremental(H, df, os.cpu_count() or 1):
+            continue
+        splits[H] = (df, *_chronological_split(df, test_size=0.2))
+    if not splits:
+        return
+
+    n_tasks = len(splits) * (N_SPLITS + 2)
+    cpus = os.cpu_count() or 1
+    workers = max(1, min(workers or cpus, n_tasks))
+    n_jobs = max(1, cpus // workers)
+
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        cv_futures, final_futures, refit_futures = {}, {}, {}
+        for H, (df, df_train, df_test) in splits.items():
+            X_train, y_train = df_train[FEATURES].to_numpy(), df_train[TARGET].to_numpy()
+            X_test, y_test = df_test[FEATURES].to_numpy(), df_test[TARGET].to_numpy()
+            # modele finalne (najdłuższe) wysyłamy pierwsze; zapisujemy model uczony na wszystkich
+            # wierszach, więc trained_until (start dokładek) nie pomija wierszy testu
+            refit_futures[H] = ex.submit(_refit, n_jobs, df[FEATURES].to_numpy(), df[TARGET].to_numpy())
+            final_futures[H] = ex.submit(_final, n_jobs, X_train, y_train, X_test, y_test)
+            tscv = TimeSeriesSplit(n_splits=N_SPLITS)
+            cv_futures[H] = [
+                ex.submit(_cv_fold, n_jobs, X_train[tr_idx], y_train[tr_idx], X_train[val_idx], y_train[val_idx])
+                for tr_idx, val_idx in tscv.split(X_train)
+            ]
+
+        for H, (df, df_train, df_test) in splits.items():
+            cv_maes = [f.result() for f in cv_futures[H]]
+            _, mae_test = final_futures[H].result()
+            model = refit_futures[H].result()
+            cv_mae_mean = float(np.mean(cv_maes))
+            cv_mae_std = float(np.std(cv_maes))
+
+            info = {
+                "model_name": model_name(H),
+                "horizon_h": H,
+                "n_samples_total": int(len(df)),
+                "n_train": int(len(df_train)),
+                "n_test": int(len(df_test)),
+                "n_fit": int(len(df)),   # zapisany model: trening + test
+                "features": FEATURES,
+                "cv_mae_mean": cv_mae_mean,
+                "cv_mae_std": cv_mae_std,
+                "test_mae": mae_test,
+                "mode": "full",
+                "n_trees": model.get_booster().num_boosted_rounds(),
+                "updates_since_full": 0,
+                "trained_until": df["ts_utc"].max().isoformat(),
+            }
+            _save(model, H, info)
+
+            print(f"Wyniki +{H}h:")
+            print(f"CV MAE: {cv_mae_mean:.2f} ± {cv_mae_std:.2f} °C")
+            print(f"TEST MAE: {mae_test:.2f} °C")
+            print(f"Model zapisany → {model_path(H)}")
+            print(f"Metryki zapisane → {metrics_path(H)}")
+            print(f"Artefakt zapisany → {artifact.artifact_path(H)}")
+
+    print(f"Trening {len(splits)} horyzontów: {time.perf_counter() - t0:.1f} s "
+          f"({workers} procesów × {n_jobs} wątków XGBoost)")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Trening modeli XGBoost temperatury dla wielu horyzontów.")
+    ap.add_argument("--horizons", type=int, nargs="+", default=HORIZONS_H, help="horyzonty w godzinach")
+    ap.add_argument("--workers", type=int, default=None, help="liczba procesów (domyślnie liczba rdzeni)")
+    ap.add_argument("--incremental", action="store_true",
+                    help="dołóż drzewa do istniejących modeli na danych od ostatniego treningu (pełny trening przy dryfie)")
+    args = ap.parse_args()
+    train(args.horizons, args.workers, args.incremental)
 
 
 if __name__ == "__main__":
-    train()
+    main()
@@ -0,0 +1,264 @@
+# src/ml/window_features.py
+"""
+Cechy okienkowe per miasto: zmiany w czasie i średnie kroczące z obserwacji weather_current.
+
+    temp_delta_1h / temp_delta_3h   temp teraz − temp z ostatniej obserwacji sprzed ≥ 1h / 3h
+    pressure_tendency_3h            to samo dla ciśnienia (tendencja baryczna)
+    temp_mean_3h / temp_mean_24h    średnia temp z obserwacji w oknie (t − okno, t]
+
+Obserwacje OWM są nieregularne, więc okna są czasowe, nie po liczbie wierszy. Obserwacja
+„sprzed 1h” starsza niż opóźnienie + LAG_TOLERANCE nie liczy się (luka w danych -> NaN,
+XGBoost traktuje to jako brak).
+
+Dwie implementacje tych samych definicji:
+  - add_window_features() – wektorowo dla ramki wielu miast (magazyn cech, trening, predykcja wsadowa),
+  - RingBuffers – bufor cykliczny per miasto w pamięci serwisu predykcji: nowa obserwacja
+    aktualizuje cechy w O(1) (wskaźniki okien tylko idą naprzód), bez ponownego czytania historii.
+    Pojemność wynika z LOOKBACK i najmniejszego odstępu obserwacji; obserwacja, która wypchnęłaby
+    z bufora wiersz potrzebny jeszcze oknom, to błąd (ValueError), nie cicho obcięta średnia.
+"""
+import math
+import threading
+from datetime import timedelta
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+# cecha -> (kolumna, opóźnienie)
+LAGS = {
+    "temp_delta_1h": ("temp_c", timedelta(hours=1)),
+    "temp_delta_3h": ("temp_c", timedelta(hours=3)),
+    "pressure_tendency_3h": ("pressure_hpa", timedelta(hours=3)),
+}
+# cecha -> (kolumna, długość okna)
+MEANS = {
+    "temp_mean_3h": ("temp_c", timedelta(hours=3)),
+    "temp_mean_24h": ("temp_c", timedelta(hours=24)),
+}
+WINDOW_FEATURES = list(LAGS) + list(MEANS)
+INPUT_COLUMNS = sorted({col for col, _ in [*LAGS.values(), *MEANS.values()]})
+
+LAG_TOLERANCE = timedelta(minutes=30)
+# tyle historii przed pierwszym liczonym wierszem potrzebują wszystkie cechy
+LOOKBACK = max([lag + LAG_TOLERANCE for _, lag in LAGS.values()] + [w for _, w in MEANS.values()])
+# najmniejszy oczekiwany odstęp obserwacji miasta (OWM odświeża pomiar co ~10 min)
+MIN_OBS_STEP = timedelta(minutes=5)
+
+# klucz sortowania city_id * _CITY_STRIDE + ts [s]: jedna tablica zamiast grupowania po mieście
+_CITY_STRIDE = np.int64(1) << 34
+
+
+def _seconds(td: timedelta) -> int:
+    return int(td.total_seconds())
+
+
+def ring_capacity(step: timedelta = MIN_OBS_STEP) -> int:
+    """Obserwacji na miasto, żeby przy odstępie `step` całe LOOKBACK mieściło się w buforze."""
+    return math.ceil(LOOKBACK / step) + 2
+
+
+# obserwacji na miasto w buforze serwisu
+RING_CAPACITY = ring_capacity()
+
+
+def _epoch_s(ts: pd.Series) -> np.ndarray:
+    return pd.to_datetime(ts).to_numpy("datetime64[s]").astype(np.int64)
+
+
+def add_window_features(df: pd.DataFrame, context: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    """
+    Kopia `df` z kolumnami WINDOW_FEATURES (kolejność wierszy bez zmian). Wymaga city_id, ts_utc
+    i INPUT_COLUMNS. `context` – wcześniejsze obserwacje tych miast (np. koniec poprzedniej porcji),
+    używane tylko jako historia okien.
+    """
+    out = df.copy()
+    if df.empty:
+        for name in WINDOW_FEATURES:
+            out[name] = np.array([], dtype=float)
+        return out
+    cols = ["city_id", "ts_utc", *INPUT_COLUMNS]
+    src = df[cols] if context is None or context.empty else pd.concat([context[cols], df[cols]], ignore_index=True)
+    n_ctx = len(src) - len(df)
+
+    city = src["city_id"].to_numpy(np.int64)
+    key = city * _CITY_STRIDE + _epoch_s(src["ts_utc"])
+    order = np.argsort(key, kind="stable")
+    k = key[order]
+    # pierwszy wiersz miasta – okno nie może sięgnąć do poprzedniego miasta
+    city_start = np.searchsorted(k, city[order] * _CITY_STRIDE, side="left")
+    idx = np.arange(len(k))
+    values = {col: src[col].to_numpy(float)[order] for col in INPUT_COLUMNS}
+    tol = _seconds(LAG_TOLERANCE)
+
+    result = {}
+    for name, (col, lag) in LAGS.items():
+        v, lag_s = values[col], _seconds(lag)
+        j = np.searchsorted(k, k - lag_s, side="right") - 1
+        jc = np.maximum(j, 0)
+        ok = (j >= city_start) & (k - k[jc] <= lag_s + tol)
+        result[name] = np.where(ok, v - v[jc], np.nan)
+    for name, (col, window) in MEANS.items():
+        v = values[col]
+        valid = ~np.isnan(v)
+        csum = np.concatenate([[0.0], np.cumsum(np.where(valid, v, 0.0))])
+        ccnt = np.concatenate([[0], np.cumsum(valid)])
+        start = np.maximum(np.searchsorted(k, k - _seconds(window), side="right"), city_start)
+        cnt = ccnt[idx + 1] - ccnt[start]
+        result[name] = np.where(cnt > 0, (csum[idx + 1] - csum[start]) / np.maximum(cnt, 1), np.nan)
+
+    for name, arr in result.items():
+        unsorted = np.empty_like(arr)
+        unsorted[order] = arr
+        out[name] = unsorted[n_ctx:]
+    return out
+
+
+def window_context(df: pd.DataFrame, context: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    """
+    Historia potrzebna następnej porcji posortowanej po (city_id, ts_utc): ostatnie LOOKBACK
+    obserwacji ostatniego miasta (tylko to miasto może ciągnąć się w kolejnej porcji).
+    """
+    cols = ["city_id", "ts_utc", *INPUT_COLUMNS]
+    src = df[cols] if context is None or context.empty else pd.concat([context[cols], df[cols]], ignore_index=True)
+    if src.empty:
+        return src
+    last = src[src["city_id"] == src["city_id"].iloc[-1]]
+    ts = pd.to_datetime(last["ts_utc"])
+    return last[ts > ts.max() - LOOKBACK].reset_index(drop=True)
+
+
+class _CityWindow:
+    """Bufor cykliczny jednego miasta. Pozycje to numery kolejnych obserwacji (seq), slot = seq % pojemność."""
+
+    __slots__ = ("cap", "ts", "vals", "n", "lag_ptr", "mean_start", "sums", "counts", "last")
+
+    def __init__(self, capacity: int):
+        self.cap = capacity
+        self.ts = [0] * capacity
+        self.vals = {col: [np.nan] * capacity for col in INPUT_COLUMNS}
+        self.n = 0
+        self.lag_ptr = {name: -1 for name in LAGS}        # ostatnia obserwacja z ts <= t − opóźnienie
+        self.mean_start = {name: 0 for name in MEANS}     # pierwsza obserwacja w oknie
+        self.sums = {name: 0.0 for name in MEANS}
+        self.counts = {name: 0 for name in MEANS}
+        self.last: Dict[str, float] = {}
+
+    def update(self, ts: int, obs: Dict[str, float]) -> Dict[str, float]:
+        cap, seq = self.cap, self.n
+        if seq >= cap and ts - self.ts[(seq - cap) % cap] < _seconds(LOOKBACK):
+            raise ValueError(f"bufor {cap} obserwacji nie obejmuje {LOOKBACK} historii – obserwacje "
+                             f"częściej niż co {(LOOKBACK / (cap - 2)).total_seconds() / 60:.0f} min; zwiększ pojemność RingBuffers")
+        if seq >= cap:
+            # nadpisujemy najstarszą obserwację – jeśli była jeszcze w oknie średniej, wychodzi z niego
+            old = seq - cap
+            for name, (col, _) in MEANS.items():
+                if self.mean_start[name] == old:
+                    v = self.vals[col][old % cap]
+                    if v == v:
+                        self.sums[name] -= v
+                        self.counts[name] -= 1
+                    self.mean_start[name] = old + 1
+        slot = seq % cap
+        self.ts[slot] = ts
+        for col in INPUT_COLUMNS:
+            self.vals[col][slot] = obs[col]
+        self.n = seq + 1
+        lo = max(0, self.n - cap)
+
+        feats = {}
+        for name, (col, lag) in LAGS.items():
+            limit, p = ts - _seconds(lag), max(self.lag_ptr[name], lo - 1)
+            while p + 1 < self.n and self.ts[(p + 1) % cap] <= limit:
+                p += 1
+            self.lag_ptr[name] = p
+            ok = p >= lo and ts - self.ts[p % cap] <= _seconds(lag) + _seconds(LAG_TOLERANCE)
+            feats[name] = obs[col] - self.vals[col][p % cap] if ok else np.nan
+        for name, (col, window) in MEANS.items():
+            v = obs[col]
+            if v == v:
+                self.sums[name] += v
+                self.counts[name] += 1
+            limit, s = ts - _seconds(window), self.mean_start[name]
+            while s < self.n and self.ts[s % cap] <= limit:
+                old = self.vals[col][s % cap]
+                if old == old:
+                    self.sums[name] -= old
+                    self.counts[name] -= 1
+                s += 1
+            self.mean_start[name] = s
+            feats[name] = self.sums[name] / self.counts[name] if self.counts[name] else np.nan
+        self.last = feats
+        return feats
+
+    def copy(self) -> "_CityWindow":
+        w = _CityWindow.__new__(_CityWindow)
+        w.cap, w.ts, w.n = self.cap, list(self.ts), self.n
+        w.vals = {col: list(v) for col, v in self.vals.items()}
+        w.lag_ptr, w.mean_start = dict(self.lag_ptr), dict(self.mean_start)
+        w.sums, w.counts, w.last = dict(self.sums), dict(self.counts), dict(self.last)
+        return w
+
+
+class RingBuffers:
+    """
+    Okna wszystkich miast w pamięci procesu (serwis predykcji); bezpieczne dla wielu wątków.
+    W serwisie zmienia je tylko BufferSync (obserwacje z bazy); zapytania liczą na snapshot().
+    """
+
+    def __init__(self, capacity: int = None, step: timedelta = MIN_OBS_STEP):
+        self.capacity = capacity or ring_capacity(step)
+        self._cities: Dict[int, _CityWindow] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._cities)
+
+    def update(self, city_id: int, ts_utc, **obs) -> Dict[str, float]:
+        """
+        Dopisuje obserwację miasta i zwraca jej cechy okienkowe. Powtórzona obserwacja (ten sam ts)
+        zwraca wcześniej policzone cechy; starsza niż ostatnia – None (bufor idzie tylko naprzód,
+        jej cechy trzeba policzyć z historii, np. add_window_features).
+        """
+        ts = int(pd.Timestamp(ts_utc).timestamp())
+        values = {col: np.nan if obs.get(col) is None or pd.isna(obs[col]) else float(obs[col])
+                  for col in INPUT_COLUMNS}
+        with self._lock:
+            w = self._cities.get(city_id)
+            if w is None:
+                w = self._cities[city_id] = _CityWindow(self.capacity)
+            if w.n:
+                last_ts = w.ts[(w.n - 1) % w.cap]
+                if ts == last_ts:
+                    return dict(w.last)
+                if ts < last_ts:
+                    return None
+            return w.update(ts, values)
+
+    def snapshot(self, city_ids) -> "RingBuffers":
+        """Kopia okien podanych miast – update() na niej nie zmienia współdzielonych buforów."""
+        out = RingBuffers(self.capacity)
+        with self._lock:
+            for city_id in city_ids:
+                w = self._cities.get(city_id)
+                if w is not None:
+                    out._cities[city_id] = w.copy()
+        return out
+
+    def reset(self, city_ids) -> None:
+        """Usuwa okna miast (przed ponownym wczytaniem ich historii)."""
+        with self._lock:
+            for city_id in city_ids:
+                self._cities.pop(city_id, None)
+
+    def warm(self, df: pd.DataFrame) -> set:
+        """
+        Dopisuje historię (city_id, ts_utc, INPUT_COLUMNS) do buforów. Zwraca miasta, w których
+        trafiła się obserwacja starsza niż ostatnia w buforze (do ponownego wczytania).
+        """
+        df = df.sort_values(["city_id", "ts_utc"], kind="stable")
+        behind = set()
+        for row in df[["city_id", "ts_utc", *INPUT_COLUMNS]].itertuples(index=False):
+            if self.update(int(row[0]), row[1], **dict(zip(INPUT_COLUMNS, row[2:]))) is None:
+                behind.add(int(row[0]))
+        return behind
@@ -0,0 +1,224 @@
+# src/partitions.py
+"""
+Miesięczne partycje (PARTITION BY RANGE) dla surowych tabel pogody i retencja danych.
+
+  - ensure_partitions() tworzy brakujące partycje dla zakresu czasu (wołane przez init_schema
+    dla bieżącego i kolejnych miesięcy oraz przez upsert_dataframe przed zapisem),
+  - convert() przepisuje istniejącą, niepartycjonowaną tabelę na partycjonowaną,
+  - apply_retention() usuwa całe partycje starsze niż RAW_RETENTION_DAYS
+    (agregaty godzinowe/dzienne z src/etl/weather_rollups.py zostają).
+
+    python -m src.partitions --convert          # jednorazowo dla bazy sprzed partycjonowania
+    python -m src.partitions --retention
+"""
+import argparse
+import threading
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Set, Tuple
+
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from . import config
+
+# tabela -> kolumna czasu (klucz partycjonowania)
+PARTITIONED: Dict[str, str] = {
+    "weather_current": "ts_utc",
+    "weather_forecast": "ts_forecast_utc",
+}
+# ile miesięcy naprzód init_schema zakłada partycje (prognoza sięga 5 dni w przód)
+PREMAKE_MONTHS = 1
+
+# partycje, o których wiemy, że istnieją – (url bazy, nazwa); bez DDL przy każdym zapisie
+_known: Set[Tuple[str, str]] = set()
+_known_lock = threading.Lock()
+
+
+def _month_start(ts) -> date:
+    ts = pd.Timestamp(ts)
+    return date(ts.year, ts.month, 1)
+
+
+def _next_month(d: date) -> date:
+    return date(d.year + d.month // 12, d.month % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_p{month:%Y_%m}"
+
+
+def is_partitioned(con: Connection, table: str) -> bool:
+    kind = con.execute(text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:t)"), {"t": table}).scalar()
+    return kind == "p"
+
+
+def unpartitioned(con: Connection) -> List[str]:
+    """
+    Tabele z PARTITIONED, które istnieją jako zwykłe tabele – baza sprzed partycjonowania
+    (CREATE TABLE IF NOT EXISTS w migracji ich nie zmienia; potrzebne --convert).
+    """
+    return [t for t in PARTITIONED
+            if con.execute(text("SELECT to_regclass(:t) IS NOT NULL"), {"t": t}).scalar()
+            and not is_partitioned(con, t)]
+
+
+def warn_unpartitioned(con: Connection) -> List[str]:
+    tables = unpartitioned(con)
+    if tables:
+        print(f"[partitions] UWAGA: {', '.join(tables)} bez partycji – retencja i zakładanie partycji ich "
+              f"nie obejmują. Przepisz je raz: python -m src.partitions --convert")
+    return tables
+
+
+def list_partitions(con: Connection, table: str) -> List[str]:
+    return list(con.execute(text("""
+        SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(:t) ORDER BY c.relname
+    """), {"t": table}).scalars())
+
+
+def ensure_partitions(con: Connection, table: str, ts_min, ts_max) -> List[str]:
+    """Zakłada brakujące partycje miesięczne pokrywające [ts_min, ts_max]. Zwraca nowo utworzone."""
+    if table not in PARTITIONED or pd.isna(ts_min) or pd.isna(ts_max):
+        return []
+    url = str(con.engine.url)
+    months, m = [], _month_start(ts_min)
+    while m <= _month_start(ts_max):
+        months.append(m)
+        m = _next_month(m)
+    missing = [m for m in months if (url, partition_name(table, m)) not in _known]
+    if not missing or not is_partitioned(con, table):
+        return []
+
+    created = []
+    # równoległe ETL mogłyby jednocześnie zakładać tę samą partycję
+    con.execute(text("SELECT pg_advisory_xact_lock(hashtext(:t))"), {"t": f"partitions:{table}"})
+    existing = set(list_partitions(con, table))
+    for m in missing:
+        name = partition_name(table, m)
+        if name not in existing:
+            con.execute(text(f"CREATE TABLE {name} PARTITION OF {table} "
+                             f"FOR VALUES FROM ('{m}') TO ('{_next_month(m)}')"))
+            created.append(name)
+    # zapamiętujemy tylko partycje już zatwierdzone w katalogu – nowe trafią do cache
+    # przy następnym wywołaniu (transakcja, która je utworzyła, może się jeszcze wycofać)
+    with _known_lock:
+        _known.update((url, name) for name in existing)
+    return created
+
+
+def forget_known():
+    """Czyści cache istniejących partycji (np. po DROP SCHEMA w benchmarkach)."""
+    with _known_lock:
+        _known.clear()
+
+
+def ensure_current(con: Connection):
+    """Partycje od bieżącego miesiąca do PREMAKE_MONTHS naprzód dla wszystkich tabel."""
+    now = datetime.utcnow()
+    ahead = pd.Timestamp(now) + pd.DateOffset(months=PREMAKE_MONTHS)
+    for table in PARTITIONED:
+        ensure_partitions(con, table, now, ahead)
+
+
+def ensure_for_frame(con: Connection, table: str, df: pd.DataFrame) -> List[str]:
+    ts_col = PARTITIONED.get(table)
+    if ts_col is None or ts_col not in df.columns or df.empty:
+        return []
+    ts = pd.to_datetime(df[ts_col])
+    return ensure_partitions(con, table, ts.min(), ts.max())
+
+
+def convert(con: Connection, table: str) -> bool:
+    """
+    Niepartycjonowana `table` -> partycjonowana o tym samym układzie kolumn (i tej samej sekwencji id).
+    Klucz główny musi zawierać kolumnę partycjonowania: (id, ts). Zwraca False, jeśli nie było czego robić.
+    """
+    ts_col = PARTITIONED[table]
+    if is_partitioned(con, table):
+        return False
+    legacy = f"{table}_legacy"
+    con.execute(text(f"LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE"))
+    seq = con.execute(text("SELECT pg_get_serial_sequence(:t, 'id')"), {"t": table}).scalar()
+    # indeksy spoza ograniczeń (np. pokrywające z migracji) odtworzymy na nowej tabeli
+    index_defs = list(con.execute(text("""
+        SELECT pg_get_indexdef(i.indexrelid) FROM pg_index i
+        WHERE i.indrelid = to_regclass(:t)
+          AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.indexrelid)
+    """), {"t": table}).scalars())
+    con.execute(text(f"ALTER TABLE {table} RENAME TO {legacy}"))
+    # nazwy indeksów (i ograniczeń PK/UNIQUE) są globalne w schemacie – zwalniamy je dla nowej tabeli
+    for (idx,) in con.execute(text("""
+        SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE i.indrelid = to_regclass(:t)
+    """), {"t": legacy}).all():
+        con.execute(text(f'ALTER INDEX "{idx}" RENAME TO "{idx[:50]}_legacy"'))
+
+    con.execute(text(f"CREATE TABLE {table} (LIKE {legacy} INCLUDING DEFAULTS) PARTITION BY RANGE ({ts_col})"))
+    con.execute(text(f"ALTER TABLE {table} ADD PRIMARY KEY (id, {ts_col})"))
+    con.execute(text(f"ALTER TABLE {table} ADD UNIQUE (city_id, {ts_col})"))
+    con.execute(text(f"ALTER TABLE {table} ADD FOREIGN KEY (city_id) REFERENCES cities(city_id)"))
+    if seq:
+        con.execute(text(f"ALTER SEQUENCE {seq} OWNED BY {table}.id"))
+
+    for index_def in index_defs:
+        con.exec_driver_sql(index_def)
+
+    ts_min, ts_max = con.execute(text(f"SELECT MIN({ts_col}), MAX({ts_col}) FROM {legacy}")).one()
+    ensure_partitions(con, table, ts_min, ts_max)
+    ensure_current(con)
+    con.execute(text(f"INSERT INTO {table} SELECT * FROM {legacy}"))
+    con.execute(text(f"DROP TABLE {legacy}"))
+    return True
+
+
+def apply_retention(con: Connection, retention_days: int = None) -> List[str]:
+    """Usuwa partycje w całości starsze niż `retention_days` (0 = bez retencji). Zwraca usunięte."""
+    retention_days = config.RAW_RETENTION_DAYS if retention_days is None else retention_days
+    if retention_days <= 0:
+        return []
+    warn_unpartitioned(con)   # zwykłej tabeli retencja nie przytnie
+    cutoff = (datetime.utcnow() - timedelta(days=retention_days)).date()
+    dropped = []
+    for table in PARTITIONED:
+        for name in list_partitions(con, table):
+            month = datetime.strptime(name[-7:], "%Y_%m").date()
+            # usuwamy tylko miesiące, które w całości są przed granicą
+            if _next_month(month) <= cutoff:
+                con.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+                con.execute(text(f"DROP TABLE {name}"))
+                dropped.append(name)
+    url = str(con.engine.url)
+    with _known_lock:
+        _known.difference_update((url, name) for name in dropped)
+    return dropped
+
+
+def main():
+    from .db import get_engine, init_schema
+
+    ap = argparse.ArgumentParser(description="Partycje miesięczne i retencja surowych danych pogodowych.")
+    ap.add_argument("--convert", action="store_true", help="przepisz istniejące tabele na partycjonowane")
+    ap.add_argument("--retention", action="store_true", help="usuń partycje starsze niż RAW_RETENTION_DAYS")
+    args = ap.parse_args()
+
+    if args.convert:
+        init_schema()   # brakujące tabele (agregaty) i indeksy z migracji – convert je przeniesie
+        for table in PARTITIONED:
+            with get_engine().begin() as con:
+                print(f"{table}: {'przepisana na partycje' if convert(con, table) else 'już partycjonowana'}")
+        from .etl import weather_rollups
+        with get_engine().begin() as con:
+            weather_rollups.rebuild(con)
+    if args.retention:
+        with get_engine().begin() as con:
+            dropped = apply_retention(con)
+        print(f"Usunięto partycje: {', '.join(dropped) or '-'}")
+    if not (args.convert or args.retention):
+        with get_engine().connect() as con:
+            for table in PARTITIONED:
+                print(f"{table}: {', '.join(list_partitions(con, table)) or 'bez partycji'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+# src/scheduler.py
+"""
+Rezydentny harmonogram potoku zamiast zimnego startu Pythona co 10 minut (run_etl.bat):
+jeden proces z raz zaimportowanymi modułami, ciepłą pulą połączeń i modelami w pamięci.
+
+    etl        – co SCHED_ETL_INTERVAL_S
+    predict    – po udanym ETL (i nie częściej niż SCHED_PREDICT_INTERVAL_S)
+    analytics  – po udanej predykcji, nie częściej niż SCHED_ANALYTICS_INTERVAL_S
+
+Krok z błędem nie uruchamia następnych w łańcuchu. Cykl trzyma blokadę doradczą PIPELINE_LOCK –
+drugi harmonogram (albo ręczne run_etl) w tym czasie pomija swój przebieg zamiast go dublować.
+Ostatni udany przebieg kroku zapisujemy w pipeline_watermarks: po restarcie zaległy krok
+rusza od razu (raz, bez nadrabiania każdego opuszczonego terminu), a predykcja obejmuje
+całą przerwę. Ctrl+C / SIGTERM kończy bieżący krok i zamyka proces; drugi sygnał przerywa od razu.
+
+    python -m src.scheduler [--once] [--jobs etl predict analytics]
+"""
+import argparse
+import random
+import signal
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional
+
+from . import config
+from .db import PIPELINE_LOCK, get_engine, get_watermark, init_schema, set_watermark, try_advisory_lock
+
+WM_PREFIX = "scheduler."
+# pauza przed kolejną próbą, gdy blokadę trzyma inny proces
+LOCK_RETRY_S = 60
+
+
+class Job:
+    def __init__(self, name: str, interval_s: float, fn: Callable[[Optional[datetime]], None],
+                 after: Optional["Job"] = None):
+        self.name = name
+        self.interval = timedelta(seconds=interval_s)
+        self.fn = fn              # fn(ostatni udany przebieg albo None)
+        self.after = after
+        self.last_ok: Optional[datetime] = None
+        self.next_due = datetime.utcnow()
+
+    def schedule(self, now: datetime, jitter_s: float):
+        # zaległe terminy zlewają się w jeden: następny najwcześniej od teraz
+        self.next_due = max(now, self.next_due + self.interval) + timedelta(seconds=random.uniform(0, jitter_s))
+
+    def is_due(self, now: datetime) -> bool:
+        if self.after is not None and (self.after.last_ok is None or
+                                       (self.last_ok is not None and self.after.last_ok <= self.last_ok)):
+            return False   # poprzedni krok nie dał nic nowego od naszego ostatniego przebiegu
+        return now >= self.next_due
+
+
+def _etl(last_ok):
+    from .etl import run_etl
+    run_etl.run()
+
+
+def _make_predict():
+    registry = None   # modele w pamięci (przeładowywane po zmianie pliku) – od pierwszego przebiegu
+
+    def _predict(last_ok):
+        nonlocal registry
+        # import predict/serve/xgboost dopiero, gdy krok faktycznie rusza (nie przy --jobs etl)
+        from .ml import predict
+        if registry is None:
+            from .ml.serve import ModelRegistry
+            registry = ModelRegistry()
+        lookback_h = predict.NEW_ROWS_LOOKBACK_H
+        if last_ok is not None:
+            # po przerwie dłuższej niż domyślne okno – od ostatniego udanego przebiegu
+            lookback_h = max(lookback_h, (datetime.utcnow() - last_ok).total_seconds() / 3600 + 1)
+        predict.run(lookback_h=lookback_h, models=registry.get)
+    return _predict
+
+
+def _analytics(last_ok):
+    from .analytics import business_case, quick_export
+    business_case.run()
+    quick_export.run()
+
+
+def build_jobs(names: List[str]) -> List[Job]:
+    etl = Job("etl", config.SCHED_ETL_INTERVAL_S, _etl)
+    pred = Job("predict", config.SCHED_PREDICT_INTERVAL_S, _make_predict(), after=etl)
+    analytics = Job("analytics", config.SCHED_ANALYTICS_INTERVAL_S, _analytics, after=pred)
+    jobs = [j for j in (etl, pred, analytics) if j.name in names]
+    for job in jobs:
+        if job.after is not None and job.after not in jobs:
+            # poprzednik spoza harmonogramu (--jobs) – sam interwał
+            job.after = None
+            job.interval = job.interval or etl.interval
+    return jobs
+
+
+class Scheduler:
+    def __init__(self, jobs: List[Job], jitter_s: float = None):
+        self.jobs = jobs
+        self.jitter_s = config.SCHED_JITTER_S if jitter_s is None else jitter_s
+        self.stop = threading.Event()
+
+    def restore(self):
+        """Ostatnie udane przebiegi z bazy – zaległe kroki są od razu do wykonania."""
+        init_schema()
+        with get_engine().connect() as con:
+            for job in self.jobs:
+                job.last_ok, _ = get_watermark(con, WM_PREFIX + job.name)
+                if job.last_ok is not None:
+                    job.next_due = job.last_ok + job.interval
+        now = datetime.utcnow()
+        for job in self.jobs:
+            if job.is_due(now):
+                when = "zaległy – start od razu"
+            elif job.next_due <= now:
+                when = f"po kolejnym {job.after.name}"
+            else:
+                when = f"następny {job.next_due:%H:%M:%S}"
+            print(f"[scheduler] {job.name}: ostatni udany {job.last_ok or '-'}, {when}")
+
+    def _run_job(self, job: Job, now: datetime) -> bool:
+        t0 = time.perf_counter()
+        print(f"[scheduler] {job.name}: start")
+        try:
+            job.fn(job.last_ok)
+        except Exception:
+            traceback.print_exc()
+            print(f"[scheduler] {job.name}: błąd po {time.perf_counter() - t0:.1f} s")
+            job.schedule(now, self.jitter_s)
+            return False
+        job.last_ok = now
+        with get_engine().begin() as con:
+            set_watermark(con, WM_PREFIX + job.name, value_ts=now)
+        job.schedule(now, self.jitter_s)
+        print(f"[scheduler] {job.name}: OK, {time.perf_counter() - t0:.1f} s")
+        return True
+
+    def run_cycle(self) -> bool:
+        """Kroki, które są do wykonania, w kolejności łańcucha. False = blokadę trzyma inny proces."""
+        with try_advisory_lock(PIPELINE_LOCK) as got:
+            if not got:
+                print("[scheduler] inny przebieg potoku trwa – pomijam")
+                return False
+            for job in self.jobs:
+                if self.stop.is_set():
+                    break
+                now = datetime.utcnow()
+                if job.is_due(now):
+                    self._run_job(job, now)
+        return True
+
+    def _sleep_s(self) -> float:
+        now = datetime.utcnow()
+        # do najbliższego terminu kroku, który wtedy faktycznie ruszy (zależny – tylko z nowymi danymi)
+        waits = [(j.next_due - now).total_seconds() for j in self.jobs if j.after is None or j.is_due(j.next_due)]
+        return max(0.0, min(waits, default=LOCK_RETRY_S))
+
+    def run_forever(self):
+        self.restore()
+        while not self.stop.is_set():
+            if not self.run_cycle():
+                self.stop.wait(LOCK_RETRY_S)
+                continue
+            self.stop.wait(self._sleep_s())
+        print("[scheduler] zatrzymany")
+
+    def install_signal_handlers(self):
+        def _handler(signum, frame):
+            if self.stop.is_set():
+                # drugi SIGINT/SIGTERM/SIGBREAK – przerywa bieżący krok; SystemExit omija `except Exception`
+                # w _run_job, a blokada doradcza i metryki przebiegu zamykają się w swoich finally
+                print(f"[scheduler] sygnał {signum} ponownie: przerywam natychmiast")
+                raise SystemExit(128 + signum)
+            print(f"[scheduler] sygnał {signum}: kończę po bieżącym kroku (ponownie = natychmiast)")
+            self.stop.set()
+
+        signal.signal(signal.SIGINT, _handler)
+        signal.signal(signal.SIGTERM, _handler)
+        if hasattr(signal, "SIGBREAK"):   # Ctrl+Break w konsoli Windows
+            signal.signal(signal.SIGBREAK, _handler)
+
+
+def main():
+    names = ["etl", "predict", "analytics"]
+    ap = argparse.ArgumentParser(description="Rezydentny harmonogram: ETL -> predykcja -> analityka.")
+    ap.add_argument("--jobs", nargs="+", choices=names, default=names)
+    ap.add_argument("--once", action="store_true", help="jeden cykl zaległych kroków i koniec")
+    args = ap.parse_args()
+
+    sched = Scheduler(build_jobs(args.jobs))
+    sched.install_signal_handlers()
+    if args.once:
+        sched.restore()
+        sched.run_cycle()
+    else:
+        sched.run_forever()
+
+
+if __name__ == "__main__":
+    main()